@@ -0,0 +1,317 @@
+"""
+Control de admisión de los requests que llegan al LLM.
+
+Dos niveles:
+
+- `AdmissionController` (admission): requests en curso en la API, como
+  mucho ADMISSION_MAX_CONCURRENT. Los que no entran esperan en una cola
+  acotada con dos carriles: "interactive" (/chat, sesiones, /api/query) se
+  atiende antes que "batch" (/chat/batch), y batch nunca ocupa más de
+  ADMISSION_BATCH_MAX lugares. La espera es en el event loop, sin ocupar un
+  hilo. Con la cola del carril llena, o pasados ADMISSION_MAX_WAIT segundos
+  de espera, el request se rechaza enseguida con `Overloaded` (429).
+- `ModelLimiter` (model_limiter): completions simultáneas por modelo
+  (LLM_MAX_CONCURRENCY, con overrides en LLM_MODEL_CONCURRENCY), para no
+  chocar con los rate limits de OpenRouter. La espera es en el hilo del
+  request, acotada por el deadline y por LLM_MODEL_QUEUE; si la cola del
+  modelo está llena se lanza `Overloaded`, que el router trata como
+  fallback al siguiente tier.
+
+`Overloaded.retry_after` se estima con la duración reciente de cada lugar
+ocupado y la cola que tiene adelante el request (header Retry-After).
+"""
+
+from app.config import (
+    ADMISSION_MAX_CONCURRENT, ADMISSION_BATCH_MAX, ADMISSION_QUEUE_INTERACTIVE, ADMISSION_QUEUE_BATCH,
+    ADMISSION_MAX_WAIT, LLM_MAX_CONCURRENCY, LLM_MODEL_CONCURRENCY, LLM_MODEL_QUEUE
+)
+from app.deadline import Deadline
+from app.metrics import Counter, Histogram
+from app.log import get_logger
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Optional, Tuple
+import asyncio
+import math
+import threading
+import time
+
+logger = get_logger(__name__)
+
+LANES = ("interactive", "batch")
+
+# Retry-After sugerido: entre 1 s y este máximo
+RETRY_AFTER_MAX = 60
+# Duración estimada de un lugar ocupado antes de tener mediciones (segundos)
+INITIAL_HOLD_ESTIMATE = 5.0
+
+ADMISSION_REQUESTS = Counter(
+    "sorobai_admission_requests_total",
+    "Decisiones de admisión por carril (admitted, queued, rejected, timeout)",
+    ("lane", "outcome")
+)
+
+ADMISSION_WAIT = Histogram(
+    "sorobai_admission_wait_seconds",
+    "Espera en la cola de admisión de los requests admitidos",
+    ("lane",)
+)
+
+LLM_SLOT_WAIT = Histogram(
+    "sorobai_llm_slot_wait_seconds",
+    "Espera por un lugar de completion del modelo",
+    ("model",)
+)
+
+LLM_SLOT_REJECTED = Counter(
+    "sorobai_llm_slot_rejected_total",
+    "Completions rechazadas por tener llena la cola del modelo",
+    ("model",)
+)
+
+
+class Overloaded(Exception):
+    """No hay capacidad para el request; reintentar pasados `retry_after` segundos."""
+    def __init__(self, scope: str, retry_after: float):
+        self.scope = scope
+        self.retry_after = int(min(RETRY_AFTER_MAX, max(1, math.ceil(retry_after))))
+        super().__init__(f"Servidor saturado ({scope}); reintenta en {self.retry_after}s")
+
+
+class HoldEstimate:
+    """Promedio móvil exponencial de cuánto dura ocupado un lugar."""
+    def __init__(self, initial: float = INITIAL_HOLD_ESTIMATE, alpha: float = 0.2):
+        self.value = initial
+        self.alpha = alpha
+
+    def observe(self, seconds: float):
+        self.value += self.alpha * (seconds - self.value)
+
+    def retry_after(self, ahead: int, capacity: int) -> float:
+        return self.value * (ahead + 1) / max(1, capacity)
+
+
+class Ticket:
+    """Lugar concedido por AdmissionController; `release` se puede llamar más de una vez."""
+    def __init__(self, controller: "AdmissionController", lane: str, weight: int):
+        self.controller = controller
+        self.lane = lane
+        self.weight = weight
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """
+    Lugares de ejecución con cola por carril. Se usa solo desde el event
+    loop (el estado no tiene lock).
+    """
+    def __init__(
+        self,
+        capacity: int = ADMISSION_MAX_CONCURRENT,
+        batch_max: int = ADMISSION_BATCH_MAX,
+        queue_limits: Optional[Dict[str, int]] = None,
+        max_wait: float = ADMISSION_MAX_WAIT
+    ):
+        self.capacity = max(1, capacity)
+        self.batch_max = max(1, min(batch_max, self.capacity))
+        self.queue_limits = queue_limits or {"interactive": ADMISSION_QUEUE_INTERACTIVE, "batch": ADMISSION_QUEUE_BATCH}
+        self.max_wait = max_wait
+        self.in_use: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._waiters: Dict[str, Deque[Tuple[asyncio.Future, int]]] = {lane: deque() for lane in LANES}
+        self._hold = HoldEstimate()
+
+    def _fits(self, lane: str, weight: int) -> bool:
+        if sum(self.in_use.values()) + weight > self.capacity:
+            return False
+        return lane != "batch" or self.in_use["batch"] + weight <= self.batch_max
+
+    def _waiting(self, lane: str) -> int:
+        """Requests que tiene adelante uno nuevo del carril (batch espera detrás del interactivo)."""
+        ahead = len(self._waiters[lane])
+        if lane == "batch":
+            ahead += len(self._waiters["interactive"])
+        return ahead
+
+    def _wake(self):
+        """Concede lugares a los que esperan, interactivo primero y en orden de llegada."""
+        for lane in LANES:
+            queue = self._waiters[lane]
+            while queue:
+                future, weight = queue[0]
+                if future.done():
+                    queue.popleft()
+                    continue
+                if not self._fits(lane, weight):
+                    break
+                queue.popleft()
+                self.in_use[lane] += weight
+                future.set_result(None)
+
+    def _release(self, ticket: Ticket):
+        self._hold.observe(time.monotonic() - ticket.started)
+        self._give_back(ticket.lane, ticket.weight)
+
+    def _give_back(self, lane: str, weight: int):
+        self.in_use[lane] -= weight
+        self._wake()
+
+    def _abandon(self, lane: str, future: asyncio.Future, weight: int):
+        """Saca de la cola a un request que dejó de esperar."""
+        if future.done() and not future.cancelled():
+            # Se le concedió el lugar justo antes: devolverlo
+            self._give_back(lane, weight)
+        future.cancel()
+        try:
+            self._waiters[lane].remove((future, weight))
+        except ValueError:
+            pass
+
+    def retry_after(self, lane: str) -> float:
+        return self._hold.retry_after(self._waiting(lane), self.capacity)
+
+    async def acquire(self, lane: str = "interactive", weight: int = 1) -> Ticket:
+        """
+        Espera un lugar en el carril. `weight` es cuántos lugares ocupa el
+        request (un batch ocupa tantos como completions en paralelo).
+
+        Raises:
+            Overloaded: La cola del carril está llena o la espera superó max_wait
+        """
+        weight = max(1, min(weight, self.batch_max if lane == "batch" else self.capacity))
+        if not self._waiting(lane) and self._fits(lane, weight):
+            self.in_use[lane] += weight
+            ADMISSION_REQUESTS.inc(lane=lane, outcome="admitted")
+            return Ticket(self, lane, weight)
+
+        if len(self._waiters[lane]) >= self.queue_limits.get(lane, 0):
+            ADMISSION_REQUESTS.inc(lane=lane, outcome="rejected")
+            raise Overloaded(lane, self.retry_after(lane))
+
+        ADMISSION_REQUESTS.inc(lane=lane, outcome="queued")
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append((future, weight))
+        started = time.monotonic()
+        try:
+            await asyncio.wait({future}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            # Cliente desconectado mientras esperaba
+            self._abandon(lane, future, weight)
+            raise
+        if not future.done():
+            self._abandon(lane, future, weight)
+            ADMISSION_REQUESTS.inc(lane=lane, outcome="timeout")
+            raise Overloaded(lane, self.retry_after(lane))
+        ADMISSION_WAIT.observe(time.monotonic() - started, lane=lane)
+        return Ticket(self, lane, weight)
+
+    def describe(self) -> Dict[str, object]:
+        return {
+            "capacity": self.capacity,
+            "batch_max": self.batch_max,
+            "in_use": dict(self.in_use),
+            "waiting": {lane: len(queue) for lane, queue in self._waiters.items()},
+        }
+
+
+def parse_model_limits(spec: str) -> Dict[str, int]:
+    """'modelo=n,modelo=n' → {modelo: n}"""
+    limits = {}
+    for item in spec.split(","):
+        if "=" in item:
+            model, _, value = item.rpartition("=")
+            limits[model.strip()] = int(value)
+    return limits
+
+
+class ModelLimiter:
+    """Completions simultáneas por modelo, con cola acotada. Seguro entre hilos."""
+    def __init__(
+        self,
+        default: int = LLM_MAX_CONCURRENCY,
+        overrides: Optional[Dict[str, int]] = None,
+        max_waiting: int = LLM_MODEL_QUEUE
+    ):
+        self.default = default
+        self.overrides = overrides if overrides is not None else parse_model_limits(LLM_MODEL_CONCURRENCY)
+        self.max_waiting = max_waiting
+        self._active: Dict[str, int] = {}
+        self._waiting: Dict[str, int] = {}
+        self._hold: Dict[str, HoldEstimate] = {}
+        self._condition = threading.Condition()
+
+    def limit(self, model: str) -> int:
+        return self.overrides.get(model, self.default)
+
+    def _free(self, model: str) -> bool:
+        limit = self.limit(model)
+        return limit <= 0 or self._active.get(model, 0) < limit
+
+    def try_acquire(self, model: str) -> bool:
+        """Toma un lugar solo si hay uno libre y nadie esperando (p.ej. para un hedge)."""
+        with self._condition:
+            if self._waiting.get(model, 0) or not self._free(model):
+                return False
+            self._active[model] = self._active.get(model, 0) + 1
+            return True
+
+    def acquire(self, model: str, deadline: Optional[Deadline] = None, stage: str = "llm"):
+        """
+        Espera un lugar del modelo mientras el deadline lo permita.
+
+        Raises:
+            Overloaded: Ya hay LLM_MODEL_QUEUE completions esperando este modelo
+            DeadlineExceeded: El deadline venció o se canceló durante la espera
+        """
+        started = time.monotonic()
+        with self._condition:
+            if not self._waiting.get(model, 0) and self._free(model):
+                self._active[model] = self._active.get(model, 0) + 1
+                return
+            if self._waiting.get(model, 0) >= self.max_waiting:
+                LLM_SLOT_REJECTED.inc(model=model)
+                hold = self._hold.setdefault(model, HoldEstimate())
+                raise Overloaded(f"model:{model}", hold.retry_after(self._waiting[model], self.limit(model)))
+            self._waiting[model] = self._waiting.get(model, 0) + 1
+            try:
+                # Esperas cortas para notar una cancelación del deadline
+                while not self._free(model):
+                    if deadline is not None:
+                        deadline.check(stage)
+                    self._condition.wait(1.0 if deadline is None else max(0.01, min(1.0, deadline.remaining())))
+                self._active[model] = self._active.get(model, 0) + 1
+            finally:
+                self._waiting[model] -= 1
+        LLM_SLOT_WAIT.observe(time.monotonic() - started, model=model)
+
+    def release(self, model: str, held: Optional[float] = None):
+        with self._condition:
+            self._active[model] -= 1
+            if held is not None:
+                self._hold.setdefault(model, HoldEstimate()).observe(held)
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, model: str, deadline: Optional[Deadline] = None, stage: str = "llm"):
+        self.acquire(model, deadline, stage)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(model, time.monotonic() - started)
+
+    def describe(self) -> Dict[str, Dict[str, int]]:
+        with self._condition:
+            return {
+                model: {"active": self._active.get(model, 0), "waiting": self._waiting.get(model, 0), "limit": self.limit(model)}
+                for model in set(self._active) | set(self._waiting)
+            }
+
+
+admission = AdmissionController()
+model_limiter = ModelLimiter()
@@ -0,0 +1,100 @@
+"""
+Clientes HTTP compartidos por todo el proceso.
+
+- `upstream_http_client`: pool hacia la API compatible con OpenAI
+  (OpenRouter), compartido por el cliente LLM (app.rag.llm) y el proveedor
+  de embeddings remoto. Los timeouts los fija cada cliente de OpenAI por
+  request, así que compartir el pool no los mezcla.
+- `supabase_http_client`: pool HTTP/2 de PostgREST, con el timeout
+  SUPABASE_TIMEOUT (ver app.db).
+
+Los dos usan keep-alive largo (UPSTREAM_KEEPALIVE_EXPIRY): con el default de
+httpx (5 s) una conexión ociosa se cierra entre requests poco frecuentes y
+el siguiente paga otra vez el handshake TLS. Crearlos no abre conexiones;
+el warm-up del arranque (app.startup) las abre y `close_clients` las cierra
+en el shutdown.
+
+Los clientes de OpenAI y Supabase se crean al importar y guardan estos
+httpx.Client, así que `close_clients` no los cierra: cierra su pool de
+conexiones (`_PooledTransport`) y el siguiente request abre uno nuevo. Así
+un segundo lifespan en el mismo proceso (p.ej. TestClient dos veces) sigue
+funcionando.
+"""
+
+from app.config import SUPABASE_TIMEOUT, UPSTREAM_MAX_CONNECTIONS, UPSTREAM_MAX_KEEPALIVE, UPSTREAM_KEEPALIVE_EXPIRY
+from typing import List, Optional
+import httpx
+import threading
+
+_upstream: Optional[httpx.Client] = None
+_supabase: Optional[httpx.Client] = None
+_transports: List["_PooledTransport"] = []
+_lock = threading.Lock()
+
+
+class _PooledTransport(httpx.BaseTransport):
+    """Transporte cuyo pool de conexiones se puede cerrar y se reabre al usarlo."""
+
+    def __init__(self, **options):
+        self._options = options
+        self._pool: Optional[httpx.HTTPTransport] = None
+        self._lock = threading.Lock()
+
+    def _current(self) -> httpx.HTTPTransport:
+        with self._lock:
+            if self._pool is None:
+                self._pool = httpx.HTTPTransport(**self._options)
+            return self._pool
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self._current().handle_request(request)
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+
+
+def _transport(**options) -> _PooledTransport:
+    transport = _PooledTransport(limits=_limits(), **options)
+    _transports.append(transport)
+    return transport
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+        keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY
+    )
+
+
+def upstream_http_client() -> httpx.Client:
+    """Pool de conexiones hacia OpenRouter (u otra API compatible con OpenAI)."""
+    global _upstream
+    with _lock:
+        if _upstream is None:
+            _upstream = httpx.Client(transport=_transport(), follow_redirects=True)
+        return _upstream
+
+
+def supabase_http_client() -> httpx.Client:
+    """Pool de conexiones hacia PostgREST (Supabase)."""
+    global _supabase
+    with _lock:
+        if _supabase is None:
+            _supabase = httpx.Client(
+                timeout=SUPABASE_TIMEOUT,
+                transport=_transport(http2=True),
+                follow_redirects=True
+            )
+        return _supabase
+
+
+def close_clients():
+    """Cierra las conexiones abiertas; los clientes siguen usables."""
+    with _lock:
+        transports = list(_transports)
+    for transport in transports:
+        transport.close()
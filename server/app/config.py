@@ -7,3 +7,176 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 LLM_API_KEY = os.getenv("LLM_API_KEY")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+# Endpoint compatible con OpenAI (p.ej. los stubs de loadtest/)
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+# Embeddings (ver app.embeddings): "remote" (API compatible con OpenAI) o
+# "local" (modelo ONNX en CPU desde EMBEDDING_LOCAL_MODEL_PATH). Cambiar de
+# modelo requiere reingerir: el índice guarda el modelo de cada chunk
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "remote")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_LOCAL_MODEL_PATH = os.getenv("EMBEDDING_LOCAL_MODEL_PATH", "")
+EMBEDDING_LOCAL_MAX_TOKENS = int(os.getenv("EMBEDDING_LOCAL_MAX_TOKENS", "512"))
+EMBEDDING_LOCAL_THREADS = int(os.getenv("EMBEDDING_LOCAL_THREADS", "0"))  # 0 = default de onnxruntime
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "16"))
+# Dimensión de la columna soroban_chunks.embedding y de los parámetros
+# vector(N) de los RPC (sql/*.sql): la del modelo tiene que coincidir. Para un
+# modelo de otra dimensión hay que migrar el esquema y cambiar este valor
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+
+# Búsqueda vectorial en dos etapas (ver sql/search_embedding.sql y
+# benchmarks/retrieval.py): con EMBEDDING_SEARCH_DIMENSIONS > 0 la primera
+# etapa busca sobre los primeros N valores del embedding y los
+# RETRIEVAL_RESCORE_FACTOR × match_count candidatos se reordenan con el vector
+# completo. 0 = búsqueda directa sobre el vector completo. La columna
+# embedding_search y los RPC _rescored son halfvec(512): el único N válido es
+# EMBEDDING_SEARCH_COLUMN_DIMENSIONS (otro valor requiere migrar el esquema)
+EMBEDDING_SEARCH_COLUMN_DIMENSIONS = 512
+EMBEDDING_SEARCH_DIMENSIONS = int(os.getenv("EMBEDDING_SEARCH_DIMENSIONS", "0"))
+if EMBEDDING_SEARCH_DIMENSIONS not in (0, EMBEDDING_SEARCH_COLUMN_DIMENSIONS):
+    raise ValueError(
+        f"EMBEDDING_SEARCH_DIMENSIONS={EMBEDDING_SEARCH_DIMENSIONS}: usa 0 o "
+        f"{EMBEDDING_SEARCH_COLUMN_DIMENSIONS} (la dimensión de soroban_chunks.embedding_search)"
+    )
+RETRIEVAL_RESCORE_FACTOR = int(os.getenv("RETRIEVAL_RESCORE_FACTOR", "4"))
+
+# Retrieval en dos fases (ver sql/two_phase_retrieval.sql): la búsqueda
+# devuelve solo ids, similitud y la metadata del rerank, y el contenido se
+# pide después para los chunks finales
+RETRIEVAL_TWO_PHASE = os.getenv("RETRIEVAL_TWO_PHASE", "false").lower() == "true"
+
+# Reintento de validación: "patch" envía solo las funciones afectadas,
+# "full" regenera la respuesta completa
+VALIDATION_REPAIR_MODE = os.getenv("VALIDATION_REPAIR_MODE", "patch")
+
+# Límites del validador de código (ver benchmarks/validator.py): el código más
+# largo no se valida, y las reglas que no alcanzan a evaluarse dentro del
+# presupuesto (segundos, 0 = sin límite) se omiten
+VALIDATOR_MAX_CODE_CHARS = int(os.getenv("VALIDATOR_MAX_CODE_CHARS", "200000"))
+VALIDATOR_TIME_BUDGET = float(os.getenv("VALIDATOR_TIME_BUDGET", "1.0"))
+# Validación incremental (edición en vivo): resultados de reglas por función
+# que se conservan entre validaciones
+VALIDATOR_FUNCTION_CACHE_SIZE = int(os.getenv("VALIDATOR_FUNCTION_CACHE_SIZE", "20000"))
+
+# Endpoint /validate (ver app.rag.validation): la validación corre en un pool
+# de procesos salvo los snippets chicos, y los resultados se cachean por hash
+VALIDATE_MAX_ITEMS = int(os.getenv("VALIDATE_MAX_ITEMS", "50"))
+VALIDATE_WORKERS = int(os.getenv("VALIDATE_WORKERS", "2"))
+VALIDATE_CACHE_SIZE = int(os.getenv("VALIDATE_CACHE_SIZE", "2048"))
+VALIDATE_INLINE_MAX_CHARS = int(os.getenv("VALIDATE_INLINE_MAX_CHARS", "4000"))
+VALIDATE_TIMEOUT = float(os.getenv("VALIDATE_TIMEOUT", "10"))
+
+# Chunking de la documentación (ver app.rag.chunking): tamaño máximo de un
+# chunk y mínimo antes de cortar en un encabezado de sección, en caracteres
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "1500"))
+CHUNK_MIN_CHARS = int(os.getenv("CHUNK_MIN_CHARS", "400"))
+# Chunks de código iguales entre idiomas comparten un solo embedding (ver
+# app.rag.dedupe); solo aplica a chunks con hasta esta cantidad de prosa
+INGEST_DEDUPE_CODE = os.getenv("INGEST_DEDUPE_CODE", "true").lower() in ("1", "true", "yes")
+INGEST_DEDUPE_MAX_PROSE_CHARS = int(os.getenv("INGEST_DEDUPE_MAX_PROSE_CHARS", "200"))
+
+# Checkpoint de la ingesta desatendida (ver app.rag.ingest_job)
+INGEST_CHECKPOINT_PATH = os.getenv("INGEST_CHECKPOINT_PATH", ".ingest_checkpoint.json")
+
+# Versiones del índice (blue/green, ver app.rag.index_versions y
+# sql/index_versions.sql): la reingesta construye una versión nueva, la valida
+# y la activa. El servidor relee la versión activa cada INDEX_VERSION_TTL
+# segundos. Se conservan INDEX_KEEP_VERSIONS versiones (contando la activa) y
+# una versión nueva necesita al menos INDEX_MIN_ROW_RATIO de las filas de la activa
+INDEX_VERSIONING = os.getenv("INDEX_VERSIONING", "false").lower() == "true"
+INDEX_VERSION_TTL = float(os.getenv("INDEX_VERSION_TTL", "10"))
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
+INDEX_MIN_ROW_RATIO = float(os.getenv("INDEX_MIN_ROW_RATIO", "0.9"))
+
+# Routing de modelos: un modelo por tier (ver app.rag.routing)
+MODEL_TIER_FAST = os.getenv("MODEL_TIER_FAST", "google/gemini-2.0-flash-001")
+MODEL_TIER_STANDARD = os.getenv("MODEL_TIER_STANDARD", "deepseek/deepseek-chat")
+MODEL_TIER_STRONG = os.getenv("MODEL_TIER_STRONG", "anthropic/claude-3.5-sonnet")
+
+# Objetivo de latencia (segundos) por clase de consulta
+ROUTE_TARGET_EXPLAIN = float(os.getenv("ROUTE_TARGET_EXPLAIN", "20"))
+ROUTE_TARGET_SNIPPET = float(os.getenv("ROUTE_TARGET_SNIPPET", "30"))
+ROUTE_TARGET_CODE_ONLY = float(os.getenv("ROUTE_TARGET_CODE_ONLY", "45"))
+ROUTE_TARGET_FULL_CONTRACT = float(os.getenv("ROUTE_TARGET_FULL_CONTRACT", "60"))
+# Antigüedad máxima (segundos) de las latencias que cuentan para el p95 de un
+# tier: un tier degradado vuelve a probarse cuando sus muestras lentas vencen
+ROUTE_LATENCY_MAX_AGE = float(os.getenv("ROUTE_LATENCY_MAX_AGE", "300"))
+
+# Hedging de requests al LLM: si el primer intento no produce tokens dentro del
+# percentil configurado de time-to-first-token, se lanza un segundo intento
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "2.0"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "8.0"))
+HEDGE_BACKUP_MODEL = os.getenv("HEDGE_BACKUP_MODEL")  # None = mismo modelo
+# Fracción máxima de requests que pueden generar un hedge
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.1"))
+
+# Deadline total por request (segundos) y presupuesto mínimo para el reintento
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "180"))
+RETRY_MIN_BUDGET = float(os.getenv("RETRY_MIN_BUDGET", "30"))
+
+# Timeout de las llamadas a Supabase (PostgREST), en segundos
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "15"))
+
+# Logging estructurado (ver app.log)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" o "text"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Fracción de eventos DEBUG (verbosos) que se emiten
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+
+# Sesiones de chat en servidor (ver app.rag.sessions)
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))  # inactividad máxima en segundos
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+# Tokens máximos de historial literal por turno; lo anterior se resume
+SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "2000"))
+SESSION_SUMMARY_TOKENS = int(os.getenv("SESSION_SUMMARY_TOKENS", "400"))
+SESSION_CONTEXT_TOKENS = int(os.getenv("SESSION_CONTEXT_TOKENS", "3000"))
+SESSION_SUMMARY_MODEL = os.getenv("SESSION_SUMMARY_MODEL", MODEL_TIER_FAST)
+
+# Endpoint /chat/batch
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "50"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+BATCH_TIMEOUT = float(os.getenv("BATCH_TIMEOUT", "600"))
+
+# Clientes HTTP compartidos hacia las APIs compatibles con OpenAI (ver app.clients)
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+# Segundos que una conexión ociosa sigue abierta (evita repetir el handshake TLS)
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+
+# Arranque (ver app.startup): warm-up de conexiones, modelo, cachés y pool de validación
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+# Vigencia en memoria de los chunks de los archivos canónicos (segundos); 0 = sin caché
+CANONICAL_CACHE_TTL = float(os.getenv("CANONICAL_CACHE_TTL", "300"))
+
+# Control de admisión de los requests que llegan al LLM (ver app.admission)
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "32"))
+# Lugares que puede ocupar a la vez el carril batch (el resto queda para el interactivo)
+ADMISSION_BATCH_MAX = int(os.getenv("ADMISSION_BATCH_MAX", "8"))
+# Requests esperando por carril; con la cola llena se responde 429
+ADMISSION_QUEUE_INTERACTIVE = int(os.getenv("ADMISSION_QUEUE_INTERACTIVE", "64"))
+ADMISSION_QUEUE_BATCH = int(os.getenv("ADMISSION_QUEUE_BATCH", "16"))
+# Espera máxima en la cola (segundos) antes de responder 429
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "20"))
+# Completions simultáneas por modelo (0 = sin límite), con overrides "modelo=n,modelo=n"
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MODEL_CONCURRENCY = os.getenv("LLM_MODEL_CONCURRENCY", "")
+# Completions esperando un lugar por modelo
+LLM_MODEL_QUEUE = int(os.getenv("LLM_MODEL_QUEUE", "32"))
+
+# Topes de los parámetros de /chat, sesiones y batch
+QUERY_MAX_CHARS = int(os.getenv("QUERY_MAX_CHARS", "4000"))
+CHAT_MAX_K = int(os.getenv("CHAT_MAX_K", "20"))
+
+# Jobs de generación asíncronos (ver app.rag.jobs)
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+# Jobs esperando un worker; con la cola llena POST /jobs responde 429
+JOBS_MAX_QUEUED = int(os.getenv("JOBS_MAX_QUEUED", "100"))
+# Deadline de cada job desde que empieza a correr (segundos)
+JOBS_TIMEOUT = float(os.getenv("JOBS_TIMEOUT", "600"))
+# Vigencia del resultado de un job terminado (segundos) y máximo de jobs guardados
+JOBS_RESULT_TTL = float(os.getenv("JOBS_RESULT_TTL", "3600"))
+JOBS_MAX_JOBS = int(os.getenv("JOBS_MAX_JOBS", "1000"))
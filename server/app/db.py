@@ -1,8 +1,10 @@
-from supabase import create_client
-import os
+from supabase import create_client, ClientOptions
+from app.clients import supabase_http_client
 from app.config import SUPABASE_URL, SUPABASE_SERVICE_KEY
 
+# El timeout (SUPABASE_TIMEOUT) y el pool de conexiones son del cliente HTTP compartido
 supabase = create_client(
     SUPABASE_URL,
-    SUPABASE_SERVICE_KEY
+    SUPABASE_SERVICE_KEY,
+    options=ClientOptions(httpx_client=supabase_http_client())
 )
@@ -0,0 +1,96 @@
+"""
+Deadline y cancelación de requests.
+
+Un `Deadline` se crea por request en `app.main` y se propaga por todas las
+etapas de `query_rag`. Cada etapa consulta su presupuesto con `budget()` y
+verifica con `check()` antes de empezar. Al vencer el deadline o desconectarse
+el cliente, `cancel()` ejecuta los callbacks registrados para abortar las
+llamadas de red en curso (p.ej. cerrar el stream del LLM).
+
+Vencer no llama a `cancel()` por sí solo: lo hace quien lo detecta (el
+`wait_for` de app.main o el stream del LLM, que revisa `done` en cada chunk).
+"""
+
+from typing import Callable, List, Optional
+import threading
+import time
+
+
+# Presupuesto máximo (segundos) por etapa; el efectivo es min(presupuesto, restante)
+STAGE_BUDGETS = {
+    "embedding": 10.0,
+    "vector_rpc": 15.0,
+    "canonical_fetch": 10.0,
+    "llm": 150.0,
+    "repair": 90.0,
+}
+
+
+class DeadlineExceeded(Exception):
+    """El request superó su deadline o fue cancelado (p.ej. cliente desconectado)."""
+    def __init__(self, stage: str, reason: str = "deadline"):
+        self.stage = stage
+        self.reason = reason
+        super().__init__(f"{reason} en etapa '{stage}'")
+
+
+class Deadline:
+    """Deadline de un request, compartido entre el event loop y el hilo de trabajo."""
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+        self.reason: Optional[str] = None
+        self._cancelled = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        """Segundos restantes (0 si venció o fue cancelado)."""
+        if self._cancelled.is_set():
+            return 0.0
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def done(self) -> bool:
+        return self._cancelled.is_set() or time.monotonic() >= self.expires_at
+
+    def budget(self, stage: str) -> float:
+        """Presupuesto efectivo de una etapa."""
+        return min(STAGE_BUDGETS.get(stage, self.timeout), self.remaining())
+
+    def check(self, stage: str):
+        """Lanza DeadlineExceeded si no queda tiempo para empezar la etapa."""
+        if self._cancelled.is_set():
+            raise DeadlineExceeded(stage, self.reason or "cancelled")
+        if time.monotonic() >= self.expires_at:
+            raise DeadlineExceeded(stage, "deadline")
+
+    def cancel(self, reason: str = "cancelled"):
+        """Cancela el request y aborta las llamadas en curso."""
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self.reason = reason
+            self._cancelled.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """Registra un callback de aborto; si ya está cancelado se ejecuta al instante."""
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def discard(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def __repr__(self):
+        return f"Deadline(remaining={self.remaining():.1f}s, reason={self.reason})"
@@ -1,16 +1,214 @@
-from openai import OpenAI
-from app.config import OPENROUTER_API_KEY
+"""
+Embeddings de queries y chunks.
+
+`EmbeddingProvider` define la interfaz; EMBEDDING_PROVIDER elige la
+implementación:
+
+- "remote": API compatible con OpenAI (OpenRouter por defecto), modelo
+  EMBEDDING_MODEL. Cada query paga un viaje de red.
+- "local": modelo ONNX en CPU cargado desde EMBEDDING_LOCAL_MODEL_PATH
+  (`model.onnx` + `tokenizer.json`, p.ej. un sentence-transformers exportado),
+  con inferencia en batches. Requiere el extra `local-embeddings`
+  (onnxruntime y tokenizers).
+
+Cada chunk guarda en `metadata.embedding_model` el `model_id` del proveedor
+que lo embebió: la ingesta se niega a mezclar modelos en un mismo índice y el
+retrieval descarta candidatos de otro modelo (ver `index_model`).
+
+El esquema fija la dimensión de los vectores: la columna `embedding` de
+soroban_chunks y el parámetro `query_embedding` de los RPC de sql/ son
+vector(1536) (EMBEDDING_DIMENSIONS), la de text-embedding-3-small. Un modelo
+local de otra dimensión (p.ej. 384 en los MiniLM) requiere migrar la columna,
+su índice y esos RPC a vector(N), fijar EMBEDDING_DIMENSIONS=N y reingerir.
+`check_dimensions` lo verifica antes de ingerir y en el warm-up, con un error
+claro en vez de un fallo en cada insert o búsqueda.
+"""
 
-client = OpenAI(
-    api_key=OPENROUTER_API_KEY,
-    base_url="https://openrouter.ai/api/v1"
+from openai import OpenAI
+from app.config import (
+    OPENROUTER_API_KEY, OPENROUTER_BASE_URL, EMBEDDING_PROVIDER, EMBEDDING_MODEL,
+    EMBEDDING_LOCAL_MODEL_PATH, EMBEDDING_LOCAL_MAX_TOKENS, EMBEDDING_LOCAL_THREADS, EMBEDDING_BATCH_SIZE,
+    EMBEDDING_DIMENSIONS
 )
+from app.clients import upstream_http_client
+from app.log import get_logger
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import math
+import threading
+
+logger = get_logger(__name__)
+
+# Modelo de los chunks ingeridos antes de que se guardara embedding_model
+LEGACY_EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+class EmbeddingProvider(ABC):
+    """
+    Interfaz de un proveedor de embeddings.
+
+    model_id identifica el modelo (y con él la dimensión de los vectores) y
+    se guarda con cada chunk del índice.
+    """
+    model_id: str = ""
+
+    @abstractmethod
+    def embed(self, texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+        """Embeddings de los textos, en el orden de entrada."""
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.model_id})"
+
+
+class RemoteEmbeddingProvider(EmbeddingProvider):
+    """Embeddings por una API compatible con OpenAI."""
+    def __init__(self, model: str = EMBEDDING_MODEL, api_key: Optional[str] = OPENROUTER_API_KEY, base_url: str = OPENROUTER_BASE_URL):
+        self.model_id = model
+        self.client = OpenAI(api_key=api_key, base_url=base_url, http_client=upstream_http_client())
+
+    def embed(self, texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+        if not texts:
+            return []
+        embedder = self.client if timeout is None else self.client.with_options(timeout=timeout, max_retries=0)
+        response = embedder.embeddings.create(
+            model=self.model_id,
+            input=texts
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """
+    Modelo ONNX en CPU: tokeniza con `tokenizer.json`, corre `model.onnx` en
+    batches de textos de largo parecido (menos padding) y aplica mean pooling
+    con la máscara de atención y normalización L2. Si el modelo ya devuelve
+    un vector por texto (2 dimensiones), se usa tal cual.
+
+    `timeout` no aplica: la inferencia es local.
+    """
+    def __init__(
+        self,
+        model_path: str = EMBEDDING_LOCAL_MODEL_PATH,
+        max_tokens: int = EMBEDDING_LOCAL_MAX_TOKENS,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        threads: int = EMBEDDING_LOCAL_THREADS
+    ):
+        try:
+            import numpy
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBEDDING_PROVIDER=local requiere onnxruntime y tokenizers "
+                "(pip install 'server[local-embeddings]')"
+            ) from e
+        if not model_path:
+            raise RuntimeError("EMBEDDING_PROVIDER=local requiere EMBEDDING_LOCAL_MODEL_PATH")
+
+        directory = Path(model_path)
+        self.model_id = f"local/{directory.resolve().name}"
+        self.batch_size = max(1, batch_size)
+        self._np = numpy
+
+        self.tokenizer = Tokenizer.from_file(str(directory / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_tokens)
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            str(directory / "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        logger.info("modelo de embeddings local cargado", extra={"model": self.model_id, "inputs": sorted(self.input_names)})
+
+    def _run(self, texts: List[str]):
+        np = self._np
+        encodings = self.tokenizer.encode_batch(texts)
+        ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds: Dict[str, Any] = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(ids)
+        output = self.session.run(None, {name: value for name, value in feeds.items() if name in self.input_names})[0]
+        if output.ndim == 3:
+            weights = mask[:, :, None].astype(output.dtype)
+            output = (output * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return output / np.clip(norms, 1e-12, None)
+
+    def embed(self, texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            indexes = order[start:start + self.batch_size]
+            for index, vector in zip(indexes, self._run([texts[index] for index in indexes])):
+                vectors[index] = vector.tolist()
+        return vectors
+
+
+_provider: Optional[EmbeddingProvider] = None
+_provider_lock = threading.Lock()
+
+
+def create_provider(name: str = EMBEDDING_PROVIDER) -> EmbeddingProvider:
+    if name == "remote":
+        return RemoteEmbeddingProvider()
+    if name == "local":
+        return LocalEmbeddingProvider()
+    raise ValueError(f"EMBEDDING_PROVIDER desconocido: {name!r} (usa 'remote' o 'local')")
+
+
+def get_provider() -> EmbeddingProvider:
+    """Proveedor configurado, creado la primera vez que se usa."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = create_provider()
+        return _provider
+
+
+def check_dimensions(provider: EmbeddingProvider, expected: int = EMBEDDING_DIMENSIONS) -> int:
+    """
+    Embebe un texto de prueba y retorna la dimensión del proveedor.
+
+    Raises:
+        RuntimeError: La dimensión no es la del esquema (EMBEDDING_DIMENSIONS)
+    """
+    dimensions = len(provider.embed(["dimension check"])[0])
+    if dimensions != expected:
+        raise RuntimeError(
+            f"{provider.model_id!r} genera vectores de {dimensions} dimensiones y el esquema "
+            f"(soroban_chunks.embedding, RPC de sql/) usa {expected}: migra la columna y los RPC "
+            f"a vector({dimensions}) y fija EMBEDDING_DIMENSIONS={dimensions}"
+        )
+    return dimensions
+
+
+def index_model(metadata: Dict[str, Any]) -> str:
+    """Modelo con el que se embebió un chunk del índice."""
+    return metadata.get("embedding_model") or LEGACY_EMBEDDING_MODEL
+
+
+def truncate_embedding(embedding: List[float], dimensions: int) -> List[float]:
+    """
+    Primeros `dimensions` valores del embedding, renormalizados. Los modelos
+    entrenados para embeddings acortables (text-embedding-3, Matryoshka)
+    conservan así casi toda la calidad de búsqueda.
+    """
+    head = embedding[:dimensions]
+    norm = math.sqrt(sum(value * value for value in head)) or 1.0
+    return [value / norm for value in head]
+
+
+def embed_text(text: str, timeout: Optional[float] = None) -> list[float]:
+    return get_provider().embed([text], timeout=timeout)[0]
 
-EMBEDDING_MODEL = "text-embedding-3-small"
 
-def embed_text(text: str) -> list[float]:
-    response = client.embeddings.create(
-        model=EMBEDDING_MODEL,
-        input=text
-    )
-    return response.data[0].embedding
+def embed_texts(texts: list[str], timeout: Optional[float] = None) -> list[list[float]]:
+    """Embeddings de varios textos en una sola llamada, en el orden de entrada."""
+    return get_provider().embed(texts, timeout=timeout)
@@ -0,0 +1,148 @@
+"""
+Logging estructurado y no bloqueante.
+
+Los hilos de request solo encolan el record en una cola acotada; un
+`QueueListener` en segundo plano lo serializa a JSON y lo escribe. Si la cola
+está llena el record se descarta (y se cuenta) en vez de bloquear al request.
+Cada record lleva el `request_id` del request en curso y los eventos DEBUG se
+muestrean según LOG_DEBUG_SAMPLE_RATE.
+"""
+
+from app.config import LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE, LOG_DEBUG_SAMPLE_RATE
+from app.metrics import Counter
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+import atexit
+import copy
+import datetime
+import json
+import logging
+import queue
+import random
+import sys
+
+
+# Correlation ID del request en curso (se hereda en asyncio.to_thread)
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Atributos estándar de LogRecord que no se copian como campos extra
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+# Loggers de librerías que en DEBUG loguean cada request HTTP
+_NOISY_LOGGERS = ("httpx", "httpcore", "openai", "hpack", "urllib3", "postgrest", "supabase")
+
+LOG_RECORDS_DROPPED = Counter(
+    "sorobai_log_records_dropped_total",
+    "Records de log descartados por cola llena"
+)
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Serializa el record como una línea JSON con los campos extra."""
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            payload["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato legible para desarrollo y scripts (LOG_FORMAT=text)."""
+    def format(self, record: logging.LogRecord) -> str:
+        extras = " ".join(
+            f"{key}={value}" for key, value in record.__dict__.items()
+            if key not in _RESERVED_ATTRS and not key.startswith("_")
+        )
+        line = f"{record.levelname:<7} {record.getMessage()}"
+        if extras:
+            line += f"  [{extras}]"
+        if record.exc_text:
+            line += f"\n{record.exc_text}"
+        return line
+
+
+class ContextFilter(logging.Filter):
+    """Agrega el request_id y muestrea los eventos DEBUG (se ejecuta en el hilo que loguea)."""
+    def __init__(self, debug_sample_rate: float):
+        super().__init__()
+        self.debug_sample_rate = debug_sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG and random.random() >= self.debug_sample_rate:
+            return False
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler que descarta en vez de bloquear cuando la cola está llena."""
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Congelar el mensaje y la traza aquí: el listener corre en otro hilo
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """
+    Configura el logger raíz con la cola acotada y el listener en segundo plano.
+    Es idempotente: llamadas posteriores no duplican handlers.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    handler.addFilter(ContextFilter(LOG_DEBUG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    for name in _NOISY_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Vacía la cola y detiene el listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
@@ -1,13 +1,70 @@
+import time
+
+# Inicio de las importaciones de la app (fase "imports" del arranque)
+_IMPORT_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from app.models.schemas import ChatRequest, ChatResponse
-from app.rag.query import query_rag
-import logging
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from starlette.concurrency import iterate_in_threadpool
+from app.models.schemas import (
+    ChatRequest, ChatResponse,
+    SessionCreateRequest, SessionMessageRequest, SessionResponse, SessionMessageResponse,
+    BatchRequest, ValidateRequest, ValidateResponse, JobRequest, JobResponse
+)
+from app.rag.query import query_rag, session_chat
+from app.rag.sessions import session_store
+from app.rag.batch import run_batch
+from app.rag.jobs import job_store
+from app.rag.validation import validate_many, shutdown_pool as shutdown_validation_pool
+from app.rag.validators import VALIDATOR_VERSION
+from app.deadline import Deadline, DeadlineExceeded
+from app.admission import admission, Overloaded
+from app.config import (
+    REQUEST_TIMEOUT, BATCH_MAX_QUERIES, BATCH_TIMEOUT, BATCH_LLM_CONCURRENCY, VALIDATE_MAX_ITEMS, STARTUP_WARMUP
+)
+from app.clients import close_clients
+from app.startup import warmup
+from app.metrics import render_prometheus
+from app.log import setup_logging, get_logger, request_id_var
+from pydantic import ValidationError
+from typing import Optional
 import asyncio
+import json
+import uuid
+import weakref
+
+# Intervalo para detectar desconexión del cliente (segundos)
+DISCONNECT_POLL_INTERVAL = 0.5
+# Comentario SSE cada tantos segundos sin eventos, para que los proxies no corten el stream
+SSE_KEEPALIVE_INTERVAL = 15.0
+
+setup_logging()
+logger = get_logger(__name__)
+warmup.started_at = _IMPORT_STARTED
+warmup.record("imports", time.perf_counter() - _IMPORT_STARTED)
+
 
-app = FastAPI(title="SorobAI Backend")
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Warm-up en segundo plano al arrancar (ver app.startup; /ready lo espera)
+    y, al apagar, cancelación de los jobs y cierre del pool de validación y
+    de los clientes HTTP.
+    """
+    if STARTUP_WARMUP:
+        app.state.warmup_task = asyncio.create_task(asyncio.to_thread(warmup.run))
+    else:
+        warmup.mark_ready()
+    yield
+    warmup.stop()
+    job_store.shutdown()
+    shutdown_validation_pool()
+    close_clients()
+
+
+app = FastAPI(title="SorobAI Backend", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -16,17 +73,81 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Asigna un request_id (o respeta X-Request-ID) para correlacionar los logs."""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready():
+    """200 cuando terminó el warm-up del arranque; 503 mientras tanto."""
+    return JSONResponse(warmup.describe(), status_code=200 if warmup.ready else 503)
+
+@app.get("/metrics")
+def metrics():
+    # Formato de texto de Prometheus (v0.0.4)
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+async def _watch_disconnect(http_request: Request, deadline: Deadline):
+    """Cancela el deadline si el cliente cierra la conexión."""
+    while not deadline.done:
+        if await http_request.is_disconnected():
+            deadline.cancel("client_disconnected")
+            return
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+async def run_with_deadline(http_request: Request, func, lane: str = "interactive", **kwargs):
+    """
+    Ejecuta `func` en un hilo con un Deadline propagado, después de pasar
+    el control de admisión del carril (ver app.admission; la espera en la
+    cola no descuenta del deadline). Al vencer el tiempo o desconectarse el
+    cliente se cancela el deadline, lo que aborta las llamadas en curso del
+    hilo en vez de dejarlo corriendo.
+    """
+    ticket = await admission.acquire(lane)
+    try:
+        deadline = Deadline(REQUEST_TIMEOUT)
+        watcher = asyncio.create_task(_watch_disconnect(http_request, deadline))
+        try:
+            return await asyncio.wait_for(
+                asyncio.to_thread(func, deadline=deadline, **kwargs),
+                timeout=REQUEST_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            deadline.cancel("deadline")
+            raise DeadlineExceeded("request", "deadline")
+        finally:
+            watcher.cancel()
+    finally:
+        ticket.release()
+
+
+def overloaded_response(e: Overloaded) -> HTTPException:
+    """429 con Retry-After para un request sin capacidad."""
+    logger.warning("request rechazado por saturación", extra={"scope": e.scope, "retry_after": e.retry_after})
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    logging.info(f"Received chat request: {request}")
+async def chat(request: ChatRequest, http_request: Request):
+    logger.info("chat request", extra={"mode": request.mode, "k": request.k, "query_chars": len(request.query), "code_only": request.code_only})
+    logger.debug("chat request completo", extra={"request": request.model_dump()})
     try:
-        result = await asyncio.wait_for(
-            asyncio.to_thread(
-                query_rag,
+        result = await run_with_deadline(
+            http_request,
+            query_rag,
             user_query=request.query,
             mode=request.mode,
             k=request.k,
@@ -34,32 +155,237 @@ async def chat(request: ChatRequest):
             stream=request.stream,
             code_only=request.code_only,
             language=request.language
-        ),
-        timeout=180.0  # 3 minutos
-    )
+        )
 
         return ChatResponse(**result)
+    except Overloaded as e:
+        raise overloaded_response(e)
+    except DeadlineExceeded as e:
+        logger.warning("chat request abortado", extra={"stage": e.stage, "reason": e.reason})
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
+        logger.exception("error procesando chat request")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/session", response_model=SessionResponse)
+def create_session(request: Optional[SessionCreateRequest] = None):
+    session = session_store.create(language=request.language if request else None)
+    return SessionResponse(**session.describe())
+
+def _get_session(session_id: str):
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada o expirada")
+    return session
+
+@app.get("/chat/session/{session_id}", response_model=SessionResponse)
+def get_session(session_id: str):
+    return SessionResponse(**_get_session(session_id).describe())
+
+@app.delete("/chat/session/{session_id}")
+def delete_session(session_id: str):
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Sesión no encontrada o expirada")
+    return {"deleted": session_id}
+
+@app.post("/chat/session/{session_id}", response_model=SessionMessageResponse)
+async def chat_session(session_id: str, request: SessionMessageRequest, http_request: Request):
+    session = _get_session(session_id)
+    logger.info("session message", extra={"session_id": session_id, "k": request.k, "query_chars": len(request.message)})
+    try:
+        result = await run_with_deadline(
+            http_request,
+            session_chat,
+            session=session,
+            new_message=request.message,
+            k=request.k
+        )
+        return SessionMessageResponse(**result)
+    except Overloaded as e:
+        raise overloaded_response(e)
+    except DeadlineExceeded as e:
+        logger.warning("session message abortado", extra={"stage": e.stage, "reason": e.reason})
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.exception("error procesando session message")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/chat/batch")
+async def chat_batch(request: BatchRequest, http_request: Request):
+    """
+    Ejecuta varias consultas con embedding y retrieval compartidos. Responde
+    NDJSON: una línea por consulta a medida que terminan y una línea final
+    con {"done": true}.
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="El batch no tiene consultas")
+    if len(request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"Máximo {BATCH_MAX_QUERIES} consultas por batch")
+    logger.info("batch request", extra={"queries": len(request.queries)})
+    
+    # Carril batch: ocupa tantos lugares como completions corre en paralelo
+    try:
+        ticket = await admission.acquire("batch", weight=min(len(request.queries), BATCH_LLM_CONCURRENCY))
+    except Overloaded as e:
+        raise overloaded_response(e)
+    deadline = Deadline(BATCH_TIMEOUT)
+    items = [query.model_dump() for query in request.queries]
+    
+    async def lines():
+        watcher = asyncio.create_task(_watch_disconnect(http_request, deadline))
+        finished = False
+        try:
+            async for item in iterate_in_threadpool(run_batch(items, deadline)):
+                yield json.dumps(item, ensure_ascii=False, default=str) + "\n"
+            finished = True
+        finally:
+            watcher.cancel()
+            ticket.release()
+            if not finished:
+                deadline.cancel("client_disconnected")
+    
+    body = lines()
+    # Si el cliente se va antes de que empiece el stream, el generador nunca
+    # corre su finally: el lugar se devuelve cuando se descarta
+    loop = asyncio.get_running_loop()
+    weakref.finalize(body, loop.call_soon_threadsafe, ticket.release)
+    return StreamingResponse(body, media_type="application/x-ndjson")
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+def submit_job(request: JobRequest):
+    """
+    Encola una consulta y responde enseguida con el id del job (ver
+    app.rag.jobs). El resultado se consulta en GET /jobs/{id} o se sigue
+    por SSE en GET /jobs/{id}/events.
+    """
+    params = request.model_dump()
+    params["user_query"] = params.pop("query")
+    try:
+        job = job_store.submit(params)
+    except Overloaded as e:
+        raise overloaded_response(e)
+    logger.info("job request", extra={"job_id": job.job_id, "mode": request.mode, "k": request.k, "query_chars": len(request.query)})
+    return JobResponse(**job.describe())
+
+def _get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado o expirado")
+    return job
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: str):
+    return JobResponse(**_get_job(job_id).describe())
+
+@app.delete("/jobs/{job_id}", response_model=JobResponse)
+def cancel_job(job_id: str):
+    job = job_store.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado o expirado")
+    return JobResponse(**job.describe())
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, http_request: Request):
+    """
+    Eventos del job por SSE (ver app.progress y app.rag.jobs). Cada evento
+    lleva su secuencia como id: al reconectar con Last-Event-ID se retoma
+    desde ahí. El stream termina con el evento "done".
+    """
+    job = _get_job(job_id)
+    try:
+        last_seq = int(http_request.headers.get("last-event-id", "0"))
+    except ValueError:
+        last_seq = 0
+    loop = asyncio.get_running_loop()
+    pending = asyncio.Event()
+
+    def notify():
+        # Llamado desde el hilo del job
+        loop.call_soon_threadsafe(pending.set)
+
+    async def events():
+        nonlocal last_seq
+        job.subscribe(notify)
+        try:
+            while True:
+                pending.clear()
+                for seq, event, data in job.events_since(last_seq):
+                    last_seq = seq
+                    yield f"id: {seq}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+                    if event == "done":
+                        return
+                if job.done and not job.events_since(last_seq):
+                    return
+                try:
+                    await asyncio.wait_for(pending.wait(), timeout=SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            job.unsubscribe(notify)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/validate", response_model=ValidateResponse)
+async def validate(request: ValidateRequest):
+    """
+    Valida uno o varios snippets sin pasar por el LLM. Cada resultado trae
+    `cached` (si vino de la caché) y, en batch, el `id` enviado.
+    """
+    items = request.items or []
+    if request.code is not None:
+        if items:
+            raise HTTPException(status_code=400, detail="Envía `code` o `items`, no ambos")
+        items = [{"code": request.code, "contract_type": request.contract_type, "id": None}]
+    else:
+        items = [item.model_dump() for item in items]
+    if not items:
+        raise HTTPException(status_code=400, detail="No hay código para validar")
+    if len(items) > VALIDATE_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Máximo {VALIDATE_MAX_ITEMS} snippets por request")
+
+    reports = await validate_many(
+        [(item["code"], item["contract_type"]) for item in items],
+        incremental=request.incremental
+    )
+    results = []
+    for item, report in zip(items, reports):
+        if item["id"] is not None:
+            report = dict(report, id=item["id"])
+        results.append(report)
+    logger.info("validate request", extra={
+        "items": len(items),
+        "incremental": request.incremental,
+        "cached": sum(1 for report in reports if report.get("cached")),
+        "errors": sum(1 for report in reports if "error" in report),
+    })
+    return ValidateResponse(validator_version=VALIDATOR_VERSION, results=results)
+
 @app.post("/api/query")
 async def query_endpoint(request: Request):
     data = await request.json()
+    try:
+        params = ChatRequest.model_validate({"query": data.get("query"), "mode": data.get("mode", "explain")})
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json()))
     
     # Timeout de 3 minutos para el endpoint
     try:
-        result = await asyncio.wait_for(
-            asyncio.to_thread(
-                query_rag,
-                user_query=data["query"],
-                mode=data.get("mode", "explain")
-            ),
-            timeout=180.0  # 3 minutos
+        result = await run_with_deadline(
+            request,
+            query_rag,
+            user_query=params.query,
+            mode=params.mode
         )
         return result
         
-    except asyncio.TimeoutError:
+    except Overloaded as e:
+        raise overloaded_response(e)
+    except DeadlineExceeded:
         return {
-            "error": "Request timeout (180s)",
+            "error": f"Request timeout ({REQUEST_TIMEOUT:.0f}s)",
             "suggestion": "Intenta con una pregunta más simple o usa modo streaming"
         }
@@ -0,0 +1,221 @@
+"""
+Métricas en proceso (contadores e histogramas con labels).
+
+Registro mínimo y thread-safe: las etapas del pipeline corren en hilos de
+`asyncio.to_thread`, así que cada métrica protege su estado con un lock.
+Se exportan en formato de texto de Prometheus desde `/metrics`.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Tuple
+import threading
+import time
+
+
+# Buckets por defecto (segundos), pensados para latencias de LLM y RPC
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 180.0)
+
+# Buckets para conteos de tokens
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+REGISTRY: List["Metric"] = []
+
+
+def _escape(value: str) -> str:
+    """Escapa un valor de label según el formato de texto de Prometheus."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    """Base común: nombre, descripción y nombres de labels."""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = [(name, value) for name, value in zip(self.labelnames, key) if value != ""]
+        pairs.extend(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self) -> List[str]:
+        """Líneas de muestra en formato de texto de Prometheus."""
+        return []
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Contador monotónico."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in sorted(values.items())]
+
+
+class Histogram(Metric):
+    """Histograma acumulativo con buckets fijos."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [conteos por bucket..., count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [0] * (len(self.buckets) + 2)
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return int(state[-2]) if state else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = {key: list(state) for key, state in self._values.items()}
+        lines = []
+        for key, state in sorted(values.items()):
+            for bound, count in zip(self.buckets, state):
+                lines.append(f"{self.name}_bucket{self._format_labels(key, (('le', repr(float(bound))),))} {count}")
+            lines.append(f"{self.name}_bucket{self._format_labels(key, (('le', '+Inf'),))} {state[-2]}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {state[-2]}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {state[-1]}")
+        return lines
+
+
+def render_prometheus() -> str:
+    """Exporta todas las métricas registradas en formato de texto de Prometheus."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# Labels comunes del request en curso (mode, language, model), heredados por
+# las etapas que corren en el mismo hilo o contexto
+_request_labels: ContextVar[Dict[str, str]] = ContextVar("metric_request_labels", default={})
+
+
+def set_request_labels(**labels):
+    """Fija (o amplía) los labels del request en curso para las métricas de etapa."""
+    merged = dict(_request_labels.get())
+    merged.update({name: value for name, value in labels.items() if value is not None})
+    _request_labels.set(merged)
+
+
+def observe_stage(stage: str, seconds: float, **labels):
+    """Registra la duración de una etapa con los labels del request."""
+    merged = dict(_request_labels.get())
+    merged.update(labels)
+    STAGE_LATENCY.observe(seconds, stage=stage, **merged)
+
+
+@contextmanager
+def timed(stage: str, **labels):
+    """Mide una etapa; si lanza excepción se cuenta también en STAGE_ERRORS."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        merged = dict(_request_labels.get())
+        merged.update(labels)
+        STAGE_ERRORS.inc(stage=stage, **merged)
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - started, **labels)
+
+
+# Tokens estimados por sección del prompt (system, rules, history, context, query)
+PROMPT_SECTION_TOKENS = Histogram(
+    "sorobai_prompt_section_tokens",
+    "Tokens estimados por sección del prompt",
+    ("kind", "section"),
+    buckets=TOKEN_BUCKETS
+)
+
+# Tokens de prompt servidos desde el caché de prefijos del proveedor
+PROMPT_CACHED_TOKENS = Counter(
+    "sorobai_prompt_cached_tokens_total",
+    "Tokens de prompt reportados como cacheados por el proveedor",
+    ("kind", "model")
+)
+
+PROMPT_TOKENS = Counter(
+    "sorobai_prompt_tokens_total",
+    "Tokens de prompt reportados por el proveedor",
+    ("kind", "model")
+)
+
+# Latencia por etapa del pipeline de consulta e ingesta
+STAGE_LATENCY = Histogram(
+    "sorobai_stage_latency_seconds",
+    "Duración de cada etapa del pipeline (consulta e ingesta)",
+    ("stage", "mode", "language", "model")
+)
+
+STAGE_ERRORS = Counter(
+    "sorobai_stage_errors_total",
+    "Etapas que terminaron con excepción",
+    ("stage", "mode", "language", "model")
+)
+
+REQUESTS = Counter(
+    "sorobai_requests_total",
+    "Requests procesados por query_rag",
+    ("mode", "language", "outcome")
+)
+
+LLM_TOKENS = Counter(
+    "sorobai_llm_tokens_total",
+    "Tokens consumidos en llamadas al LLM",
+    ("mode", "model", "type")
+)
+
+# Aciertos/fallos de cachés en proceso; ratio = hit / (hit + miss)
+CACHE_REQUESTS = Counter(
+    "sorobai_cache_requests_total",
+    "Consultas a cachés en proceso por resultado (hit o miss)",
+    ("cache", "result")
+)
+
+INGEST_CHUNKS = Counter(
+    "sorobai_ingest_chunks_total",
+    "Chunks procesados en la ingesta por resultado (ok, shared, error)",
+    ("language", "outcome")
+)
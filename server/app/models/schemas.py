@@ -1,16 +1,91 @@
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Literal, Optional
+from app.config import QUERY_MAX_CHARS, CHAT_MAX_K
+
+# Topes de los parámetros (422 si se exceden): cada chunk pedido multiplica el
+# match_count del retrieval y el tamaño del prompt
+Query = Field(min_length=1, max_length=QUERY_MAX_CHARS)
+Language = Field(default=None, pattern="^(es|en)$")
+Temperature = Field(default=0.1, ge=0.0, le=2.0)
+# Modos de query_rag: "code" usa los prompts de código; el resto, el de explicación
+Mode = Literal["code", "explain", "chat"]
 
 class ChatRequest(BaseModel):
-    query: str
-    mode: str = "code"
-    k: int = 5
-    temperature: float = 0.1
+    query: str = Query
+    mode: Mode = "code"
+    k: int = Field(default=5, ge=1, le=CHAT_MAX_K)
+    temperature: float = Temperature
     stream: bool = False
     code_only: bool = False  # Nuevo: solo código sin explicaciones
-    language: Optional[str] = None  # Nuevo: forzar idioma ("es" o "en"), None para auto-detectar
+    language: Optional[str] = Language  # Nuevo: forzar idioma ("es" o "en"), None para auto-detectar
 
 class ChatResponse(BaseModel):
     answer: str
     sources: List[Dict[str, Any]]
-    context_used: int
\ No newline at end of file
+    context_used: int
+    prompt: Optional[Dict[str, Any]] = None  # Versión del prompt y tokens estimados por sección
+    route: Optional[Dict[str, Any]] = None  # Clase de consulta, tier y modelo usados
+class SessionCreateRequest(BaseModel):
+    language: Optional[str] = Language  # "es" o "en"; None para detectar con el primer mensaje
+
+class SessionMessageRequest(BaseModel):
+    message: str = Query
+    k: int = Field(default=4, ge=1, le=CHAT_MAX_K)
+
+class SessionResponse(BaseModel):
+    session_id: str
+    turns: int
+    summarized_turns: int
+    history_tokens: int
+    summary_tokens: int
+    cached_contexts: int
+
+class SessionMessageResponse(BaseModel):
+    answer: str
+    sources: List[Dict[str, Any]]
+    context_used: int
+    session: SessionResponse
+    prompt: Optional[Dict[str, Any]] = None
+    route: Optional[Dict[str, Any]] = None
+
+class BatchQuery(BaseModel):
+    query: str = Query
+    mode: Mode = "code"
+    k: int = Field(default=5, ge=1, le=CHAT_MAX_K)
+    temperature: float = Temperature
+    code_only: bool = False
+    language: Optional[str] = Language
+
+class BatchRequest(BaseModel):
+    queries: List[BatchQuery]
+
+class ValidateItem(BaseModel):
+    code: str
+    contract_type: Optional[str] = None  # "token", "nft", "custom"; None para detectar
+    id: Optional[str] = None  # Identificador del cliente, se devuelve tal cual
+
+class ValidateRequest(BaseModel):
+    # Un snippet (`code`) o varios (`items`)
+    code: Optional[str] = None
+    contract_type: Optional[str] = None
+    items: Optional[List[ValidateItem]] = None
+    # Edición en vivo: validación incremental en el proceso de la API, que
+    # reutiliza el análisis de los items sin cambios entre requests
+    incremental: bool = False
+
+class ValidateResponse(BaseModel):
+    validator_version: str
+    results: List[Dict[str, Any]]
+
+class JobRequest(BatchQuery):
+    # Mismos parámetros que una consulta de /chat; la respuesta llega por /jobs/{id}
+    pass
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str  # "queued", "running", "completed", "failed" o "cancelled"
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None  # Mismo contenido que ChatResponse
+    error: Optional[str] = None
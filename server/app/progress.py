@@ -0,0 +1,41 @@
+"""
+Eventos de progreso de un request: etapas del pipeline y tokens del LLM.
+
+Quien sigue un request (los jobs de app.rag.jobs) instala un listener con
+`listen_progress(callback)` en el hilo que lo ejecuta; el pipeline llama a
+`report_progress(event, **data)` en cada etapa y app.rag.llm pasa cada token
+del intento ganador. Sin listener, `report_progress` no hace nada.
+
+Eventos:
+    stage    {"stage": "retrieval" | "generation" | "validation" | "repair"}
+    attempt  {"model", "stage"}: empieza una completion; el texto recibido
+             hasta ahora se descarta (fallback de tier o reparación)
+    token    {"text"}
+"""
+
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+import contextvars
+
+Listener = Callable[[str, Dict[str, Any]], None]
+
+_listener: contextvars.ContextVar[Optional[Listener]] = contextvars.ContextVar("progress_listener", default=None)
+
+
+def progress_listener() -> Optional[Listener]:
+    return _listener.get()
+
+
+@contextmanager
+def listen_progress(callback: Listener):
+    token = _listener.set(callback)
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+
+def report_progress(event: str, **data):
+    listener = _listener.get()
+    if listener is not None:
+        listener(event, data)
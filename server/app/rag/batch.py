@@ -0,0 +1,112 @@
+"""
+Ejecución de varias consultas en un solo request (/chat/batch).
+
+Las consultas se embeben en una sola llamada y se recuperan juntas
+(`retrieve_batch`); luego cada una pasa por `query_rag` con su contexto ya
+recuperado, con a lo sumo BATCH_LLM_CONCURRENCY llamadas al LLM en paralelo.
+Los resultados se entregan a medida que terminan.
+"""
+
+from app.config import BATCH_LLM_CONCURRENCY
+from app.rag.query import query_rag, detect_language, effective_k
+from app.rag.retrieve import retrieve_batch
+from app.admission import Overloaded
+from app.deadline import Deadline, DeadlineExceeded
+from app.metrics import timed, set_request_labels
+from app.log import get_logger
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List
+import contextvars
+
+logger = get_logger(__name__)
+
+
+def _item_key(item: Dict[str, Any]) -> tuple:
+    """Consultas con la misma clave producen la misma respuesta y se ejecutan una vez."""
+    return (
+        " ".join(item["query"].lower().split()), item["mode"], item["k"],
+        item["temperature"], item["code_only"], item["language"]
+    )
+
+
+def run_batch(items: List[Dict[str, Any]], deadline: Deadline) -> Iterator[Dict[str, Any]]:
+    """
+    Ejecuta el batch y produce un dict por consulta en orden de finalización,
+    seguido de un resumen final.
+    
+    Args:
+        items: Consultas con query, mode, k, temperature, code_only y language
+        deadline: Deadline compartido por todo el batch
+    
+    Yields:
+        {"index", "query", "result"} o {"index", "query", "error"} por consulta
+        y al final {"done": True, ...} con estadísticas del batch
+    """
+    set_request_labels(mode="batch")
+    items = [dict(item, language=item.get("language") or detect_language(item["query"])) for item in items]
+    
+    try:
+        with timed("batch_retrieval"):
+            contexts, shared = retrieve_batch(
+                [(item["query"], effective_k(item["query"], item["k"]), item["language"]) for item in items],
+                deadline=deadline
+            )
+    except Exception as e:
+        logger.exception("error en retrieval del batch")
+        stage = e.stage if isinstance(e, DeadlineExceeded) else "retrieval"
+        for index, item in enumerate(items):
+            yield {"index": index, "query": item["query"], "error": str(e), "stage": stage}
+        yield {"done": True, "queries": len(items), "errors": len(items)}
+        return
+    
+    # Consultas idénticas: una sola ejecución, el resultado se reparte
+    groups: Dict[tuple, List[int]] = {}
+    for index, item in enumerate(items):
+        groups.setdefault(_item_key(item), []).append(index)
+    
+    def run(index: int) -> Dict[str, Any]:
+        item = items[index]
+        return query_rag(
+            user_query=item["query"],
+            mode=item["mode"],
+            k=item["k"],
+            temperature=item["temperature"],
+            code_only=item["code_only"],
+            language=item["language"],
+            deadline=deadline,
+            chunks=contexts[index]
+        )
+    
+    errors = 0
+    pool = ThreadPoolExecutor(max_workers=BATCH_LLM_CONCURRENCY, thread_name_prefix="batch-llm")
+    try:
+        futures = {
+            pool.submit(contextvars.copy_context().run, run, indexes[0]): indexes
+            for indexes in groups.values()
+        }
+        for future in as_completed(futures):
+            indexes = futures[future]
+            try:
+                result = future.result()
+                lines = [{"index": index, "query": items[index]["query"], "result": result} for index in indexes]
+            except Exception as e:
+                errors += len(indexes)
+                if isinstance(e, DeadlineExceeded):
+                    stage = e.stage
+                else:
+                    stage = "overloaded" if isinstance(e, Overloaded) else "generation"
+                    logger.warning("consulta del batch falló", extra={"indexes": indexes, "error": str(e)})
+                lines = [{"index": index, "query": items[index]["query"], "error": str(e), "stage": stage} for index in indexes]
+            yield from lines
+    finally:
+        # Si el consumidor abandona el stream, no se lanzan las consultas pendientes
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    yield {
+        "done": True,
+        "queries": len(items),
+        "unique_queries": len(groups),
+        "candidate_chunks": shared.candidates,
+        "unique_chunks": shared.unique_chunks,
+        "errors": errors,
+    }
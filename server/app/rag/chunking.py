@@ -1,48 +1,265 @@
-from llama_index.core.node_parser import MarkdownNodeParser, SentenceSplitter
+"""
+Chunking de la documentación markdown para la ingesta.
+
+El documento se recorre una vez y se separa en bloques: encabezados,
+párrafos y bloques de código cercados (```` ``` ````). Los bloques de código
+son atómicos; los de Rust que superan CHUNK_MAX_CHARS se cortan en límites de
+item (fn, impl, `#[contractimpl]`, ...) con app.rag.rust_parser, repitiendo
+la cabecera del impl para que cada parte compile por sí sola a la vista.
+
+Los bloques se empaquetan en chunks de hasta CHUNK_MAX_CHARS sin solapamiento.
+Un encabezado de nivel ≤ 2 abre un chunk nuevo salvo que el actual tenga
+menos de CHUNK_MIN_CHARS (así las secciones cortas no quedan como chunks
+sueltos). Cada chunk lleva en metadata el camino de encabezados
+(`header_path`, como MarkdownNodeParser) y, si empieza a mitad de sección,
+el texto repite ese camino como contexto.
+"""
+
+from app.config import CHUNK_MAX_CHARS, CHUNK_MIN_CHARS
+from app.rag.rust_parser import split_segments
 from llama_index.core import Document
+from llama_index.core.schema import NodeRelationship, TextNode
+from typing import Dict, List, Optional, Tuple
+import re
+
+_HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_FENCE = re.compile(r'^\s*(`{3,}|~{3,})\s*([\w+-]*)')
+_SENTENCE_END = re.compile(r'(?<=[.!?:])\s+')
+
+# Lenguajes de bloques de código que se cortan por items de Rust
+_RUST_LANGUAGES = ("rust", "rs")
+
+
+class Block:
+    """Unidad atómica del documento: "heading", "text" o "code"."""
+    __slots__ = ("kind", "text", "level", "path")
+
+    def __init__(self, kind: str, text: str, path: Tuple[str, ...], level: int = 0):
+        self.kind = kind
+        self.text = text
+        self.level = level  # Nivel del encabezado (solo "heading")
+        self.path = path  # Encabezados que contienen al bloque (incluido él mismo si es encabezado)
+
+
+def split_blocks(markdown: str) -> List[Block]:
+    """Separa el markdown en encabezados, párrafos y bloques de código cercados."""
+    blocks: List[Block] = []
+    path: List[Tuple[int, str]] = []
+    paragraph: List[str] = []
+    lines = markdown.split('\n')
+
+    def current_path() -> Tuple[str, ...]:
+        return tuple(title for _, title in path)
+
+    def flush_paragraph():
+        if paragraph and any(line.strip() for line in paragraph):
+            blocks.append(Block("text", '\n'.join(paragraph).strip('\n'), current_path()))
+        paragraph.clear()
 
-def chunk_documents(documents):
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        fence = _FENCE.match(line)
+        if fence:
+            # Cierra una línea solo con la cerca (sin lenguaje), de al menos el mismo largo
+            closing = re.compile(r'^\s*' + re.escape(fence.group(1)[0]) + '{' + str(len(fence.group(1))) + r',}\s*$')
+            end = i + 1
+            while end < len(lines) and not closing.match(lines[end]):
+                end += 1
+            # Una cerca sin cierre se trata como texto: no se lleva el resto del documento
+            if end < len(lines):
+                flush_paragraph()
+                blocks.append(Block("code", '\n'.join(lines[i:end + 1]), current_path()))
+                i = end + 1
+                continue
+        heading = None if fence else _HEADING.match(line)
+        if heading:
+            flush_paragraph()
+            level = len(heading.group(1))
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, heading.group(2)))
+            blocks.append(Block("heading", line, current_path(), level))
+        elif line.strip():
+            paragraph.append(line)
+        else:
+            flush_paragraph()
+        i += 1
+    flush_paragraph()
+    return blocks
+
+
+def _split_text(text: str, max_chars: int) -> List[str]:
+    """Corta un párrafo largo en oraciones agrupadas hasta max_chars."""
+    pieces: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_END.split(text):
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _fence_parts(block: str) -> Tuple[str, str, str]:
+    """(línea de apertura, código, línea de cierre) de un bloque cercado."""
+    first_newline = block.find('\n')
+    if first_newline == -1:
+        return block, "", ""
+    opening = block[:first_newline]
+    body = block[first_newline + 1:]
+    last_newline = body.rfind('\n')
+    closing = body[last_newline + 1:]
+    if closing.strip() and closing.strip()[0] == opening.strip()[0] and not closing.strip(closing.strip()[0] + ' \t'):
+        return opening, body[:last_newline + 1], closing
+    return opening, body if body.endswith('\n') else body + '\n', opening.strip()[:3]
+
+
+def _split_rust(code: str, max_chars: int) -> List[str]:
     """
-    Chunking inteligente con pipeline de 2 fases:
-    1. Respeta estructura Markdown (headers, secciones)
-    2. Divide secciones grandes preservando código
+    Corta código Rust en grupos de items consecutivos de hasta max_chars.
+    Los miembros de un impl/trait/mod se agrupan con la cabecera del
+    contenedor y su llave de cierre.
     """
-    # 1️⃣ Parsear estructura Markdown
-    md_parser = MarkdownNodeParser(
-        include_metadata=True
-    )
-    md_nodes = md_parser.get_nodes_from_documents(documents)
+    parts: List[str] = []
+    container: Optional[str] = None  # Cabecera del impl/trait/mod abierto
+    units: List[str] = []
 
-    # 2️⃣ Split dentro de cada sección
-    splitter = SentenceSplitter(
-        chunk_size=1000,     # balance contexto/precisión
-        chunk_overlap=200    # overlap generoso para código
-    )
+    def flush():
+        if not units:
+            return
+        text = ''.join(units).lstrip('\n')
+        if container is not None:
+            text = container + text + ('' if text.endswith('\n') else '\n') + '}\n'
+        parts.append(text)
+        units.clear()
+
+    def add(unit: str):
+        overhead = len(container) + 2 if container is not None else 0
+        if units and overhead + sum(len(u) for u in units) + len(unit) > max_chars:
+            flush()
+        units.append(unit)
 
-    final_nodes = []
-    for node in md_nodes:
-        # Preservar bloques de código completos si son razonables
-        code_blocks = node.text.count('```')
-        
-        if code_blocks > 0 and code_blocks % 2 == 0 and len(node.text) < 1500:
-            # Código completo y no muy largo
-            final_nodes.append(node)
+    for segment in split_segments(code) or []:
+        text = code[segment.start:segment.end]
+        if segment.role == "header":
+            flush()
+            container = text
+        elif segment.role == "close":
+            flush()
+            container = None
+        elif text.strip():
+            add(text)
+        elif units:
+            units[-1] += text  # Líneas en blanco entre items
+    flush()
+    return parts or [code]
+
+
+def _split_code(block: str, max_chars: int) -> List[str]:
+    """Un bloque de código, cortado por items si es Rust y supera max_chars."""
+    if len(block) <= max_chars:
+        return [block]
+    fence = _FENCE.match(block)
+    if fence is None or fence.group(2).lower() not in _RUST_LANGUAGES:
+        return [block]
+    opening, code, closing = _fence_parts(block)
+    return [f"{opening}\n{part.rstrip()}\n{closing}" for part in _split_rust(code, max_chars)]
+
+
+def _units(blocks: List[Block], max_chars: int) -> List[Block]:
+    """Bloques listos para empaquetar: ninguno supera max_chars salvo items de código indivisibles."""
+    units: List[Block] = []
+    for block in blocks:
+        if block.kind == "code":
+            units.extend(Block("code", part, block.path) for part in _split_code(block.text, max_chars))
+        elif block.kind == "text" and len(block.text) > max_chars:
+            units.extend(Block("text", part, block.path) for part in _split_text(block.text, max_chars))
         else:
-            # Dividir, pero PRESERVAR metadata del nodo original
-            sub_nodes = splitter.get_nodes_from_documents([Document(
-                text=node.text,
-                metadata=node.metadata  # ✅ Preservar metadata
-            )])
-            for sub_node in sub_nodes:
-                # Heredar metadata del nodo padre si el sub_node no lo tiene
-                if not sub_node.metadata and node.metadata:
-                    sub_node.metadata = node.metadata.copy()
-                
-                if '```' in sub_node.text and sub_node.text.count('```') % 2 != 0:
-                    sub_node.text += "\n```\n\n*(código continúa)*"
-                final_nodes.append(sub_node)
-
-    return final_nodes
+            units.append(block)
+    return units
+
+
+def _context(path: Tuple[str, ...]) -> str:
+    """Camino de encabezados como línea de contexto para un chunk a mitad de sección."""
+    return " > ".join(path)
+
+
+def _header_path(path: Tuple[str, ...]) -> str:
+    return "/" + "".join(f"{title}/" for title in path)
+
+
+def chunk_markdown(
+    markdown: str,
+    max_chars: int = CHUNK_MAX_CHARS,
+    min_chars: int = CHUNK_MIN_CHARS
+) -> List[Tuple[str, Tuple[str, ...]]]:
+    """
+    Divide un documento markdown en chunks.
+
+    Returns:
+        Lista de (texto, camino de encabezados) por chunk.
+    """
+    chunks: List[Tuple[str, Tuple[str, ...]]] = []
+    parts: List[str] = []
+    size = 0
+    path: Tuple[str, ...] = ()
+    trailing: List[Block] = []  # Encabezados al final del chunk en curso
+
+    def add(unit: Block):
+        nonlocal path, size
+        if not parts:
+            path = unit.path
+            if unit.kind != "heading" and unit.path:
+                # Continuación de una sección: repetir de dónde viene
+                parts.append(_context(unit.path))
+                size = len(parts[0])
+        parts.append(unit.text)
+        size += len(unit.text) + 2
+        trailing[:] = trailing + [unit] if unit.kind == "heading" else []
+
+    def flush():
+        nonlocal parts, size
+        # Un encabezado no queda separado de su contenido
+        carried = list(trailing) if len(trailing) < len(parts) else []
+        if carried:
+            del parts[-len(carried):]
+        if parts:
+            chunks.append(("\n\n".join(parts), path))
+        parts = []
+        size = 0
+        trailing.clear()
+        for heading in carried:
+            add(heading)
+
+    for unit in _units(split_blocks(markdown), max_chars):
+        starts_section = unit.kind == "heading" and unit.level <= 2
+        if parts and (size + len(unit.text) + 2 > max_chars or (starts_section and size >= min_chars)):
+            flush()
+        add(unit)
+    trailing.clear()
+    flush()
+    return chunks
+
+
+def chunk_documents(documents: List[Document]) -> List[TextNode]:
+    """
+    Chunking de documentos markdown para la ingesta (ver el docstring del
+    módulo). Cada nodo hereda la metadata del documento más `header_path`.
+    """
+    nodes: List[TextNode] = []
+    for document in documents:
+        for text, path in chunk_markdown(document.text):
+            metadata: Dict[str, object] = dict(document.metadata)
+            metadata["header_path"] = _header_path(path)
+            node = TextNode(text=text, metadata=metadata)
+            node.relationships[NodeRelationship.SOURCE] = document.as_related_node_info()
+            nodes.append(node)
+    return nodes
+
 
 def chunk_documents_semantic(documents):
     """
@@ -51,12 +268,12 @@ def chunk_documents_semantic(documents):
     """
     from llama_index.core.node_parser import SemanticSplitterNodeParser
     from app.embeddings import embed_text
-    
+
     # Usa embeddings para detectar cambios semánticos
     parser = SemanticSplitterNodeParser(
         buffer_size=1,
         breakpoint_percentile_threshold=95,
         embed_model=None  # Podríamos integrar nuestro modelo aquí
     )
-    
+
     return parser.get_nodes_from_documents(documents)
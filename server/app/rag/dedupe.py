@@ -0,0 +1,47 @@
+"""
+Deduplicación de chunks de código entre idiomas.
+
+Cada documento existe en data/docs/es y data/docs/en con los mismos bloques
+de Rust (salvo comentarios traducidos). La ingesta calcula una huella del
+código de cada chunk que es casi solo código; si otro idioma ya guardó un
+chunk con la misma huella, reutiliza su embedding en lugar de generar otro.
+
+La huella ignora comentarios, encabezados y prosa, así que solo se comparte
+el vector: cada idioma guarda su propia fila con su texto y `language_doc`.
+"""
+
+from app.config import INGEST_DEDUPE_MAX_PROSE_CHARS
+from app.rag.rust_parser import tokenize
+from typing import Optional
+import hashlib
+import re
+
+_FENCED = re.compile(r'^(`{3,}|~{3,})[^\n]*\n(.*?)^\1[ \t]*$', re.MULTILINE | re.DOTALL)
+
+
+def _prose_chars(text: str) -> int:
+    """Caracteres fuera de los bloques de código, sin contar encabezados ni la línea de contexto."""
+    outside = _FENCED.sub('', text)
+    return sum(
+        len(line.strip()) for line in outside.split('\n')
+        if line.strip() and not line.startswith('#') and ' > ' not in line
+    )
+
+
+def code_fingerprint(text: str, max_prose_chars: int = INGEST_DEDUPE_MAX_PROSE_CHARS) -> Optional[str]:
+    """
+    Huella del código de un chunk: hash de sus tokens de Rust sin comentarios
+    ni espacios, así que ignora el idioma de los comentarios y el formato.
+
+    Returns:
+        None si el chunk no tiene código o tiene más de max_prose_chars de prosa
+        (esa prosa está en un solo idioma y no se puede compartir).
+    """
+    blocks = [match.group(2) for match in _FENCED.finditer(text)]
+    if not blocks or _prose_chars(text) > max_prose_chars:
+        return None
+    tokens = [token.text for block in blocks for token in tokenize(block) if token.kind != "comment"]
+    if not tokens:
+        return None
+    return hashlib.sha256(" ".join(tokens).encode("utf-8")).hexdigest()
+
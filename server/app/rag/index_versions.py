@@ -0,0 +1,210 @@
+"""
+Versiones del índice (blue/green) sobre soroban_chunks.
+
+Cada fila tiene `index_version` y la tabla soroban_index_versions marca cuál
+está activa (ver sql/index_versions.sql). Una reingesta construye una
+versión nueva en paralelo a la que sirve (`python -m app.rag.ingest_job
+--shadow`), la valida con `validate_version` (cantidad de filas contra la
+versión activa y consultas de prueba por idioma) y la activa con un único
+UPDATE en la base. Las versiones anteriores se conservan para volver atrás
+(INDEX_KEEP_VERSIONS).
+
+El servidor lee la versión activa cada INDEX_VERSION_TTL segundos y la usa
+en todas las consultas de un request; las cachés en proceso (contextos de
+sesión) la incluyen en su clave, así que un cambio de versión las invalida.
+
+    python -m app.rag.index_versions list
+    python -m app.rag.index_versions validate 20260101-120000-3f9a
+    python -m app.rag.index_versions activate 20260101-120000-3f9a
+    python -m app.rag.index_versions rollback
+    python -m app.rag.index_versions prune --keep 3
+
+Con INDEX_VERSIONING=false todo esto está apagado: las funciones devuelven
+None y el retrieval no filtra por versión.
+"""
+
+from app.config import INDEX_VERSIONING, INDEX_VERSION_TTL, INDEX_KEEP_VERSIONS, INDEX_MIN_ROW_RATIO
+from app.db import supabase
+from app.log import get_logger
+from typing import Any, Dict, List, Optional
+import argparse
+import json
+import threading
+import time
+import uuid
+
+logger = get_logger(__name__)
+
+VERSIONS_TABLE = "soroban_index_versions"
+
+# Consultas de prueba por idioma: cada una tiene que recuperar algún chunk
+SMOKE_QUERIES = {
+    "es": ["¿Cómo guardo datos en persistent storage?", "crear un contrato de token"],
+    "en": ["How do I store data in persistent storage?", "create a token contract"],
+}
+
+_active: Optional[str] = None
+_active_read_at = 0.0
+_active_lock = threading.Lock()
+
+
+def active_index_version(refresh: bool = False) -> Optional[str]:
+    """
+    Versión activa del índice, releída cada INDEX_VERSION_TTL segundos. Si
+    la lectura falla se sigue usando la última conocida.
+    """
+    global _active, _active_read_at
+    if not INDEX_VERSIONING:
+        return None
+    with _active_lock:
+        if not refresh and _active is not None and time.monotonic() - _active_read_at < INDEX_VERSION_TTL:
+            return _active
+        try:
+            result = supabase.table(VERSIONS_TABLE).select("version").eq("active", True).limit(1).execute()
+        except Exception as e:
+            if _active is None:
+                raise
+            logger.warning("no se pudo leer la versión activa del índice", extra={"version": _active, "error": str(e)})
+            return _active
+        if not result.data:
+            raise RuntimeError(f"No hay versión activa en {VERSIONS_TABLE}")
+        version = result.data[0]["version"]
+        if version != _active:
+            logger.info("versión activa del índice", extra={"version": version, "previous": _active})
+        _active = version
+        _active_read_at = time.monotonic()
+        return _active
+
+
+def new_version() -> str:
+    return time.strftime("%Y%m%d-%H%M%S", time.gmtime()) + "-" + uuid.uuid4().hex[:4]
+
+
+def register_version(version: str, model_id: str):
+    """Registra una versión en construcción (no sirve hasta activarla)."""
+    supabase.table(VERSIONS_TABLE).insert({"version": version, "model": model_id, "status": "building"}).execute()
+
+
+def list_versions() -> List[Dict[str, Any]]:
+    result = supabase.table(VERSIONS_TABLE).select("*").order("created_at", desc=True).execute()
+    return result.data
+
+
+def count_rows(version: str, language: Optional[str] = None) -> int:
+    query = supabase.table("soroban_chunks").select("id_chunk", count="exact").eq("index_version", version)
+    if language:
+        query = query.filter("metadata->>language_doc", "eq", language)
+    return query.limit(1).execute().count or 0
+
+
+def validate_version(
+    version: str,
+    languages: Optional[List[str]] = None,
+    min_ratio: float = INDEX_MIN_ROW_RATIO
+) -> Dict[str, Any]:
+    """
+    Valida una versión antes de activarla: por idioma (por defecto todos los
+    de SMOKE_QUERIES, así una versión parcial no reemplaza a una completa),
+    al menos min_ratio de las filas de la versión activa (o alguna si no hay
+    activa) y resultados en todas las consultas de prueba.
+
+    Returns:
+        {"ok": bool, "problems": [...], "languages": {idioma: detalle}}
+    """
+    from app.rag.retrieve import retrieve_context_with_metadata
+
+    active = active_index_version(refresh=True)
+    report: Dict[str, Any] = {"version": version, "active": active, "problems": [], "languages": {}}
+    for language in languages or list(SMOKE_QUERIES):
+        rows = count_rows(version, language)
+        baseline = count_rows(active, language) if active and active != version else 0
+        detail: Dict[str, Any] = {"rows": rows, "active_rows": baseline, "smoke": {}}
+        if rows == 0 or rows < baseline * min_ratio:
+            report["problems"].append(f"{language}: {rows} filas contra {baseline} de la versión activa")
+        for query in SMOKE_QUERIES.get(language, []):
+            chunks = retrieve_context_with_metadata(query, k=3, language=language, index_version=version)
+            detail["smoke"][query] = [chunk.get("metadata", {}).get("file") for chunk in chunks]
+            if not chunks:
+                report["problems"].append(f"{language}: sin resultados para {query!r}")
+        report["languages"][language] = detail
+    report["ok"] = not report["problems"]
+    return report
+
+
+def activate(version: str) -> Optional[str]:
+    """
+    Pasa a servir `version` con un único UPDATE (activate_index_version) y
+    retorna la versión que estaba activa.
+    """
+    previous = supabase.rpc("activate_index_version", {"target": version}).execute().data
+    logger.info("versión del índice activada", extra={"version": version, "previous": previous})
+    active_index_version(refresh=True)
+    return previous
+
+
+def rollback() -> str:
+    """Vuelve a la última versión activa antes de la actual."""
+    candidates = [
+        row for row in list_versions()
+        if not row.get("active") and row.get("status") == "retired" and row.get("activated_at")
+    ]
+    if not candidates:
+        raise RuntimeError("No hay una versión anterior para volver atrás")
+    target = max(candidates, key=lambda row: row["activated_at"])["version"]
+    activate(target)
+    return target
+
+
+def prune(keep: int = INDEX_KEEP_VERSIONS) -> List[str]:
+    """
+    Borra las filas de las versiones retiradas más viejas, conservando las
+    `keep` más recientes (contando la activa). Las versiones en construcción
+    no se tocan.
+    """
+    versions = [row for row in list_versions() if row.get("status") in ("active", "retired")]
+    removed = []
+    for row in versions[max(1, keep):]:
+        if row.get("active"):
+            continue
+        supabase.table("soroban_chunks").delete().eq("index_version", row["version"]).execute()
+        supabase.table(VERSIONS_TABLE).update({"status": "deleted"}).eq("version", row["version"]).execute()
+        removed.append(row["version"])
+    if removed:
+        logger.info("versiones del índice borradas", extra={"versions": removed})
+    return removed
+
+
+def main():
+    from app.log import setup_logging
+
+    parser = argparse.ArgumentParser(description="Versiones del índice de chunks (blue/green)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Listar versiones")
+    validate = commands.add_parser("validate", help="Validar una versión sin activarla")
+    validate.add_argument("version")
+    validate.add_argument("--languages", nargs="+")
+    activate_parser = commands.add_parser("activate", help="Activar una versión")
+    activate_parser.add_argument("version")
+    commands.add_parser("rollback", help="Volver a la versión activa anterior")
+    prune_parser = commands.add_parser("prune", help="Borrar versiones viejas")
+    prune_parser.add_argument("--keep", type=int, default=INDEX_KEEP_VERSIONS)
+    args = parser.parse_args()
+
+    setup_logging(fmt="text")
+    if not INDEX_VERSIONING:
+        parser.error("INDEX_VERSIONING está desactivado")
+    if args.command == "list":
+        output: Any = list_versions()
+    elif args.command == "validate":
+        output = validate_version(args.version, args.languages)
+    elif args.command == "activate":
+        output = {"active": args.version, "previous": activate(args.version)}
+    elif args.command == "rollback":
+        output = {"active": rollback()}
+    else:
+        output = {"deleted": prune(args.keep)}
+    print(json.dumps(output, ensure_ascii=False, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
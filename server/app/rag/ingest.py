@@ -1,9 +1,20 @@
 from llama_index.core import SimpleDirectoryReader
+from llama_index.core.schema import TextNode
 from app.rag.chunking import chunk_documents
-from app.embeddings import embed_text
+from app.rag.dedupe import code_fingerprint
+from app.rag.index_versions import active_index_version
+from app.embeddings import EmbeddingProvider, check_dimensions, get_provider, index_model, truncate_embedding
+from app.config import INGEST_DEDUPE_CODE, EMBEDDING_BATCH_SIZE, EMBEDDING_SEARCH_DIMENSIONS
 from app.db import supabase
+from app.metrics import timed, set_request_labels, INGEST_CHUNKS
+from app.log import get_logger, setup_logging
+from typing import Any, Dict, List, Optional, Set
+import hashlib
+import json
 import re
 
+logger = get_logger(__name__)
+
 def infer_metadata(filename: str, content: str, language: str = "es") -> dict:
     """Infiere metadata rica del archivo y su contenido."""
     base_metadata = {}
@@ -122,40 +133,129 @@ def infer_metadata(filename: str, content: str, language: str = "es") -> dict:
     
     return base_metadata
 
-def ingest(language: str = "es"):
-    """Ingesta documentos con chunking optimizado y metadata rica.
-    
-    Args:
-        language: Idioma de la documentación ("es" o "en")
+def _in_version(query, index_version: Optional[str]):
+    """Restringe una consulta a una versión del índice (None = sin versiones)."""
+    return query if index_version is None else query.eq("index_version", index_version)
+
+def check_index_model(model_id: str, index_version: Optional[str] = None):
+    """
+    Falla si el índice ya tiene chunks de otro modelo de embeddings: los
+    vectores de modelos distintos no son comparables. Para cambiar de modelo
+    hay que reingerir en una versión nueva del índice o vaciarlo (reingest_all.py).
     """
-    DOCS_PATH = f"data/docs/{language}"
+    existing = _in_version(supabase.table("soroban_chunks").select("metadata"), index_version).limit(1).execute()
+    if existing.data:
+        current = index_model(existing.data[0].get("metadata") or {})
+        if current != model_id:
+            raise RuntimeError(
+                f"El índice fue construido con {current!r} y el proveedor configurado es {model_id!r}"
+            )
+
+def shared_embedding(fingerprint: str, index_version: Optional[str] = None) -> Optional[List[float]]:
+    """
+    Embedding de un chunk ya ingerido con la misma huella de código (ver
+    app.rag.dedupe), o None si no hay. Solo se reutiliza el vector: cada
+    idioma guarda igual su propia fila con su texto.
+    """
+    with timed("ingest_dedupe_lookup"):
+        query = supabase.table("soroban_chunks") \
+            .select("embedding") \
+            .filter("metadata->>code_hash", "eq", fingerprint)
+        existing = _in_version(query, index_version).limit(1).execute()
+    if not existing.data or existing.data[0].get("embedding") is None:
+        return None
+    embedding = existing.data[0]["embedding"]
+    # PostgREST devuelve las columnas vector como texto "[0.1,0.2,...]"
+    return json.loads(embedding) if isinstance(embedding, str) else embedding
+
+def chunk_key(language: str, node) -> str:
+    """
+    Identidad estable de un chunk entre corridas (idioma, archivo y texto):
+    la guardan el checkpoint de app.rag.ingest_job y metadata.chunk_key.
+    """
+    file_name = node.metadata.get("file_name", "unknown")
+    return hashlib.sha256(f"{language}\0{file_name}\0{node.text}".encode("utf-8")).hexdigest()
+
+def load_nodes(language: str = "es") -> List[TextNode]:
+    """Carga y divide en chunks la documentación de un idioma."""
+    docs_path = f"data/docs/{language}"
+    logger.info("cargando documentos", extra={"path": docs_path, "language": language})
+    with timed("ingest_load"):
+        docs = SimpleDirectoryReader(docs_path).load_data()
+    logger.info("documentos cargados", extra={"documents": len(docs)})
     
-    print(f"📚 Cargando documentos desde {DOCS_PATH} (idioma: {language.upper()})...")
+    logger.info("chunking documentos")
+    with timed("ingest_chunking"):
+        nodes = chunk_documents(docs)
+    logger.info("chunks generados", extra={"chunks": len(nodes)})
+    return nodes
+
+def existing_chunk_keys(keys: List[str], index_version: Optional[str] = None) -> Set[str]:
+    """Cuáles de estos chunks ya están en el índice (por metadata.chunk_key)."""
+    if not keys:
+        return set()
+    with timed("ingest_dedupe_lookup"):
+        query = supabase.table("soroban_chunks") \
+            .select("chunk_key:metadata->>chunk_key") \
+            .in_("metadata->>chunk_key", keys)
+        result = _in_version(query, index_version).execute()
+    return {row["chunk_key"] for row in result.data}
+
+def ingest_batch(
+    nodes: List[TextNode],
+    language: str,
+    provider: EmbeddingProvider,
+    skip_existing: bool = False,
+    index_version: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Ingesta un batch de chunks con una sola llamada de embeddings.
     
-    try:
-        docs = SimpleDirectoryReader(DOCS_PATH).load_data()
-        print(f"✅ {len(docs)} documentos cargados")
-    except Exception as e:
-        print(f"❌ Error cargando documentos: {e}")
-        return
+    Args:
+        skip_existing: Omitir los chunks cuyo chunk_key ya está en el índice
+        index_version: Versión del índice donde escribir (None = sin versiones)
     
-    print("✂️  Chunking documentos...")
-    try:
-        nodes = chunk_documents(docs)
-        print(f"✅ {len(nodes)} chunks generados")
-    except Exception as e:
-        print(f"❌ Error en chunking: {e}")
-        return
+    Returns:
+        {"done": chunk_keys terminados, "ingested": n, "shared": n,
+         "skipped": n, "failed": [(chunk_key, error)]}. "shared" cuenta los
+        chunks ingeridos que reutilizaron el embedding de otro idioma. Si falla
+        el embedding del batch, sus chunks sin embedding compartido quedan en
+        "failed".
+    """
+    outcome: Dict[str, Any] = {"done": [], "ingested": 0, "shared": 0, "skipped": 0, "failed": []}
+    keys = [chunk_key(language, node) for node in nodes]
+    existing = existing_chunk_keys(keys, index_version) if skip_existing else set()
+    pending = []
+    for key, node in zip(keys, nodes):
+        if key in existing:
+            outcome["skipped"] += 1
+            outcome["done"].append(key)
+            continue
+        try:
+            # Código igual al de otro idioma: se reutiliza su embedding
+            fingerprint = code_fingerprint(node.text) if INGEST_DEDUPE_CODE else None
+            reused = shared_embedding(fingerprint, index_version) if fingerprint else None
+            pending.append((key, node, fingerprint, reused))
+        except Exception as e:
+            outcome["failed"].append((key, str(e)))
+            INGEST_CHUNKS.inc(language=language, outcome="error")
     
-    print("🔢 Generando embeddings e ingiriendo...")
-    ingested = 0
-    errors = 0
+    # Generar embeddings del batch en una llamada (solo los que no se comparten)
+    to_embed = [item for item in pending if item[3] is None]
+    embeddings: Dict[str, List[float]] = {}
+    if to_embed:
+        try:
+            with timed("ingest_embedding"):
+                vectors = provider.embed([node.text for _, node, _, _ in to_embed])
+            embeddings = {key: vector for (key, _, _, _), vector in zip(to_embed, vectors)}
+        except Exception as e:
+            outcome["failed"].extend((key, str(e)) for key, _, _, _ in to_embed)
+            INGEST_CHUNKS.inc(len(to_embed), language=language, outcome="error")
+            pending = [item for item in pending if item[3] is not None]
     
-    for i, node in enumerate(nodes):
+    for key, node, fingerprint, reused in pending:
+        embedding = reused if reused is not None else embeddings[key]
         try:
-            # Generar embedding
-            embedding = embed_text(node.text)
-            
             # Obtener metadata del archivo original
             file_name = node.metadata.get("file_name", "unknown")
             
@@ -165,29 +265,92 @@ def ingest(language: str = "es"):
             # Agregar metadata del chunk
             if hasattr(node, 'relationships'):
                 metadata["id_chunk"] = node.id_
+            if node.metadata.get("header_path"):
+                metadata["header_path"] = node.metadata["header_path"]
+            if fingerprint:
+                metadata["code_hash"] = fingerprint
+            metadata["embedding_model"] = provider.model_id
+            metadata["chunk_key"] = key
             
-            # Insertar en Supabase
-            supabase.table("soroban_chunks").insert({
+            row = {
                 "content": node.text,
                 "embedding": embedding,
                 "metadata": metadata
-            }).execute()
+            }
+            if EMBEDDING_SEARCH_DIMENSIONS > 0:
+                # Vector reducido de la primera etapa de búsqueda
+                row["embedding_search"] = truncate_embedding(embedding, EMBEDDING_SEARCH_DIMENSIONS)
+            if index_version is not None:
+                row["index_version"] = index_version
             
-            ingested += 1
+            # Insertar en Supabase
+            with timed("ingest_insert"):
+                supabase.table("soroban_chunks").insert(row).execute()
             
-            # Progress indicator
-            if (i + 1) % 10 == 0:
-                print(f"  📝 Progreso: {i + 1}/{len(nodes)} chunks")
+            outcome["ingested"] += 1
+            outcome["done"].append(key)
+            if reused is not None:
+                outcome["shared"] += 1
+            INGEST_CHUNKS.inc(language=language, outcome="shared" if reused is not None else "ok")
                 
         except Exception as e:
-            errors += 1
-            print(f"  ⚠️  Error en chunk {i}: {e}")
-            continue
+            outcome["failed"].append((key, str(e)))
+            INGEST_CHUNKS.inc(language=language, outcome="error")
+    return outcome
+
+def ingest(language: str = "es"):
+    """Ingesta documentos con chunking optimizado y metadata rica.
+    
+    Escribe en la versión activa del índice, sin reintentos ni checkpoint:
+    para corridas desatendidas o una versión nueva usar
+    `python -m app.rag.ingest_job`.
+    
+    Args:
+        language: Idioma de la documentación ("es" o "en")
+    """
+    set_request_labels(mode="ingest", language=language)
     
-    print(f"\n✅ Ingesta completada:")
-    print(f"   - Chunks ingresados: {ingested}")
-    print(f"   - Errores: {errors}")
-    print(f"   - Tasa de éxito: {(ingested/len(nodes)*100):.1f}%")
+    try:
+        nodes = load_nodes(language)
+    except Exception as e:
+        logger.exception("error cargando documentos")
+        return
+    
+    try:
+        provider = get_provider()
+        check_dimensions(provider)
+        index_version = active_index_version()
+        check_index_model(provider.model_id, index_version)
+    except Exception as e:
+        logger.error("no se puede ingerir con este modelo de embeddings", extra={"error": str(e)})
+        return
+    
+    logger.info("generando embeddings e ingiriendo", extra={"embedding_model": provider.model_id})
+    ingested = 0
+    shared = 0
+    errors = 0
+    
+    for batch_start in range(0, len(nodes), EMBEDDING_BATCH_SIZE):
+        outcome = ingest_batch(
+            nodes[batch_start:batch_start + EMBEDDING_BATCH_SIZE], language, provider, index_version=index_version
+        )
+        ingested += outcome["ingested"]
+        shared += outcome["shared"]
+        errors += len(outcome["failed"])
+        for key, error in outcome["failed"]:
+            logger.warning("error en chunk", extra={"chunk_key": key[:12], "error": error})
+        
+        # Progress indicator
+        logger.info("progreso de ingesta", extra={
+            "done": min(batch_start + EMBEDDING_BATCH_SIZE, len(nodes)), "total": len(nodes)
+        })
+    
+    logger.info("ingesta completada", extra={
+        "ingested": ingested,
+        "shared": shared,
+        "errors": errors,
+        "success_rate": round(ingested / len(nodes) * 100, 1) if nodes else 0.0,
+    })
 
 if __name__ == "__main__":
     import sys
@@ -200,5 +363,5 @@ if __name__ == "__main__":
         print("   Ejemplo: python ingest.py es")
         sys.exit(1)
     
-    print(f"🌍 Ingiriendo documentación en {language.upper()}")
+    setup_logging(fmt="text")
     ingest(language)
@@ -0,0 +1,298 @@
+"""
+Ingesta desatendida con checkpoint, para cron y hooks de deploy.
+
+    python -m app.rag.ingest_job                      # es y en, reanuda si hay checkpoint
+    python -m app.rag.ingest_job --languages en --summary out.json
+    python -m app.rag.ingest_job --fresh --clear      # índice desde cero
+    python -m app.rag.ingest_job --fresh --shadow     # versión nueva del índice, sin cortar el servicio
+
+El checkpoint (JSON, INGEST_CHECKPOINT_PATH) guarda los chunk_key de los
+chunks terminados y se reescribe de forma atómica después de cada batch. Si
+la corrida se corta (caída del proceso, rate limit persistente), la próxima
+invocación saltea lo terminado. Cada batch se reintenta con backoff
+exponencial; si sigue fallando la corrida termina con estado "failed" y se
+reanuda en la próxima invocación. Las corridas son idempotentes aun sin
+checkpoint: los chunks cuyo chunk_key ya está en el índice no se reingieren.
+
+Con --shadow (requiere INDEX_VERSIONING) el job escribe en una versión nueva
+del índice mientras la activa sigue sirviendo; al terminar la valida y la
+activa (ver app.rag.index_versions). Si la validación falla, la versión no
+se activa y el job termina con estado "failed".
+
+Un lock sobre el checkpoint impide corridas simultáneas (cron solapado).
+La última línea de stdout es el resumen en JSON; código de salida 0 si
+terminó, 1 si falló (reanudable), 2 si otra corrida tiene el lock.
+"""
+
+from app.config import EMBEDDING_BATCH_SIZE, INGEST_CHECKPOINT_PATH, INDEX_VERSIONING, INDEX_KEEP_VERSIONS
+from app.db import supabase
+from app.embeddings import check_dimensions, get_provider
+from app.log import get_logger, setup_logging, shutdown_logging
+from app.metrics import set_request_labels
+from app.rag.index_versions import active_index_version, activate, new_version, prune, register_version, validate_version
+from app.rag.ingest import check_index_model, ingest_batch, load_nodes, chunk_key
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import argparse
+import fcntl
+import json
+import os
+import sys
+import time
+import uuid
+
+logger = get_logger(__name__)
+
+CHECKPOINT_VERSION = 1
+
+
+class Checkpoint:
+    """Chunks terminados por idioma de un job, persistidos en un archivo JSON."""
+    def __init__(self, path: Path, state: Dict[str, Any]):
+        self.path = path
+        self.state = state
+        self._done = {language: set(keys) for language, keys in state["done"].items()}
+
+    @classmethod
+    def new(
+        cls, path: Path, model_id: str, languages: List[str], index_version: Optional[str] = None, shadow: bool = False
+    ) -> "Checkpoint":
+        return cls(path, {
+            "version": CHECKPOINT_VERSION,
+            "job_id": uuid.uuid4().hex[:12],
+            "model": model_id,
+            "languages": languages,
+            "index_version": index_version,
+            "shadow": shadow,
+            "status": "running",
+            "started_at": time.time(),
+            "done": {language: [] for language in languages},
+        })
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["Checkpoint"]:
+        """Checkpoint de un job sin terminar, o None si no hay."""
+        if not path.exists():
+            return None
+        try:
+            state = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning("checkpoint ilegible, se ignora", extra={"path": str(path), "error": str(e)})
+            return None
+        if state.get("version") != CHECKPOINT_VERSION or state.get("status") == "completed":
+            return None
+        return cls(path, state)
+
+    @property
+    def job_id(self) -> str:
+        return self.state["job_id"]
+
+    def is_done(self, language: str, key: str) -> bool:
+        return key in self._done.setdefault(language, set())
+
+    def mark_done(self, language: str, keys: List[str]):
+        done = self._done.setdefault(language, set())
+        new = [key for key in keys if key not in done]
+        done.update(new)
+        self.state["done"].setdefault(language, []).extend(new)
+
+    def save(self, status: Optional[str] = None):
+        if status:
+            self.state["status"] = status
+        self.state["updated_at"] = time.time()
+        # Escritura atómica: un corte a mitad de save no deja un JSON roto
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        temporary.write_text(json.dumps(self.state), encoding="utf-8")
+        os.replace(temporary, self.path)
+
+
+def clear_index(index_version: Optional[str] = None):
+    """Elimina todos los chunks del índice (o de una versión)."""
+    query = supabase.table("soroban_chunks").delete()
+    if index_version is not None:
+        query = query.eq("index_version", index_version)
+    query.neq("id_chunk", "00000000-0000-0000-0000-000000000000").execute()
+
+
+def _ingest_language(
+    language: str,
+    checkpoint: Checkpoint,
+    provider,
+    batch_size: int,
+    retries: int,
+    backoff: float
+) -> Dict[str, Any]:
+    set_request_labels(mode="ingest", language=language)
+    index_version = checkpoint.state.get("index_version")
+    nodes = load_nodes(language)
+    stats: Dict[str, Any] = {"total": len(nodes), "resumed": 0, "ingested": 0, "shared": 0, "skipped": 0, "failed": 0}
+    pending = [node for node in nodes if not checkpoint.is_done(language, chunk_key(language, node))]
+    stats["resumed"] = len(nodes) - len(pending)
+    if stats["resumed"]:
+        logger.info("reanudando desde el checkpoint", extra={"language": language, "done": stats["resumed"], "total": len(nodes)})
+
+    for batch_start in range(0, len(pending), batch_size):
+        batch = pending[batch_start:batch_start + batch_size]
+        for attempt in range(retries + 1):
+            outcome = ingest_batch(batch, language, provider, skip_existing=True, index_version=index_version)
+            for field in ("ingested", "shared", "skipped"):
+                stats[field] += outcome[field]
+            checkpoint.mark_done(language, outcome["done"])
+            checkpoint.save()
+            if not outcome["failed"]:
+                break
+            failed = {key for key, _ in outcome["failed"]}
+            batch = [node for node in batch if chunk_key(language, node) in failed]
+            if attempt == retries:
+                stats["failed"] = len(batch)
+                stats["error"] = outcome["failed"][0][1]
+                return stats
+            delay = backoff * 2 ** attempt
+            logger.warning("batch con errores, reintentando", extra={
+                "language": language, "failed": len(batch), "attempt": attempt + 1,
+                "delay_s": delay, "error": outcome["failed"][0][1]
+            })
+            time.sleep(delay)
+        logger.info("progreso de ingesta", extra={
+            "language": language, "done": stats["resumed"] + min(batch_start + batch_size, len(pending)), "total": len(nodes)
+        })
+    return stats
+
+
+def run_job(
+    languages: List[str],
+    checkpoint_path: Path = Path(INGEST_CHECKPOINT_PATH),
+    fresh: bool = False,
+    clear: bool = False,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    retries: int = 5,
+    backoff: float = 2.0,
+    shadow: bool = False,
+    activate_version: bool = True
+) -> Dict[str, Any]:
+    """
+    Corre (o reanuda) un job de ingesta.
+
+    Args:
+        fresh: Descartar el checkpoint existente y empezar un job nuevo
+        clear: Vaciar el índice (o la versión activa) antes de empezar (solo en un job nuevo)
+        shadow: Construir una versión nueva del índice, validarla y activarla
+        activate_version: Con shadow, activar la versión si pasa la validación
+
+    Returns:
+        Resumen serializable con "status" ("completed", "failed" o "locked").
+    """
+    started = time.perf_counter()
+    summary: Dict[str, Any] = {"status": "failed", "checkpoint": str(checkpoint_path), "languages": {}}
+    lock_file = open(checkpoint_path.with_name(checkpoint_path.name + ".lock"), "w")
+    try:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            summary["status"] = "locked"
+            return summary
+
+        provider = get_provider()
+        try:
+            check_dimensions(provider)
+        except RuntimeError as e:
+            summary["error"] = str(e)
+            return summary
+        checkpoint = None if fresh else Checkpoint.load(checkpoint_path)
+        if checkpoint is not None and checkpoint.state["model"] != provider.model_id:
+            summary["error"] = (
+                f"El checkpoint es de {checkpoint.state['model']!r} y el proveedor es {provider.model_id!r}; usa --fresh"
+            )
+            return summary
+        if checkpoint is not None and clear:
+            summary["error"] = "--clear borraría lo ya ingerido por el job a reanudar; usa --fresh --clear"
+            return summary
+        if checkpoint is not None and checkpoint.state.get("shadow", False) != shadow:
+            summary["error"] = "El job a reanudar se empezó con otro valor de --shadow; usa --fresh"
+            return summary
+        if shadow and (clear or not INDEX_VERSIONING):
+            summary["error"] = "--shadow requiere INDEX_VERSIONING y no admite --clear"
+            return summary
+
+        summary["resumed"] = checkpoint is not None
+        if checkpoint is None:
+            if shadow:
+                index_version = new_version()
+                register_version(index_version, provider.model_id)
+            else:
+                index_version = active_index_version()
+            checkpoint = Checkpoint.new(checkpoint_path, provider.model_id, languages, index_version, shadow)
+            if clear:
+                logger.info("vaciando el índice", extra={"index_version": index_version})
+                clear_index(index_version)
+        checkpoint.save("running")
+        index_version = checkpoint.state.get("index_version")
+        summary["job_id"] = checkpoint.job_id
+        summary["model"] = provider.model_id
+        summary["index_version"] = index_version
+        check_index_model(provider.model_id, index_version)
+
+        for language in languages:
+            stats = _ingest_language(language, checkpoint, provider, max(1, batch_size), retries, backoff)
+            summary["languages"][language] = stats
+            if stats["failed"]:
+                summary["error"] = stats.pop("error")
+                checkpoint.save("failed")
+                return summary
+
+        if shadow:
+            validation = validate_version(index_version)
+            summary["validation"] = validation
+            if not validation["ok"]:
+                summary["error"] = "La versión nueva no pasó la validación: " + "; ".join(validation["problems"])
+                checkpoint.save("failed")
+                return summary
+            if activate_version:
+                summary["previous_version"] = activate(index_version)
+                summary["pruned_versions"] = prune(INDEX_KEEP_VERSIONS)
+        checkpoint.save("completed")
+        summary["status"] = "completed"
+        return summary
+    except Exception as e:
+        logger.exception("error en el job de ingesta")
+        summary["error"] = str(e) or type(e).__name__
+        return summary
+    finally:
+        summary["elapsed_s"] = round(time.perf_counter() - started, 2)
+        lock_file.close()
+
+
+_EXIT_CODES = {"completed": 0, "failed": 1, "locked": 2}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingesta de la documentación con checkpoint y reintentos")
+    parser.add_argument("--languages", nargs="+", choices=["es", "en"], default=["es", "en"], help="Idiomas a ingerir, en orden")
+    parser.add_argument("--checkpoint", type=Path, default=Path(INGEST_CHECKPOINT_PATH), help="Archivo de checkpoint")
+    parser.add_argument("--fresh", action="store_true", help="Ignorar el checkpoint y empezar un job nuevo")
+    parser.add_argument("--clear", action="store_true", help="Vaciar el índice antes de empezar (requiere un job nuevo)")
+    parser.add_argument("--shadow", action="store_true", help="Construir una versión nueva del índice y activarla al validarla")
+    parser.add_argument("--no-activate", action="store_true", help="Con --shadow, validar la versión nueva sin activarla")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE, help="Chunks por llamada de embeddings")
+    parser.add_argument("--retries", type=int, default=5, help="Reintentos por batch antes de abortar")
+    parser.add_argument("--backoff", type=float, default=2.0, help="Espera base entre reintentos (segundos, exponencial)")
+    parser.add_argument("--summary", type=Path, help="Escribir también el resumen JSON en este archivo")
+    parser.add_argument("--log-format", choices=["json", "text"], default="json")
+    args = parser.parse_args()
+
+    setup_logging(fmt=args.log_format)
+    summary = run_job(
+        args.languages, args.checkpoint, args.fresh, args.clear, args.batch_size, args.retries, args.backoff,
+        shadow=args.shadow, activate_version=not args.no_activate
+    )
+    # Los logs salen por stdout: vaciarlos antes para que el resumen sea la última línea
+    shutdown_logging()
+    output = json.dumps(summary, ensure_ascii=False)
+    if args.summary:
+        args.summary.write_text(output + "\n", encoding="utf-8")
+    print(output)
+    sys.exit(_EXIT_CODES[summary["status"]])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Jobs de generación asíncronos (/jobs).
+
+POST /jobs crea un job y responde enseguida con su id. El pipeline
+(`query_rag`) corre en un pool de JOBS_WORKERS hilos, fuera de los workers
+HTTP, con un deadline propio (JOBS_TIMEOUT) que empieza al salir de la cola.
+El cliente consulta el estado (GET /jobs/{id}) o se suscribe a los eventos
+(GET /jobs/{id}/events, SSE): las etapas y tokens de app.progress, los
+cambios de estado y un evento final "done" con el resultado o el error.
+
+Con JOBS_MAX_QUEUED jobs esperando, uno nuevo se rechaza con Overloaded
+(429). La concurrencia de los jobs la acota el pool; sus completions pasan
+además por el límite por modelo de app.admission.
+
+Los jobs terminados se guardan JOBS_RESULT_TTL segundos (como mucho
+JOBS_MAX_JOBS). Al terminar se descartan sus eventos de tokens (el texto
+final está en el resultado): quien se suscribe tarde recibe las etapas y el
+resultado.
+"""
+
+from app.admission import HoldEstimate, Overloaded
+from app.config import JOBS_WORKERS, JOBS_MAX_QUEUED, JOBS_TIMEOUT, JOBS_RESULT_TTL, JOBS_MAX_JOBS
+from app.deadline import Deadline, DeadlineExceeded
+from app.log import get_logger
+from app.metrics import Counter, Histogram
+from app.progress import listen_progress
+from app.rag.query import query_rag
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import contextvars
+import threading
+import time
+import uuid
+
+logger = get_logger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+# Razones de cancelación del deadline de un job en curso
+CANCEL_REASON = "job_cancelled"
+SHUTDOWN_REASON = "shutdown"
+
+JOBS = Counter(
+    "sorobai_jobs_total",
+    "Jobs de generación por resultado (submitted, rejected, completed, failed, cancelled)",
+    ("outcome",)
+)
+
+JOB_QUEUE_WAIT = Histogram(
+    "sorobai_job_queue_wait_seconds",
+    "Espera de los jobs en la cola antes de empezar"
+)
+
+JOB_DURATION = Histogram(
+    "sorobai_job_duration_seconds",
+    "Duración de los jobs desde que empiezan a correr",
+    buckets=(1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 180.0, 300.0, 600.0)
+)
+
+
+class Job:
+    """Un job de generación: parámetros, estado, resultado y log de eventos."""
+    def __init__(self, params: Dict[str, Any]):
+        self.job_id = uuid.uuid4().hex
+        self.params = params
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.deadline: Optional[Deadline] = None
+        # (secuencia, evento, datos); la secuencia es el id de los eventos SSE
+        self.events: List[Tuple[int, str, Dict[str, Any]]] = []
+        self._seq = 0
+        self._subscribers: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def emit(self, event: str, data: Dict[str, Any]):
+        with self._lock:
+            self._seq += 1
+            self.events.append((self._seq, event, data))
+            subscribers = list(self._subscribers)
+        for notify in subscribers:
+            try:
+                notify()
+            except Exception:
+                # Un suscriptor roto (p.ej. su event loop ya cerró) no frena el job
+                pass
+
+    def events_since(self, seq: int) -> List[Tuple[int, str, Dict[str, Any]]]:
+        with self._lock:
+            return [entry for entry in self.events if entry[0] > seq]
+
+    def subscribe(self, notify: Callable[[], None]):
+        with self._lock:
+            self._subscribers.append(notify)
+
+    def unsubscribe(self, notify: Callable[[], None]):
+        with self._lock:
+            if notify in self._subscribers:
+                self._subscribers.remove(notify)
+
+    def start(self, timeout: float) -> bool:
+        """Pasa a running; False si el job ya no está en cola (p.ej. cancelado)."""
+        with self._lock:
+            if self.status != "queued":
+                return False
+            self.status = "running"
+            self.started_at = time.time()
+            self.deadline = Deadline(timeout)
+        self.emit("status", {"status": "running"})
+        return True
+
+    def _close_locked(self, status: str, result: Optional[Dict[str, Any]], error: Optional[str]):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        self.events = [entry for entry in self.events if entry[1] != "token"]
+
+    def finish(self, status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> bool:
+        with self._lock:
+            if self.done:
+                return False
+            self._close_locked(status, result, error)
+        self.emit("done", {"status": status, "result": result, "error": error})
+        return True
+
+    def cancel(self, error: str, reason: str = CANCEL_REASON) -> bool:
+        """
+        Si el job está en cola queda cancelado (True); si está corriendo se
+        cancela su deadline y termina al abortar la etapa en curso.
+        """
+        with self._lock:
+            queued = self.status == "queued"
+            if queued:
+                self._close_locked("cancelled", None, error)
+            deadline = self.deadline if self.status == "running" else None
+        if queued:
+            self.emit("done", {"status": "cancelled", "result": None, "error": error})
+        elif deadline is not None:
+            deadline.cancel(reason)
+        return queued
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobStore:
+    """
+    Jobs en memoria y el pool que los ejecuta. Los terminados expiran a los
+    `ttl` segundos; por encima de `max_jobs` se descartan los terminados más
+    viejos.
+    """
+    def __init__(self, workers: int, max_queued: int, timeout: float, ttl: float, max_jobs: int):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queued = 0
+        self._duration = HoldEstimate(initial=20.0)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def submit(self, params: Dict[str, Any]) -> Job:
+        """
+        Encola un job con los parámetros de `query_rag`.
+
+        Raises:
+            Overloaded: Ya hay max_queued jobs esperando
+        """
+        with self._lock:
+            self._sweep_locked()
+            if self._queued >= self.max_queued:
+                JOBS.inc(outcome="rejected")
+                raise Overloaded("jobs", self._duration.retry_after(self._queued, self.workers))
+            job = Job(params)
+            self._jobs[job.job_id] = job
+            self._queued += 1
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            pool = self._pool
+        # Contexto del request que lo creó (request_id en los logs)
+        pool.submit(contextvars.copy_context().run, self._run, job)
+        JOBS.inc(outcome="submitted")
+        logger.info("job encolado", extra={"job_id": job.job_id, "queued": self._queued})
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._sweep_locked()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancela un job en cola o en curso; None si no existe."""
+        job = self.get(job_id)
+        if job is not None and job.cancel("Cancelado por el cliente"):
+            self._dequeued()
+            JOBS.inc(outcome="cancelled")
+        return job
+
+    def _dequeued(self):
+        """
+        Un job salió de la cola. Lo llama solo quien hizo la transición desde
+        "queued" (`Job.start` o `Job.cancel` que retornó True): cada job
+        descuenta una sola vez.
+        """
+        with self._lock:
+            self._queued -= 1
+
+    def _run(self, job: Job):
+        if not job.start(self.timeout):
+            # Cancelado mientras esperaba: ya se descontó al cancelarlo
+            return
+        self._dequeued()
+        JOB_QUEUE_WAIT.observe(job.started_at - job.created_at)
+        labels = {"job_id": job.job_id}
+        logger.info("job iniciado", extra=labels)
+        started = time.perf_counter()
+        try:
+            with listen_progress(job.emit):
+                result = query_rag(deadline=job.deadline, **job.params)
+            status, error = "completed", None
+        except DeadlineExceeded as e:
+            status = "cancelled" if e.reason in (CANCEL_REASON, SHUTDOWN_REASON) else "failed"
+            result, error = None, str(e)
+        except Exception as e:
+            logger.exception("error en job", extra=labels)
+            status, result, error = "failed", None, str(e) or type(e).__name__
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._duration.observe(elapsed)
+        JOB_DURATION.observe(elapsed)
+        if job.finish(status, result=result, error=error):
+            JOBS.inc(outcome=status)
+        logger.info("job terminado", extra={**labels, "status": status, "seconds": round(elapsed, 2)})
+
+    def _sweep_locked(self):
+        """Elimina los jobs terminados vencidos y, si sobran, los terminados más viejos."""
+        now = time.time()
+        for job_id in [
+            job_id for job_id, job in self._jobs.items()
+            if job.done and job.finished_at is not None and now - job.finished_at > self.ttl
+        ]:
+            del self._jobs[job_id]
+        if len(self._jobs) > self.max_jobs:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job.done][:len(self._jobs) - self.max_jobs]:
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        """Cancela los jobs en curso y descarta los encolados (shutdown de la API)."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+            pool, self._pool = self._pool, None
+        for job in jobs:
+            if job.cancel("Servidor detenido", reason=SHUTDOWN_REASON):
+                self._dequeued()
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+job_store = JobStore(JOBS_WORKERS, JOBS_MAX_QUEUED, JOBS_TIMEOUT, JOBS_RESULT_TTL, JOBS_MAX_JOBS)
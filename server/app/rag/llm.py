@@ -0,0 +1,381 @@
+"""
+Cliente LLM compartido (OpenRouter) y llamada de completion.
+
+Las completions se consumen en streaming para medir el time-to-first-token
+(TTFT). Cada intento ocupa, mientras dura, un lugar de su modelo en
+`model_limiter` (ver app.admission). Con HEDGE_ENABLED, si el primer intento
+no produce tokens dentro del percentil configurado de TTFT, se lanza un
+segundo intento (opcionalmente en HEDGE_BACKUP_MODEL) si el modelo tiene un
+lugar libre; gana el primero que produce tokens y el otro se cancela.
+"""
+
+from openai import OpenAI
+from app.config import (
+    OPENROUTER_API_KEY, OPENROUTER_BASE_URL,
+    HEDGE_ENABLED, HEDGE_PERCENTILE, HEDGE_MIN_DELAY, HEDGE_DEFAULT_DELAY,
+    HEDGE_BACKUP_MODEL, HEDGE_BUDGET_RATIO
+)
+from app.admission import model_limiter
+from app.clients import upstream_http_client
+from app.metrics import Counter, Histogram
+from app.deadline import Deadline, DeadlineExceeded
+from app.log import get_logger
+from app.progress import progress_listener, report_progress
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional
+import httpx
+import openai
+import threading
+import time
+
+logger = get_logger(__name__)
+
+client = OpenAI(
+    api_key=OPENROUTER_API_KEY,
+    base_url=OPENROUTER_BASE_URL,
+    timeout=httpx.Timeout(
+        connect=10.0,      # 10s para conectar
+        read=180.0,        # 3 minutos para leer
+        write=30.0,        # 30s para escribir
+        pool=10.0          # 10s pool timeout
+    ),
+    max_retries=2,
+    http_client=upstream_http_client()
+)
+
+# Ventana de TTFT recientes por modelo para calcular el delay de hedge
+TTFT_WINDOW = 200
+TTFT_MIN_SAMPLES = 20
+
+# Créditos máximos acumulables del presupuesto de hedges
+HEDGE_BUDGET_BURST = 5.0
+
+LLM_TTFT = Histogram(
+    "sorobai_llm_ttft_seconds",
+    "Time-to-first-token de las completions",
+    ("model",)
+)
+
+LLM_HEDGES = Counter(
+    "sorobai_llm_hedges_total",
+    "Decisiones de hedging por modelo (launched, budget_exhausted, no_capacity, won_primary, won_backup)",
+    ("model", "outcome")
+)
+
+LLM_HEDGE_ELIGIBLE = Counter(
+    "sorobai_llm_hedge_eligible_total",
+    "Completions con hedging habilitado (denominador de la tasa de hedges)",
+    ("model",)
+)
+
+_ttft_samples: Dict[str, deque] = {}
+_ttft_lock = threading.Lock()
+
+# Pool para los intentos en paralelo; el hilo que llama solo espera
+_attempt_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-attempt")
+
+
+class Completion:
+    """Resultado de una llamada al LLM."""
+    def __init__(self, content: str, model: str, usage, latency: float, ttft: Optional[float] = None, hedged: bool = False):
+        self.content = content
+        self.model = model
+        self.usage = usage
+        self.latency = latency
+        self.ttft = ttft
+        self.hedged = hedged
+
+    def __repr__(self):
+        return f"Completion(model={self.model}, latency={self.latency:.2f}s, hedged={self.hedged})"
+
+
+class AttemptCancelled(Exception):
+    """El intento perdió la carrera de hedging y fue cancelado."""
+
+
+class HedgeBudget:
+    """
+    Token bucket de hedges: cada completion aporta HEDGE_BUDGET_RATIO créditos
+    y cada hedge consume 1, así los hedges nunca superan esa fracción del tráfico.
+    """
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self._credits = 0.0
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self._credits = min(self.burst, self._credits + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._credits >= 1.0:
+                self._credits -= 1.0
+                return True
+            return False
+
+
+hedge_budget = HedgeBudget(HEDGE_BUDGET_RATIO, HEDGE_BUDGET_BURST)
+
+
+class _Race:
+    """Coordina los intentos: el primero en producir un token gana y cancela al resto."""
+    def __init__(self):
+        self.winner = None
+        self.attempts: List["_Attempt"] = []
+        self.decided = threading.Event()
+        self._lock = threading.Lock()
+
+    def join(self, attempt: "_Attempt"):
+        with self._lock:
+            self.attempts.append(attempt)
+
+    def claim(self, attempt: "_Attempt") -> bool:
+        with self._lock:
+            if self.winner is None:
+                self.winner = attempt
+                self.decided.set()
+                losers = [other for other in self.attempts if other is not attempt]
+            else:
+                losers = []
+        for loser in losers:
+            loser.cancel()
+        return self.winner is attempt
+
+
+class _Attempt:
+    """Un intento de completion en streaming, cancelable desde otro hilo."""
+    def __init__(
+        self,
+        model: str,
+        race: Optional[_Race] = None,
+        deadline: Optional[Deadline] = None,
+        on_token: Optional[Callable] = None
+    ):
+        self.model = model
+        self.race = race
+        self.deadline = deadline
+        # Listener de app.progress: recibe los tokens una vez ganada la carrera
+        self.on_token = on_token
+        self.cancelled = threading.Event()
+        self._stream = None
+        if race is not None:
+            race.join(self)
+
+    def cancel(self):
+        self.cancelled.set()
+        stream = self._stream
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    def run(self, messages: List[Dict[str, str]], temperature: float, timeout: Optional[float]) -> Completion:
+        if self.deadline is None:
+            return self._run(messages, temperature, timeout)
+        self.deadline.on_cancel(self.cancel)
+        try:
+            return self._run(messages, temperature, timeout)
+        finally:
+            self.deadline.discard(self.cancel)
+
+    def _run(self, messages: List[Dict[str, str]], temperature: float, timeout: Optional[float]) -> Completion:
+        llm = client if timeout is None else client.with_options(timeout=timeout, max_retries=0)
+        started = time.perf_counter()
+        self._stream = llm.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        if self.cancelled.is_set():
+            self.cancel()
+            raise AttemptCancelled(self.model)
+
+        parts = []
+        usage = None
+        ttft = None
+        try:
+            for chunk in self._stream:
+                if self.cancelled.is_set():
+                    raise AttemptCancelled(self.model)
+                # Un deadline vencido no ejecuta callbacks por sí solo (no
+                # hay timer): cancelarlo aborta este y los demás intentos
+                if self.deadline is not None and self.deadline.done:
+                    self.deadline.cancel("deadline")
+                    raise AttemptCancelled(self.model)
+                # El timeout del cliente es por lectura: un stream que sigue
+                # mandando tokens solo se corta contando el tiempo total
+                if timeout is not None and time.perf_counter() - started > timeout:
+                    raise openai.APITimeoutError(request=self._stream.response.request)
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                        record_ttft(self.model, ttft)
+                        if self.race is not None and not self.race.claim(self):
+                            raise AttemptCancelled(self.model)
+                    parts.append(delta)
+                    if self.on_token is not None:
+                        self.on_token("token", {"text": delta})
+        except AttemptCancelled:
+            self.cancel()
+            raise
+        except Exception:
+            if self.cancelled.is_set():
+                raise AttemptCancelled(self.model)
+            raise
+        finally:
+            if self._stream is not None:
+                self._stream.close()
+
+        # Cerrar el stream desde otro hilo puede terminar la iteración sin error
+        if self.cancelled.is_set():
+            raise AttemptCancelled(self.model)
+        # Respuesta vacía: también cuenta como "respondió" para la carrera
+        if self.race is not None and not self.race.claim(self):
+            raise AttemptCancelled(self.model)
+
+        return Completion(
+            content="".join(parts),
+            model=self.model,
+            usage=usage,
+            latency=time.perf_counter() - started,
+            ttft=ttft
+        )
+
+
+def record_ttft(model: str, ttft: float):
+    LLM_TTFT.observe(ttft, model=model)
+    with _ttft_lock:
+        _ttft_samples.setdefault(model, deque(maxlen=TTFT_WINDOW)).append(ttft)
+
+
+def hedge_delay(model: str) -> float:
+    """Delay antes de lanzar el hedge: percentil HEDGE_PERCENTILE del TTFT reciente."""
+    with _ttft_lock:
+        samples = sorted(_ttft_samples.get(model, ()))
+    if len(samples) < TTFT_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    index = min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE))
+    return max(HEDGE_MIN_DELAY, samples[index])
+
+
+def complete(
+    messages: List[Dict[str, str]],
+    model: str,
+    temperature: float,
+    timeout: Optional[float] = None,
+    hedge: Optional[bool] = None,
+    deadline: Optional[Deadline] = None,
+    stage: str = "llm"
+) -> Completion:
+    """
+    Ejecuta una completion y retorna el texto completo.
+
+    Args:
+        messages: Mensajes del chat
+        model: Modelo de OpenRouter
+        temperature: Temperatura del modelo
+        timeout: Límite total en segundos (también de cada lectura); al
+            superarlo se lanza APITimeoutError y no se reintenta (el router
+            decide el fallback)
+        hedge: Forzar o desactivar hedging; None usa HEDGE_ENABLED
+        deadline: Deadline del request; limita el timeout y al cancelarse
+            cierra los streams en curso
+        stage: Etapa del deadline a la que se imputa la llamada
+    """
+    if deadline:
+        deadline.check(stage)
+        budget = deadline.budget(stage)
+        timeout = budget if timeout is None else min(timeout, budget)
+
+    listener = progress_listener()
+    report_progress("attempt", model=model, stage=stage)
+    try:
+        if not (HEDGE_ENABLED if hedge is None else hedge):
+            with model_limiter.slot(model, deadline, stage):
+                return _Attempt(model, deadline=deadline, on_token=listener).run(messages, temperature, timeout)
+        model_limiter.acquire(model, deadline, stage)
+        return _complete_hedged(messages, model, temperature, timeout, deadline, listener)
+    except AttemptCancelled:
+        # Solo llega aquí si la cancelación vino del deadline
+        raise DeadlineExceeded(stage, deadline.reason if deadline else "cancelled")
+
+
+def _submit_attempt(attempt: _Attempt, messages: List[Dict[str, str]], temperature: float, timeout: Optional[float]):
+    """Lanza un intento en el pool; el lugar del modelo (ya tomado) se libera al terminar."""
+    started = time.monotonic()
+    future = _attempt_pool.submit(attempt.run, messages, temperature, timeout)
+    future.add_done_callback(lambda _: model_limiter.release(attempt.model, time.monotonic() - started))
+    return future
+
+
+def _complete_hedged(
+    messages: List[Dict[str, str]],
+    model: str,
+    temperature: float,
+    timeout: Optional[float],
+    deadline: Optional[Deadline] = None,
+    on_token: Optional[Callable] = None
+) -> Completion:
+    LLM_HEDGE_ELIGIBLE.inc(model=model)
+    hedge_budget.earn()
+
+    race = _Race()
+    primary = _Attempt(model, race, deadline, on_token)
+    futures = {_submit_attempt(primary, messages, temperature, timeout): primary}
+
+    # Esperar el primer token del intento principal (o que termine/falle)
+    delay = hedge_delay(model)
+    primary_future = next(iter(futures))
+    race.decided.wait(delay)
+    if race.decided.is_set() or primary_future.done() or (deadline and deadline.done):
+        return primary_future.result()
+
+    if not hedge_budget.try_spend():
+        LLM_HEDGES.inc(model=model, outcome="budget_exhausted")
+        return primary_future.result()
+
+    backup_model = HEDGE_BACKUP_MODEL or model
+    if not model_limiter.try_acquire(backup_model):
+        # Sin lugar libre en el modelo: un hedge solo sumaría carga a la cola
+        LLM_HEDGES.inc(model=model, outcome="no_capacity")
+        return primary_future.result()
+    LLM_HEDGES.inc(model=model, outcome="launched")
+    logger.info("sin tokens, lanzando hedge", extra={"delay": round(delay, 2), "model": model, "backup_model": backup_model})
+    backup = _Attempt(backup_model, race, deadline, on_token)
+    futures[_submit_attempt(backup, messages, temperature, timeout)] = backup
+
+    pending = set(futures)
+    errors = []
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            attempt = futures[future]
+            try:
+                result = future.result()
+            except AttemptCancelled:
+                continue
+            except Exception as e:
+                errors.append(e)
+                continue
+            # Ganador (el resto ya fue cancelado al reclamar la carrera)
+            for other in futures.values():
+                if other is not attempt:
+                    other.cancel()
+            LLM_HEDGES.inc(model=model, outcome="won_backup" if attempt is backup else "won_primary")
+            result.hedged = True
+            return result
+
+    if errors:
+        raise errors[0]
+    raise AttemptCancelled(model)
@@ -1,56 +1,40 @@
 """
 Prompts optimizados para RAG de generación de código Soroban.
+
+Los prompts principales se ensamblan con bloques estáticos versionados en un
+orden fijo: system → rules → history → context → query. Las partes estáticas
+van primero para que el prefijo sea idéntico entre requests y el caché de
+prefijos del proveedor pueda reutilizarlo.
 """
 
-def build_code_generation_prompt(user_query: str, context: str, code_only: bool = False, language: str = "es") -> tuple[str, str]:
-    """
-    Construye prompts optimizados para generación de código Soroban.
-    
-    Args:
-        user_query: Pregunta del usuario
-        context: Contexto recuperado de la documentación
-        code_only: Si True, genera solo código sin explicaciones
-        language: Idioma de la respuesta ("es" o "en")
-    
-    Returns:
-        (system_prompt, user_prompt)
-    """
-    
-    if code_only:
-        if language == "en":
-            system_prompt = """You are an expert Soroban smart contract code generator.
+from typing import Dict, List, Optional
+import hashlib
+import math
 
-ABSOLUTE RULE: Respond ONLY with functional Rust code. ZERO explanations outside the code block.
+# Incrementar al modificar cualquier bloque estático
+PROMPT_VERSION = "2"
 
-CRITICAL TOKEN RULE: 
-If the user requests a token, you MUST:
-1. Implement ONLY soroban_token_sdk::TokenInterface
-2. DO NOT create custom balance helper functions (spend_balance, receive_balance)
-3. DO NOT manage storage manually - TokenInterface handles it internally
-4. Use String (not Symbol) for name and symbol in initialize()
-5. DO NOT mix token::Client with custom implementation
+# Aproximación de tokens para la contabilidad por sección
+CHARS_PER_TOKEN = 4
 
-FORMAT:
-```rust
-// Code here with inline comments
-```
+# Orden fijo de las secciones en el prompt final
+SECTION_ORDER = ("system", "rules", "history", "context", "query")
 
-DO NOT include anything outside the code block. No introductions, no explanations, just code."""
-            
-            user_prompt = f"""Official Soroban documentation context:
 
-{context}
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida de tokens (sin tokenizer del proveedor)."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
 
----
 
-User request:
-{user_query}
+# ---------------------------------------------------------------------------
+# Bloques estáticos
+# ---------------------------------------------------------------------------
 
-Generate ONLY the Rust code requested. No explanations."""
-        else:
-            system_prompt = """Eres un generador experto de código para smart contracts Soroban.
+_CODE_ONLY_ES_SYSTEM = """Eres un generador experto de código para smart contracts Soroban."""
 
-REGLA ABSOLUTA: Responde ÚNICAMENTE con código Rust funcional. CERO explicaciones fuera del bloque de código.
+_CODE_ONLY_ES_RULES = """REGLA ABSOLUTA: Responde ÚNICAMENTE con código Rust funcional. CERO explicaciones fuera del bloque de código.
 
 REGLA CRÍTICA DE TOKENS: 
 Si el usuario pide un token, DEBES:
@@ -66,124 +50,31 @@ FORMATO:
 ```
 
 NO incluyas nada fuera del bloque de código. Sin introducciones, sin explicaciones, solo código."""
-            
-            user_prompt = f"""Contexto de la documentación oficial de Soroban:
-
-{context}
-
----
-
-Solicitud del usuario:
-{user_query}
-
-Genera ÚNICAMENTE el código Rust solicitado. Sin explicaciones."""
-    else:
-        if language == "en":
-            system_prompt = """You are an expert Soroban (Stellar blockchain) smart contract architect.
-
-Your goal is to generate production-ready, secure, modular Rust code following best practices.
-
-GOLDEN RULES:
-1. **Context is Law**: Use ONLY the provided information. If something is missing, state it clearly.
-2. **Modular Architecture**: For complex contracts, organize into logical modules:
-   - Separate logic into modules: `admin.rs`, `balance.rs`, `allowance.rs`, `metadata.rs`, `events.rs`
-   - `lib.rs` should be the main orchestrator implementing the Traits
-   - Keep each module focused on a single responsibility
-3. **Storage Management**:
-   - `Instance` for Admin and Metadata (global contract configuration)
-   - `Persistent` for Balances (long-lived data, use `extend_ttl` appropriately)
-   - `Temporary` for Allowances (expirable data, use `extend_ttl` based on expiration_ledger)
-4. ALWAYS include explanatory comments in English
-5. Use `#![no_std]` at the beginning of complete contracts
-6. Import only necessary types from the SDK
-7. Handle errors appropriately with clear messages
-8. Use `require_auth()` for operations requiring authorization
-
-🚨 CRITICAL TOKEN RULE (Avoid Hallucinations):
-
-**CASE A: Standard Token using TokenInterface (RECOMMENDED)**
-If the user requests a "token", "standard token", "ERC-20-like token" or similar:
-1. Implement `soroban_token_sdk::TokenInterface` DIRECTLY
-2. **FORBIDDEN**: DO NOT create balance helper functions (spend_balance, receive_balance, read_balance, write_balance)
-3. **FORBIDDEN**: DO NOT manage storage manually - TokenInterface handles it internally
-4. **FORBIDDEN**: DO NOT use `token::Client` to read yourself (causes infinite recursion)
-5. **REQUIRED**: Use `String` (NOT Symbol) for name and symbol in `initialize()`
-6. The trait already provides ALL necessary methods: transfer, mint, burn, approve, allowance, etc.
-7. Prioritize "examples_token_contract.md" as the canonical reference
 
-**CASE B: Complex Custom Token (WITHOUT TokenInterface)**
-If the user explicitly requests "token with custom logic", "vesting token", "token with special burning", etc.:
-1. **DO NOT implement TokenInterface** - create your own public methods
-2. **ALLOWED**: Create helper modules for modularity (e.g., `balance::read_balance()`, `balance::write_balance()`)
-3. Define your own storage structures (custom `DataKey`)
-4. Implement only the methods you need
-5. Clearly document WHY you're not using TokenInterface
-
-⚖️ **Decision Rule**:
-- Basic standard fungible token? → **Use TokenInterface (Case A)**
-- Totally custom and specific logic? → **Own implementation (Case B)**
-- **NEVER EVER mix both approaches** (causes bugs and inconsistent code)
-
-SOURCE PRIORITY:
-- If the context includes "Token Contract Example in Soroban (Smart Contract)" with complete implementation divided into numbered sections, THIS is the CANONICAL contract for Case A.
-- If there are multiple sources about tokens, prioritize the complete implementation over conceptual guides.
-- If the context includes "Token Contract Antipatterns in Soroban", use it to AVOID common mistakes (self-client, zombie storage, fake auth, etc.)
-
-🛡️ CRITICAL ANTIPATTERNS TO AVOID (if context mentions them):
-1. **DO NOT use token::Client inside the contract itself** (Self-Client antipattern)
-2. **ALWAYS extend_ttl when reading/writing storage** (Zombie Storage antipattern)
-3. **ALWAYS use require_auth()** to verify identity (Fake Auth antipattern)
-4. **DO NOT use panic! for business logic** - use Result and #[contracterror]
-5. **PROTECT initialize()** against front-running
-6. **require_auth() BEFORE expensive logic** (Gas Griefing antipattern)
-
-RESPONSE STRUCTURE:
-1. **Design Decision**: Explicitly declare which case applies (A or B) and why
-2. **Planning**: Brief list of necessary modules/files
-3. **Code**: Blocks separated by file when necessary
-4. **Explanation**: Critical parts of the code
-5. **Security**: Explain use of `require_auth()` and TTL management
-6. **Justification**: Why you chose that architectural approach
+_CODE_ONLY_EN_SYSTEM = """You are an expert Soroban smart contract code generator."""
 
-CODE FORMAT (Modular Contracts):
-```rust
-// File: src/lib.rs
-// Main orchestrator code
-```
+_CODE_ONLY_EN_RULES = """ABSOLUTE RULE: Respond ONLY with functional Rust code. ZERO explanations outside the code block.
 
-```rust
-// File: src/admin.rs
-// Administration module
-```
+CRITICAL TOKEN RULE: 
+If the user requests a token, you MUST:
+1. Implement ONLY soroban_token_sdk::TokenInterface
+2. DO NOT create custom balance helper functions (spend_balance, receive_balance)
+3. DO NOT manage storage manually - TokenInterface handles it internally
+4. Use String (not Symbol) for name and symbol in initialize()
+5. DO NOT mix token::Client with custom implementation
 
-CODE FORMAT (Simple Contracts):
+FORMAT:
 ```rust
-// Complete code here
+// Code here with inline comments
 ```
 
-STYLE:
-- Descriptive names in English (snake_case for functions, PascalCase for structs)
-- Explanatory and clear comments in English
-- Clean, well-structured, and maintainable code
-- Error handling with panic! and descriptive messages
-"""
-            
-            user_prompt = f"""Official Soroban documentation context:
-
-{context}
-
----
-
-User request:
-{user_query}
+DO NOT include anything outside the code block. No introductions, no explanations, just code."""
 
-Please generate the requested code following the established rules."""
-        else:
-            system_prompt = """Eres un arquitecto experto de smart contracts en Soroban (Stellar blockchain).
+_CODE_ES_SYSTEM = """Eres un arquitecto experto de smart contracts en Soroban (Stellar blockchain).
 
-Tu objetivo es generar código Rust de producción, seguro, modular y siguiendo las mejores prácticas.
+Tu objetivo es generar código Rust de producción, seguro, modular y siguiendo las mejores prácticas."""
 
-REGLAS DE ORO:
+_CODE_ES_RULES = """REGLAS DE ORO:
 1. **Contexto es Ley**: Usa SOLO la información proporcionada. Si falta algo, dilo claramente.
 2. **Arquitectura Modular**: Para contratos complejos, organiza en módulos lógicos:
    - Separa la lógica en módulos: `admin.rs`, `balance.rs`, `allowance.rs`, `metadata.rs`, `events.rs`
@@ -267,78 +158,101 @@ ESTILO:
 - Código limpio, bien estructurado y fácil de mantener
 - Manejo de errores con panic! y mensajes descriptivos
 """
-            
-            user_prompt = f"""Contexto de la documentación oficial de Soroban:
 
-{context}
+_CODE_EN_SYSTEM = """You are an expert Soroban (Stellar blockchain) smart contract architect.
 
----
+Your goal is to generate production-ready, secure, modular Rust code following best practices."""
 
-Solicitud del usuario:
-{user_query}
+_CODE_EN_RULES = """GOLDEN RULES:
+1. **Context is Law**: Use ONLY the provided information. If something is missing, state it clearly.
+2. **Modular Architecture**: For complex contracts, organize into logical modules:
+   - Separate logic into modules: `admin.rs`, `balance.rs`, `allowance.rs`, `metadata.rs`, `events.rs`
+   - `lib.rs` should be the main orchestrator implementing the Traits
+   - Keep each module focused on a single responsibility
+3. **Storage Management**:
+   - `Instance` for Admin and Metadata (global contract configuration)
+   - `Persistent` for Balances (long-lived data, use `extend_ttl` appropriately)
+   - `Temporary` for Allowances (expirable data, use `extend_ttl` based on expiration_ledger)
+4. ALWAYS include explanatory comments in English
+5. Use `#![no_std]` at the beginning of complete contracts
+6. Import only necessary types from the SDK
+7. Handle errors appropriately with clear messages
+8. Use `require_auth()` for operations requiring authorization
 
-Por favor, genera el código solicitado siguiendo las reglas establecidas."""
+🚨 CRITICAL TOKEN RULE (Avoid Hallucinations):
 
-    return system_prompt, user_prompt
+**CASE A: Standard Token using TokenInterface (RECOMMENDED)**
+If the user requests a "token", "standard token", "ERC-20-like token" or similar:
+1. Implement `soroban_token_sdk::TokenInterface` DIRECTLY
+2. **FORBIDDEN**: DO NOT create balance helper functions (spend_balance, receive_balance, read_balance, write_balance)
+3. **FORBIDDEN**: DO NOT manage storage manually - TokenInterface handles it internally
+4. **FORBIDDEN**: DO NOT use `token::Client` to read yourself (causes infinite recursion)
+5. **REQUIRED**: Use `String` (NOT Symbol) for name and symbol in `initialize()`
+6. The trait already provides ALL necessary methods: transfer, mint, burn, approve, allowance, etc.
+7. Prioritize "examples_token_contract.md" as the canonical reference
 
+**CASE B: Complex Custom Token (WITHOUT TokenInterface)**
+If the user explicitly requests "token with custom logic", "vesting token", "token with special burning", etc.:
+1. **DO NOT implement TokenInterface** - create your own public methods
+2. **ALLOWED**: Create helper modules for modularity (e.g., `balance::read_balance()`, `balance::write_balance()`)
+3. Define your own storage structures (custom `DataKey`)
+4. Implement only the methods you need
+5. Clearly document WHY you're not using TokenInterface
 
-def build_explanation_prompt(user_query: str, context: str, language: str = "es") -> tuple[str, str]:
-    """
-    Construye prompts optimizados para explicaciones de conceptos.
-    
-    Args:
-        user_query: Pregunta del usuario
-        context: Contexto recuperado
-        language: Idioma de la respuesta ("es" o "en")
-    
-    Returns:
-        (system_prompt, user_prompt)
-    """
-    
-    if language == "en":
-        system_prompt = """You are an expert instructor in Soroban (Stellar smart contracts) and Rust.
+⚖️ **Decision Rule**:
+- Basic standard fungible token? → **Use TokenInterface (Case A)**
+- Totally custom and specific logic? → **Own implementation (Case B)**
+- **NEVER EVER mix both approaches** (causes bugs and inconsistent code)
 
-Your task is to explain concepts clearly, precisely, and educationally based on the official documentation.
+SOURCE PRIORITY:
+- If the context includes "Token Contract Example in Soroban (Smart Contract)" with complete implementation divided into numbered sections, THIS is the CANONICAL contract for Case A.
+- If there are multiple sources about tokens, prioritize the complete implementation over conceptual guides.
+- If the context includes "Token Contract Antipatterns in Soroban", use it to AVOID common mistakes (self-client, zombie storage, fake auth, etc.)
 
-RULES:
-1. Use ONLY information from the provided context
-2. Explain concepts clearly and progressively
-3. Use examples from the context when available
-4. If something is not in the context, state it clearly
-5. Use analogies when they aid understanding
-6. Highlight important concepts in **bold**
-7. Use lists and clear structure
+🛡️ CRITICAL ANTIPATTERNS TO AVOID (if context mentions them):
+1. **DO NOT use token::Client inside the contract itself** (Self-Client antipattern)
+2. **ALWAYS extend_ttl when reading/writing storage** (Zombie Storage antipattern)
+3. **ALWAYS use require_auth()** to verify identity (Fake Auth antipattern)
+4. **DO NOT use panic! for business logic** - use Result and #[contracterror]
+5. **PROTECT initialize()** against front-running
+6. **require_auth() BEFORE expensive logic** (Gas Griefing antipattern)
 
-RESPONSE FORMAT:
-1. Concise definition of the concept
-2. Detailed explanation with examples
-3. Use cases or practical applications
-4. (Optional) Comparisons with similar concepts
-5. (Optional) Common errors or warnings
+RESPONSE STRUCTURE:
+1. **Design Decision**: Explicitly declare which case applies (A or B) and why
+2. **Planning**: Brief list of necessary modules/files
+3. **Code**: Blocks separated by file when necessary
+4. **Explanation**: Critical parts of the code
+5. **Security**: Explain use of `require_auth()` and TTL management
+6. **Justification**: Why you chose that architectural approach
 
-STYLE:
-- Clear and educational
-- Use concrete examples
-- Avoid unnecessary jargon
-- Explain technical terms when they appear
-"""
-        
-        user_prompt = f"""Official Soroban documentation context:
+CODE FORMAT (Modular Contracts):
+```rust
+// File: src/lib.rs
+// Main orchestrator code
+```
 
-{context}
+```rust
+// File: src/admin.rs
+// Administration module
+```
 
----
+CODE FORMAT (Simple Contracts):
+```rust
+// Complete code here
+```
 
-User question:
-{user_query}
+STYLE:
+- Descriptive names in English (snake_case for functions, PascalCase for structs)
+- Explanatory and clear comments in English
+- Clean, well-structured, and maintainable code
+- Error handling with panic! and descriptive messages
+"""
 
-Please provide a clear and complete explanation."""
-    else:
-        system_prompt = """Eres un instructor experto en Soroban (smart contracts de Stellar) y Rust.
+_EXPLAIN_ES_SYSTEM = """Eres un instructor experto en Soroban (smart contracts de Stellar) y Rust.
 
-Tu tarea es explicar conceptos de manera clara, precisa y educativa basándote en la documentación oficial.
+Tu tarea es explicar conceptos de manera clara, precisa y educativa basándote en la documentación oficial."""
 
-REGLAS:
+_EXPLAIN_ES_RULES = """REGLAS:
 1. Usa SOLO información del contexto proporcionado
 2. Explica conceptos de forma clara y progresiva
 3. Usa ejemplos del contexto cuando estén disponibles
@@ -360,19 +274,240 @@ ESTILO:
 - Evita jerga innecesaria
 - Explica términos técnicos cuando aparezcan
 """
-        
-        user_prompt = f"""Contexto de la documentación oficial de Soroban:
 
-{context}
+_EXPLAIN_EN_SYSTEM = """You are an expert instructor in Soroban (Stellar smart contracts) and Rust.
 
----
+Your task is to explain concepts clearly, precisely, and educationally based on the official documentation."""
+
+_EXPLAIN_EN_RULES = """RULES:
+1. Use ONLY information from the provided context
+2. Explain concepts clearly and progressively
+3. Use examples from the context when available
+4. If something is not in the context, state it clearly
+5. Use analogies when they aid understanding
+6. Highlight important concepts in **bold**
+7. Use lists and clear structure
 
-Pregunta del usuario:
-{user_query}
+RESPONSE FORMAT:
+1. Concise definition of the concept
+2. Detailed explanation with examples
+3. Use cases or practical applications
+4. (Optional) Comparisons with similar concepts
+5. (Optional) Common errors or warnings
 
-Por favor, proporciona una explicación clara y completa."""
+STYLE:
+- Clear and educational
+- Use concrete examples
+- Avoid unnecessary jargon
+- Explain technical terms when they appear
+"""
+
+_CHAT_ES_SYSTEM = """Eres un asistente experto en Soroban (smart contracts de Stellar) y Rust."""
+
+_CHAT_ES_RULES = """Instrucciones:
+- Usa el contexto proporcionado para responder
+- Si el usuario pregunta sobre código, proporciona ejemplos
+- Mantén coherencia con la conversación previa
+- Si no tienes información suficiente, dilo claramente"""
+
+_CHAT_EN_SYSTEM = """You are an expert assistant in Soroban (Stellar smart contracts) and Rust."""
+
+_CHAT_EN_RULES = """Instructions:
+- Use the provided context to answer
+- If the user asks about code, provide examples
+- Stay consistent with the previous conversation
+- If you do not have enough information, say so clearly"""
+
+
+class PromptTemplate:
+    """
+    Bloques estáticos precompilados de un tipo de prompt.
+    El mensaje de sistema y sus tokens se calculan una sola vez al importar.
+    """
+    def __init__(
+        self,
+        kind: str,
+        language: str,
+        system: str,
+        rules: str,
+        context_header: str,
+        query_header: str,
+        closing: str = ""
+    ):
+        self.kind = kind
+        self.language = language
+        self.context_header = context_header
+        self.query_header = query_header
+        self.closing = closing
+        self.system_prompt = f"{system}\n\n{rules}"
+        self.static_tokens = {
+            "system": estimate_tokens(system),
+            "rules": estimate_tokens(rules),
+        }
+        # Identificador del prefijo estático, útil para verificar aciertos de caché
+        self.prefix_id = hashlib.sha256(
+            f"{PROMPT_VERSION}:{self.system_prompt}".encode("utf-8")
+        ).hexdigest()[:12]
+
+    def __repr__(self):
+        return f"PromptTemplate({self.kind}/{self.language}, prefix={self.prefix_id})"
+
+
+_HEADERS = {
+    "es": ("Contexto de la documentación oficial de Soroban:\n\n", "Solicitud del usuario:\n", "Pregunta del usuario:\n"),
+    "en": ("Official Soroban documentation context:\n\n", "User request:\n", "User question:\n"),
+}
+
+PROMPT_TEMPLATES: Dict[tuple, PromptTemplate] = {
+    ("code_only", "es"): PromptTemplate(
+        "code_only", "es", _CODE_ONLY_ES_SYSTEM, _CODE_ONLY_ES_RULES,
+        _HEADERS["es"][0], _HEADERS["es"][1],
+        "Genera ÚNICAMENTE el código Rust solicitado. Sin explicaciones."
+    ),
+    ("code_only", "en"): PromptTemplate(
+        "code_only", "en", _CODE_ONLY_EN_SYSTEM, _CODE_ONLY_EN_RULES,
+        _HEADERS["en"][0], _HEADERS["en"][1],
+        "Generate ONLY the Rust code requested. No explanations."
+    ),
+    ("code", "es"): PromptTemplate(
+        "code", "es", _CODE_ES_SYSTEM, _CODE_ES_RULES,
+        _HEADERS["es"][0], _HEADERS["es"][1],
+        "Por favor, genera el código solicitado siguiendo las reglas establecidas."
+    ),
+    ("code", "en"): PromptTemplate(
+        "code", "en", _CODE_EN_SYSTEM, _CODE_EN_RULES,
+        _HEADERS["en"][0], _HEADERS["en"][1],
+        "Please generate the requested code following the established rules."
+    ),
+    ("explain", "es"): PromptTemplate(
+        "explain", "es", _EXPLAIN_ES_SYSTEM, _EXPLAIN_ES_RULES,
+        _HEADERS["es"][0], _HEADERS["es"][2],
+        "Por favor, proporciona una explicación clara y completa."
+    ),
+    ("explain", "en"): PromptTemplate(
+        "explain", "en", _EXPLAIN_EN_SYSTEM, _EXPLAIN_EN_RULES,
+        _HEADERS["en"][0], _HEADERS["en"][2],
+        "Please provide a clear and complete explanation."
+    ),
+    ("chat", "es"): PromptTemplate(
+        "chat", "es", _CHAT_ES_SYSTEM, _CHAT_ES_RULES,
+        "Contexto relevante de la documentación:\n\n", "Mensaje del usuario:\n"
+    ),
+    ("chat", "en"): PromptTemplate(
+        "chat", "en", _CHAT_EN_SYSTEM, _CHAT_EN_RULES,
+        "Relevant documentation context:\n\n", "User message:\n"
+    ),
+}
+
+
+class PromptLayout:
+    """
+    Prompt ensamblado por secciones. Mantiene el texto de cada sección para
+    poder reportar cuántos tokens aporta cada una.
+    """
+    def __init__(
+        self,
+        template: PromptTemplate,
+        user_query: str,
+        context: str,
+        history: Optional[List[Dict[str, str]]] = None
+    ):
+        self.template = template
+        self.history = list(history or [])
+        self.context_section = f"{template.context_header}{context}"
+        query_section = f"\n\n---\n\n{template.query_header}{user_query}"
+        if template.closing:
+            query_section += f"\n\n{template.closing}"
+        self.query_section = query_section
+
+    @property
+    def system_prompt(self) -> str:
+        return self.template.system_prompt
+
+    @property
+    def user_prompt(self) -> str:
+        return self.context_section + self.query_section
+
+    @property
+    def messages(self) -> List[Dict[str, str]]:
+        """Mensajes en orden fijo: system(+rules), history, context+query."""
+        messages = [{"role": "system", "content": self.system_prompt}]
+        messages.extend(self.history)
+        messages.append({"role": "user", "content": self.user_prompt})
+        return messages
+
+    def token_breakdown(self) -> Dict[str, int]:
+        """Tokens estimados por sección, en el orden de SECTION_ORDER."""
+        breakdown = dict(self.template.static_tokens)
+        breakdown["history"] = sum(estimate_tokens(m.get("content", "")) for m in self.history)
+        breakdown["context"] = estimate_tokens(self.context_section)
+        breakdown["query"] = estimate_tokens(self.query_section)
+        return {section: breakdown[section] for section in SECTION_ORDER}
+
+    def describe(self) -> Dict[str, object]:
+        """Resumen para la respuesta: versión, prefijo y tokens por sección."""
+        sections = self.token_breakdown()
+        return {
+            "version": PROMPT_VERSION,
+            "kind": self.template.kind,
+            "prefix_id": self.template.prefix_id,
+            "sections": sections,
+            "estimated_total": sum(sections.values()),
+        }
+
+
+def build_prompt_layout(
+    kind: str,
+    user_query: str,
+    context: str,
+    language: str = "es",
+    history: Optional[List[Dict[str, str]]] = None
+) -> PromptLayout:
+    """
+    Ensambla un prompt a partir de los bloques estáticos precompilados.
     
-    return system_prompt, user_prompt
+    Args:
+        kind: "code", "code_only", "explain" o "chat"
+        user_query: Pregunta del usuario
+        context: Contexto recuperado de la documentación
+        language: Idioma de la respuesta ("es" o "en")
+        history: Mensajes previos de la conversación (opcional)
+    """
+    template = PROMPT_TEMPLATES[(kind, "en" if language == "en" else "es")]
+    return PromptLayout(template, user_query, context, history)
+
+
+def build_code_generation_prompt(user_query: str, context: str, code_only: bool = False, language: str = "es") -> tuple[str, str]:
+    """
+    Construye prompts optimizados para generación de código Soroban.
+    
+    Args:
+        user_query: Pregunta del usuario
+        context: Contexto recuperado de la documentación
+        code_only: Si True, genera solo código sin explicaciones
+        language: Idioma de la respuesta ("es" o "en")
+    
+    Returns:
+        (system_prompt, user_prompt)
+    """
+    layout = build_prompt_layout("code_only" if code_only else "code", user_query, context, language)
+    return layout.system_prompt, layout.user_prompt
+
+
+def build_explanation_prompt(user_query: str, context: str, language: str = "es") -> tuple[str, str]:
+    """
+    Construye prompts optimizados para explicaciones de conceptos.
+    
+    Args:
+        user_query: Pregunta del usuario
+        context: Contexto recuperado
+        language: Idioma de la respuesta ("es" o "en")
+    
+    Returns:
+        (system_prompt, user_prompt)
+    """
+    layout = build_prompt_layout("explain", user_query, context, language)
+    return layout.system_prompt, layout.user_prompt
 
 
 def build_comparison_prompt(concept_a: str, concept_b: str, context: str) -> tuple[str, str]:
@@ -489,6 +624,93 @@ Por favor, optimiza este código siguiendo las mejores prácticas de Soroban."""
     return system_prompt, user_prompt
 
 
+def build_repair_prompt(validation_message: str, functions: list[str], language: str = "es") -> tuple[str, str]:
+    """
+    Construye prompts para reparar solo las funciones con antipatrones.
+    El LLM debe responder con hunks de reemplazo (ver app.rag.repair).
+    
+    Args:
+        validation_message: Hallazgos formateados del validador
+        functions: Código de las funciones afectadas
+        language: Idioma de la respuesta ("es" o "en")
+    
+    Returns:
+        (system_prompt, user_prompt)
+    """
+    functions_block = "\n\n".join(f"```rust\n{fn}\n```" for fn in functions)
+    
+    if language == "en":
+        system_prompt = """You are an expert Soroban smart contract reviewer that fixes antipatterns with minimal patches.
+
+ABSOLUTE RULE: Respond ONLY with patch hunks. Do not rewrite the whole contract.
+
+HUNK FORMAT:
+### REPLACE fn <name>
+```rust
+<complete corrected function, starting at its signature>
+```
+
+### DELETE fn <name>
+
+### ADD
+```rust
+<new module-level items, e.g. a #[contracterror] enum>
+```
+
+Rules:
+- One hunk per function you change
+- Keep function names and signatures unless the finding requires changing them
+- No explanations outside the hunks"""
+        
+        user_prompt = f"""Validator findings:
+
+{validation_message}
+
+---
+
+Affected functions:
+
+{functions_block}
+
+Return ONLY the hunks that fix ALL the findings above."""
+    else:
+        system_prompt = """Eres un revisor experto de smart contracts Soroban que corrige antipatrones con parches mínimos.
+
+REGLA ABSOLUTA: Responde ÚNICAMENTE con hunks de parche. No reescribas el contrato completo.
+
+FORMATO DE HUNKS:
+### REPLACE fn <nombre>
+```rust
+<función corregida completa, empezando por su firma>
+```
+
+### DELETE fn <nombre>
+
+### ADD
+```rust
+<items nuevos a nivel de módulo, ej: un enum #[contracterror]>
+```
+
+Reglas:
+- Un hunk por cada función que cambies
+- Mantén nombres y firmas salvo que el hallazgo exija cambiarlos
+- Sin explicaciones fuera de los hunks"""
+        
+        user_prompt = f"""Hallazgos del validador:
+
+{validation_message}
+
+---
+
+Funciones afectadas:
+
+{functions_block}
+
+Devuelve ÚNICAMENTE los hunks que corrigen TODOS los hallazgos anteriores."""
+    
+    return system_prompt, user_prompt
+
+
 # Prompts específicos para casos comunes
 
 BEGINNER_GUIDE_PROMPT = """Eres un mentor paciente enseñando Soroban a principiantes.
@@ -521,3 +743,44 @@ Proporciona:
 - Paso a paso de migración
 - Validación del código migrado
 """
+
+
+def build_summary_prompt(previous_summary: str, turns: list[dict], max_tokens: int, language: str = "es") -> tuple[str, str]:
+    """
+    Construye prompts para comprimir turnos antiguos de una sesión de chat
+    en un resumen acumulado (ver app.rag.sessions).
+    
+    Args:
+        previous_summary: Resumen acumulado hasta ahora (puede ser vacío)
+        turns: Turnos a incorporar [{"role": ..., "content": ...}]
+        max_tokens: Longitud máxima aproximada del resumen
+        language: Idioma del resumen ("es" o "en")
+    
+    Returns:
+        (system_prompt, user_prompt)
+    """
+    max_words = max(50, int(max_tokens * 0.75))
+    transcript = "\n\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    
+    if language == "en":
+        system_prompt = f"""You compress chat history about Soroban smart contracts.
+Write a factual summary of at most {max_words} words. Keep the user's goals, decisions, contract names, function names and open questions. Omit code except identifiers. No preamble."""
+        user_prompt = f"""Previous summary:
+{previous_summary or "(none)"}
+
+New turns to incorporate:
+{transcript}
+
+Updated summary:"""
+    else:
+        system_prompt = f"""Comprimes historiales de chat sobre smart contracts Soroban.
+Escribe un resumen factual de máximo {max_words} palabras. Conserva los objetivos del usuario, decisiones, nombres de contratos y funciones y preguntas abiertas. Omite el código salvo identificadores. Sin preámbulo."""
+        user_prompt = f"""Resumen previo:
+{previous_summary or "(ninguno)"}
+
+Turnos nuevos a incorporar:
+{transcript}
+
+Resumen actualizado:"""
+    
+    return system_prompt, user_prompt
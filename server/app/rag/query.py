@@ -1,30 +1,42 @@
 from app.rag.retrieve import retrieve_context_with_metadata
-from app.rag.prompts import build_code_generation_prompt, build_explanation_prompt
-from app.rag.validators import validate_soroban_code, format_validation_message, should_validate_code
-from openai import OpenAI
-from app.config import OPENROUTER_API_KEY
-from typing import List, Dict, Any
+from app.rag.index_versions import active_index_version
+from app.rag.prompts import build_prompt_layout, build_repair_prompt, PromptLayout
+from app.rag.validators import validate_soroban_code, format_validation_message, should_validate_code, CodeValidationResult
+from app.rag.validation import validation_report
+from app.rag.repair import select_offending_functions, parse_hunks, apply_hunks
+from app.rag.llm import client, complete, Completion
+from app.rag.routing import classify_query, plan_route, complete_routed
+from app.rag.sessions import ChatSession, session_store, fit_history, fit_context
+from app.config import (
+    VALIDATION_REPAIR_MODE, MODEL_TIER_STANDARD, REQUEST_TIMEOUT, RETRY_MIN_BUDGET,
+    SESSION_HISTORY_TOKENS, SESSION_CONTEXT_TOKENS
+)
+from app.deadline import Deadline, DeadlineExceeded
+from app.log import get_logger
+from app.progress import report_progress
+from app.metrics import (
+    PROMPT_SECTION_TOKENS, PROMPT_TOKENS, PROMPT_CACHED_TOKENS, REQUESTS, LLM_TOKENS,
+    timed, observe_stage, set_request_labels
+)
+from app.admission import Overloaded
+from typing import List, Dict, Any, Optional
 import httpx
+import openai
 import re
+import time
 
-client = OpenAI(
-    api_key=OPENROUTER_API_KEY,
-    base_url="https://openrouter.ai/api/v1",
-    timeout=httpx.Timeout(
-        connect=10.0,      # 10s para conectar
-        read=180.0,        # 3 minutos para leer
-        write=30.0,        # 30s para escribir
-        pool=10.0          # 10s pool timeout
-    ),
-    max_retries=2 
-)
+logger = get_logger(__name__)
+
+# Errores de la reparación que no invalidan la primera respuesta: se entrega
+# esa con la advertencia de validación (repair_mode "skipped")
+REPAIR_ERRORS = (DeadlineExceeded, Overloaded, openai.APIError, httpx.HTTPError)
 
-# Modelo para generación de código
+# Modelo por defecto para generación de código (tier "standard" del router)
 # Opciones por velocidad:
 # - deepseek/deepseek-chat (RÁPIDO, 10-15s, calidad buena)
 # - deepseek/deepseek-r1-0528:free (LENTO, 60s+, calidad excelente)
 # - anthropic/claude-3.5-sonnet (MUY RÁPIDO, 5-10s, calidad excelente, PAGO)
-CODE_MODEL = "deepseek/deepseek-chat"  # Cambiado de R1 a Chat para velocidad
+CODE_MODEL = MODEL_TIER_STANDARD
 
 def detect_language(query: str) -> str:
     """
@@ -78,15 +90,153 @@ def detect_language(query: str) -> str:
     # Default a español
     return "es"
 
+def extract_code_block(answer: str) -> str:
+    """
+    Extrae el código principal de una respuesta markdown.
+    Si hay bloques rust retorna el primero (usualmente el principal).
+    """
+    rust_code_blocks = re.findall(r'```rust\n(.*?)```', answer, re.DOTALL)
+    if rust_code_blocks:
+        return rust_code_blocks[0]
+    if '```' in answer:
+        # Bloques genéricos sin especificar lenguaje
+        generic_blocks = re.findall(r'```\n(.*?)```', answer, re.DOTALL)
+        if generic_blocks:
+            return generic_blocks[0]
+    return answer
+
+
+def repair_with_patch(
+    answer: str,
+    code: str,
+    validation_result: CodeValidationResult,
+    model: str,
+    temperature: float,
+    language: str,
+    deadline: Optional[Deadline] = None
+) -> Optional[str]:
+    """
+    Repara solo las funciones con antipatrones y aplica los hunks localmente.
+    
+    Returns:
+        Respuesta con el código parcheado, o None si el parche no es viable
+        o no se pudo aplicar (se debe regenerar completo).
+    """
+    functions = select_offending_functions(code, validation_result)
+    if not functions:
+        logger.info("hallazgos no atribuibles a funciones, se regenera completo")
+        return None
+    
+    system_prompt, user_prompt = build_repair_prompt(
+        format_validation_message(validation_result),
+        [fn.text for fn in functions],
+        language=language
+    )
+    
+    logger.info("reparando funciones con parche", extra={"functions": [fn.name for fn in functions]})
+    completion = complete(
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        model=model,
+        temperature=temperature,
+        deadline=deadline,
+        stage="repair"
+    )
+    
+    patched = apply_hunks(code, parse_hunks(completion.content))
+    if patched is None:
+        logger.info("el parche no se pudo aplicar, se regenera completo")
+        return None
+    
+    return answer.replace(code, patched, 1)
+
+
+def repair_with_regeneration(
+    answer: str,
+    validation_result: CodeValidationResult,
+    user_query: str,
+    context: str,
+    system_prompt: str,
+    user_prompt: str,
+    model: str,
+    temperature: float,
+    deadline: Optional[Deadline] = None
+) -> str:
+    """Regenera la respuesta completa pidiendo corregir los hallazgos del validador."""
+    correction_prompt = f"""El código generado contiene los siguientes errores/antipatrones:
+
+{format_validation_message(validation_result)}
+
+Por favor, regenera el código corrigiendo estos problemas específicos.
+
+Query original del usuario:
+{user_query}
+
+Contexto de documentación:
+{context}
+
+CRÍTICO: Corrige TODOS los antipatrones mencionados arriba."""
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+        {"role": "assistant", "content": answer},
+        {"role": "user", "content": correction_prompt}
+    ]
+
+    logger.info("regenerando código completo")
+    return complete(
+        messages, model=model, temperature=temperature, deadline=deadline, stage="repair"
+    ).content
+
+
+def record_prompt_sections(layout: PromptLayout):
+    """Registra los tokens estimados por sección del prompt."""
+    for section, tokens in layout.token_breakdown().items():
+        PROMPT_SECTION_TOKENS.observe(tokens, kind=layout.template.kind, section=section)
+
+
+def record_prompt_usage(layout: PromptLayout, model: str, usage):
+    """Registra tokens de prompt reales y los servidos desde el caché del proveedor."""
+    if usage is None:
+        return
+    kind = layout.template.kind
+    PROMPT_TOKENS.inc(usage.prompt_tokens or 0, kind=kind, model=model)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details else None
+    if cached:
+        PROMPT_CACHED_TOKENS.inc(cached, kind=kind, model=model)
+
+
+def record_llm_completion(completion: Completion, mode: str):
+    """Registra TTFT, duración total y tokens de una completion."""
+    if completion.ttft is not None:
+        observe_stage("llm_ttft", completion.ttft, model=completion.model)
+    observe_stage("llm_total", completion.latency, model=completion.model)
+    if completion.usage is not None:
+        LLM_TOKENS.inc(completion.usage.prompt_tokens or 0, mode=mode, model=completion.model, type="prompt")
+        LLM_TOKENS.inc(completion.usage.completion_tokens or 0, mode=mode, model=completion.model, type="completion")
+
+
+def effective_k(user_query: str, k: int) -> int:
+    """Reducir chunks para tokens (más rápido)."""
+    is_token_query = 'token' in user_query.lower()
+    return max(3, k - 2) if is_token_query else k  # Menos chunks para tokens
+
+
 def query_rag(
     user_query: str,
     mode: str = "code",  # "code" o "explain"
     k: int = 5,
-    model: str = CODE_MODEL,
+    model: Optional[str] = None,
     temperature: float = 0.1,
     stream: bool = False,
     code_only: bool = False,
-    language: str = None
+    language: str = None,
+    deadline: Optional[Deadline] = None,
+    chunks: Optional[List[Dict[str, Any]]] = None
 ) -> Dict[str, Any]:
     """
     Pipeline completo de RAG para generación de código o explicaciones.
@@ -95,32 +245,41 @@ def query_rag(
         user_query: Pregunta o solicitud del usuario
         mode: "code" para generación de código, "explain" para explicaciones
         k: Número de chunks a recuperar
-        model: Modelo de LLM a usar
+        model: Modelo de LLM a usar; None para elegirlo según la clase de consulta
         temperature: Temperatura del modelo (0.1 para código, 0.7 para explicaciones)
         stream: Si True, retorna un generador para streaming
         code_only: Si True, genera solo código sin explicaciones
         language: Forzar idioma ("es" o "en"), None para auto-detección
+        deadline: Deadline del request; al vencer o cancelarse aborta la etapa
+            en curso con DeadlineExceeded
+        chunks: Contexto ya recuperado (p.ej. por retrieve_batch); None para
+            recuperarlo aquí
     
     Returns:
         Dict con la respuesta, fuentes y metadata
     """
+    if deadline is None:
+        deadline = Deadline(REQUEST_TIMEOUT)
     
     # Auto-detectar idioma si no se especifica
     if language is None:
-        language = detect_language(user_query)
+        with timed("language_detection", mode=mode):
+            language = detect_language(user_query)
     
-    print(f"🌍 Idioma detectado: {language.upper()}")
+    set_request_labels(mode=mode, language=language)
+    logger.debug("idioma detectado", extra={"language": language})
     
     # 1. Retrieval: obtener contexto relevante
-    print(f"🔍 Buscando contexto relevante para: {user_query[:50]}...")
-    
-    # Reducir chunks para tokens (más rápido)
-    is_token_query = 'token' in user_query.lower()
-    effective_k = max(3, k - 2) if is_token_query else k  # Menos chunks para tokens
+    logger.debug("buscando contexto relevante", extra={"query_preview": user_query[:50]})
     
-    chunks = retrieve_context_with_metadata(user_query, k=effective_k, language=language)
+    if chunks is None:
+        report_progress("stage", stage="retrieval")
+        chunks = retrieve_context_with_metadata(
+            user_query, k=effective_k(user_query, k), language=language, deadline=deadline
+        )
     
     if not chunks:
+        REQUESTS.inc(mode=mode, language=language, outcome="no_context")
         return {
             "answer": "Lo siento, no encontré información relevante para responder tu pregunta.",
             "sources": [],
@@ -128,6 +287,7 @@ def query_rag(
         }
     
     # 2. Preparar contexto
+    prompt_started = time.perf_counter()
     context_parts = []
     sources = []
     
@@ -156,28 +316,29 @@ def query_rag(
     
     # 3. Construir prompt según el modo
     if mode == "code":
-        system_prompt, user_prompt = build_code_generation_prompt(
-            user_query, context, code_only=code_only, language=language
+        layout = build_prompt_layout(
+            "code_only" if code_only else "code", user_query, context, language=language
         )
         temp = 0.1  # Más determinístico para código
     else:
-        system_prompt, user_prompt = build_explanation_prompt(
-            user_query, context, language=language
-        )
+        layout = build_prompt_layout("explain", user_query, context, language=language)
         temp = temperature
     
-    # 4. Generar respuesta
-    print(f"🤖 Generando respuesta con {model}...")
+    system_prompt, user_prompt = layout.system_prompt, layout.user_prompt
+    record_prompt_sections(layout)
+    observe_stage("prompt_build", time.perf_counter() - prompt_started)
     
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt}
-    ]
+    # 4. Generar respuesta (routing por clase de consulta)
+    route = plan_route(classify_query(user_query, mode, code_only), model=model)
+    logger.info("generando respuesta", extra={"query_class": route.query_class, "model": route.model})
+    report_progress("stage", stage="generation", query_class=route.query_class, sources=sources)
+    
+    messages = layout.messages
     
     if stream:
-        # Retornar generador para streaming
+        # Retornar generador para streaming (sin cascada: usa el tier preferido)
         response = client.chat.completions.create(
-            model=model,
+            model=route.model,
             messages=messages,
             temperature=temp,
             stream=True
@@ -185,83 +346,87 @@ def query_rag(
         return {
             "stream": response,
             "sources": sources,
-            "context_used": len(chunks)
+            "context_used": len(chunks),
+            "prompt": layout.describe(),
+            "route": route.describe()
         }
     
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temp
-    )
+    completion = complete_routed(route, messages, temp, deadline=deadline)
+    model = completion.model
+    usage = completion.usage
     
-    answer = response.choices[0].message.content
+    answer = completion.content
+    record_prompt_usage(layout, model, usage)
+    record_llm_completion(completion, mode)
     
     # Validar código si es necesario
     validation_message = None
+    repair_mode = None
     retry_count = 0
     max_retries = 1  # Permitir 1 reintento si se detectan antipatrones críticos
     
     if mode == "code" and should_validate_code(user_query):
-        print("🔍 Validando código generado...")
+        logger.debug("validando código generado")
         
-        # Extraer código de bloques markdown si existe
-        code_to_validate = answer
-        rust_code_blocks = re.findall(r'```rust\n(.*?)```', answer, re.DOTALL)
-        if rust_code_blocks:
-            # Si hay bloques de código rust, validar el primero (usualmente el principal)
-            code_to_validate = rust_code_blocks[0]
-        elif '```' in answer:
-            # Si hay bloques genéricos sin especificar lenguaje
-            generic_blocks = re.findall(r'```\n(.*?)```', answer, re.DOTALL)
-            if generic_blocks:
-                code_to_validate = generic_blocks[0]
+        code_to_validate = extract_code_block(answer)
+        report_progress("stage", stage="validation")
+        with timed("validation", model=model):
+            validation_result = validate_soroban_code(code_to_validate)
         
-        validation_result = validate_soroban_code(code_to_validate)
+        # Sin presupuesto suficiente no se reintenta: se entrega con la advertencia
+        # (una validación incompleta sin errores tampoco tiene qué reparar)
+        if validation_result.errors and deadline.remaining() < RETRY_MIN_BUDGET:
+            logger.warning("se omite el reintento por falta de presupuesto", extra={"remaining": round(deadline.remaining(), 1)})
+            repair_mode = "skipped"
         
-        # Si hay errores críticos (antipatrones) y no hemos reintentado, regenerar
-        if not validation_result.is_valid and retry_count < max_retries:
-            print(f"⚠️  Antipatrones detectados. Intentando regenerar código...")
-            
-            # Construir prompt de corrección con los errores detectados
-            correction_prompt = f"""El código generado contiene los siguientes errores/antipatrones:
-
-{format_validation_message(validation_result)}
-
-Por favor, regenera el código corrigiendo estos problemas específicos.
-
-Query original del usuario:
-{user_query}
-
-Contexto de documentación:
-{context}
-
-CRÍTICO: Corrige TODOS los antipatrones mencionados arriba."""
-            
-            # Reintentar generación
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-                {"role": "assistant", "content": answer},
-                {"role": "user", "content": correction_prompt}
-            ]
+        # Si hay errores críticos (antipatrones) y no hemos reintentado, reparar
+        elif validation_result.errors and retry_count < max_retries:
+            logger.info("antipatrones detectados, intentando reparar", extra={"errors": len(validation_result.errors)})
+            report_progress("stage", stage="repair", errors=validation_result.errors)
+            retry_started = time.perf_counter()
             
-            print("🔄 Regenerando código...")
-            retry_response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temp
-            )
+            try:
+                patched_answer = None
+                if VALIDATION_REPAIR_MODE == "patch":
+                    patched_answer = repair_with_patch(
+                        answer, code_to_validate, validation_result, model, temp, language, deadline
+                    )
+                
+                if patched_answer is not None:
+                    answer = patched_answer
+                    repair_mode = "patch"
+                elif deadline.remaining() < RETRY_MIN_BUDGET:
+                    logger.warning("sin presupuesto para regenerar completo", extra={"remaining": round(deadline.remaining(), 1)})
+                    repair_mode = "skipped"
+                else:
+                    # Fallback: regenerar la respuesta completa
+                    answer = repair_with_regeneration(
+                        answer, validation_result, user_query, context, system_prompt, user_prompt,
+                        model, temp, deadline
+                    )
+                    repair_mode = "full"
+            except REPAIR_ERRORS as e:
+                # Cliente desconectado o job cancelado: no hay a quién entregarle nada
+                if isinstance(e, DeadlineExceeded) and e.reason != "deadline":
+                    raise
+                # La primera respuesta ya está generada: se entrega con la advertencia
+                logger.warning("falló la reparación, se entrega la respuesta original", extra={
+                    "error": str(e) or type(e).__name__
+                })
+                repair_mode = "skipped"
             
-            answer = retry_response.choices[0].message.content
             retry_count += 1
+            observe_stage("retry", time.perf_counter() - retry_started, model=model)
             
             # Validar nuevamente
-            validation_result = validate_soroban_code(answer)
-            print("🔍 Validando código regenerado...")
+            if repair_mode != "skipped":
+                logger.debug("validando código reparado")
+                with timed("validation", model=model):
+                    validation_result = validate_soroban_code(extract_code_block(answer))
         
         if not validation_result.is_valid or validation_result.warnings:
             validation_message = format_validation_message(validation_result)
-            print(validation_message)
+            logger.debug("resultado de validación", extra={"validation": validation_message})
             
             # Agregar mensaje de validación al answer (errores O advertencias)
             if not validation_result.is_valid:
@@ -271,17 +436,23 @@ CRÍTICO: Corrige TODOS los antipatrones mencionados arriba."""
                 # Solo advertencias: añadir como nota informativa
                 answer += f"\n\n---\n\n💡 **ADVERTENCIAS Y RECOMENDACIONES**\n\n{validation_message}"
     
+    REQUESTS.inc(mode=mode, language=language, outcome="ok")
+    
     return {
         "answer": answer,
         "sources": sources,
         "context_used": len(chunks),
         "model": model,
         "validation": validation_message,
+        "repair_mode": repair_mode,
+        "prompt": layout.describe(),
+        "route": route.describe(),
+        # El stream puede terminar sin el chunk de usage si el proveedor no lo envía
         "tokens": {
-            "prompt": response.usage.prompt_tokens,
-            "completion": response.usage.completion_tokens,
-            "total": response.usage.total_tokens
-        }
+            "prompt": usage.prompt_tokens,
+            "completion": usage.completion_tokens,
+            "total": usage.total_tokens
+        } if usage is not None else None
     }
 
 
@@ -302,7 +473,12 @@ def explain_concept(user_query: str, k: int = 3) -> str:
     return result["answer"]
 
 
-def interactive_chat(history: List[Dict[str, str]], new_message: str, k: int = 4) -> Dict[str, Any]:
+def interactive_chat(
+    history: List[Dict[str, str]],
+    new_message: str,
+    k: int = 4,
+    deadline: Optional[Deadline] = None
+) -> Dict[str, Any]:
     """
     Chat conversacional con memoria de contexto.
     
@@ -310,12 +486,14 @@ def interactive_chat(history: List[Dict[str, str]], new_message: str, k: int = 4
         history: Lista de mensajes previos [{"role": "user/assistant", "content": "..."}]
         new_message: Nuevo mensaje del usuario
         k: Chunks a recuperar
+        deadline: Deadline del request (opcional)
     
     Returns:
         Dict con respuesta y metadata
     """
     # Recuperar contexto para el nuevo mensaje
-    chunks = retrieve_context_with_metadata(new_message, k=k)
+    chunks = retrieve_context_with_metadata(new_message, k=k, deadline=deadline)
+    chunks = fit_context(chunks, SESSION_CONTEXT_TOKENS)
     
     context_parts = []
     for chunk in chunks:
@@ -323,38 +501,93 @@ def interactive_chat(history: List[Dict[str, str]], new_message: str, k: int = 4
     
     context = "\n\n---\n\n".join(context_parts)
     
-    # Construir prompt conversacional
-    system_prompt = f"""Eres un asistente experto en Soroban (smart contracts de Stellar) y Rust.
-
-Contexto relevante de la documentación:
-{context}
-
-Instrucciones:
-- Usa el contexto proporcionado para responder
-- Si el usuario pregunta sobre código, proporciona ejemplos
-- Mantén coherencia con la conversación previa
-- Si no tienes información suficiente, dilo claramente"""
-
-    # Construir historial completo
-    messages = [{"role": "system", "content": system_prompt}]
-    messages.extend(history)
-    messages.append({"role": "user", "content": new_message})
-    
-    response = client.chat.completions.create(
-        model=CODE_MODEL,
-        messages=messages,
-        temperature=0.3
+    # Historial antes del contexto: el prefijo system + history se mantiene entre turnos.
+    # Solo los turnos más recientes que caben en el presupuesto
+    layout = build_prompt_layout(
+        "chat", new_message, context, language=detect_language(new_message),
+        history=fit_history(history, SESSION_HISTORY_TOKENS)
     )
+    record_prompt_sections(layout)
     
-    answer = response.choices[0].message.content
+    route = plan_route(classify_query(new_message, mode="chat"))
+    completion = complete_routed(route, layout.messages, temperature=0.3, deadline=deadline)
+    record_prompt_usage(layout, completion.model, completion.usage)
+    record_llm_completion(completion, "chat")
+    
+    answer = completion.content
     
     return {
         "answer": answer,
         "sources": [{"file": c.get("metadata", {}).get("file")} for c in chunks],
-        "context_used": len(chunks)
+        "context_used": len(chunks),
+        "prompt": layout.describe(),
+        "route": route.describe()
     }
 
 
+def session_chat(
+    session: ChatSession,
+    new_message: str,
+    k: int = 4,
+    deadline: Optional[Deadline] = None
+) -> Dict[str, Any]:
+    """
+    Turno de chat sobre una sesión en servidor (ver app.rag.sessions).
+    
+    El prompt lleva el resumen de la sesión y los turnos recientes que caben
+    en SESSION_HISTORY_TOKENS; el contexto recuperado se reutiliza si la
+    misma consulta ya se hizo en la sesión.
+    
+    Args:
+        session: Sesión obtenida de session_store
+        new_message: Nuevo mensaje del usuario
+        k: Chunks a recuperar
+        deadline: Deadline del request (opcional)
+    
+    Returns:
+        Dict con respuesta, metadata y estado de la sesión
+    """
+    # Un turno a la vez por sesión
+    wait = deadline.remaining() if deadline else REQUEST_TIMEOUT
+    if not session.lock.acquire(timeout=wait):
+        raise DeadlineExceeded("session_lock", "deadline")
+    try:
+        language = detect_language(new_message)
+        if session.language is None:
+            session.language = language
+        set_request_labels(mode="chat", language=language)
+        
+        index_version = active_index_version()
+        chunks = session.cached_context(
+            new_message, k,
+            lambda: retrieve_context_with_metadata(new_message, k=k, deadline=deadline, index_version=index_version),
+            index_version=index_version
+        )
+        chunks = fit_context(chunks, SESSION_CONTEXT_TOKENS)
+        context = "\n\n---\n\n".join(chunk["content"] for chunk in chunks)
+        
+        layout = build_prompt_layout("chat", new_message, context, language=language, history=session.window())
+        record_prompt_sections(layout)
+        
+        route = plan_route(classify_query(new_message, mode="chat"))
+        completion = complete_routed(route, layout.messages, temperature=0.3, deadline=deadline)
+        record_prompt_usage(layout, completion.model, completion.usage)
+        record_llm_completion(completion, "chat")
+        
+        session_store.record_turn(session, new_message, completion.content)
+        
+        return {
+            "answer": completion.content,
+            "sources": [{"file": c.get("metadata", {}).get("file")} for c in chunks],
+            "context_used": len(chunks),
+            "prompt": layout.describe(),
+            "route": route.describe(),
+            "session": session.describe()
+        }
+    finally:
+        session.lock.release()
+
+
 def validate_code_only(code: str, contract_type: str = None) -> Dict[str, Any]:
     """
     Valida código sin regenerarlo.
@@ -366,20 +599,4 @@ def validate_code_only(code: str, contract_type: str = None) -> Dict[str, Any]:
     Returns:
         Dict con resultado de validación y sugerencias
     """
-    validation_result = validate_soroban_code(code, contract_type)
-    
-    return {
-        "is_valid": validation_result.is_valid,
-        "has_warnings": len(validation_result.warnings) > 0,
-        "errors": validation_result.errors,
-        "warnings": validation_result.warnings,
-        "message": format_validation_message(validation_result),
-        "summary": {
-            "total_errors": len(validation_result.errors),
-            "total_warnings": len(validation_result.warnings),
-            "antipatterns_detected": [
-                err for err in validation_result.errors 
-                if "ANTIPATRÓN" in err
-            ]
-        }
-    }
+    return validation_report(code, contract_type)
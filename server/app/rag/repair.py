@@ -0,0 +1,189 @@
+"""
+Reparación por parches para el reintento de validación.
+
+En lugar de reenviar el prompt completo y regenerar todo el contrato, se envían
+al LLM solo las funciones que tienen hallazgos del validador. El LLM responde
+con hunks de reemplazo que se aplican localmente sobre la respuesta original.
+"""
+
+from typing import List, Optional
+import re
+
+from app.rag.validators import CodeValidationResult
+from app.rag.rust_parser import Function, find_functions
+
+
+# Máximo de funciones a enviar en un parche; por encima conviene regenerar
+REPAIR_MAX_FUNCTIONS = 8
+
+_QUOTED_NAME = re.compile(r"'([A-Za-z_]\w*)'|\b([A-Za-z_]\w*)\(\)")
+_ANTIPATTERN_TAG = re.compile(r'\[ANTIPATRÓN #(\d)|\[CASO A\]')
+_HUNK_HEADER = re.compile(r'^###\s+(REPLACE|DELETE)\s+fn\s+([A-Za-z_]\w*)\s*$|^###\s+(ADD)\s*$', re.MULTILINE)
+_FENCED_BLOCK = re.compile(r'```(?:rust)?\s*\n(.*?)```', re.DOTALL)
+
+
+class Hunk:
+    """Operación de parche devuelta por el LLM."""
+    def __init__(self, action: str, name: Optional[str] = None, body: str = ""):
+        self.action = action  # "REPLACE", "DELETE" o "ADD"
+        self.name = name
+        self.body = body
+
+    def __repr__(self):
+        return f"Hunk({self.action}, {self.name})"
+
+
+def _matches_antipattern(tag: str, fn: Function) -> bool:
+    """Indica si una función contiene el patrón asociado a un antipatrón."""
+    body = fn.text
+    if tag == "1":
+        return 'token::Client::new' in body or 'TokenInterface::' in body
+    if tag == "2":
+        return ('.set(' in body or 'persistent().get(' in body) and 'extend_ttl' not in body
+    if tag == "3":
+        return 'require_auth' not in body and 'Address' in body
+    if tag == "4":
+        return 'panic!(' in body
+    if tag == "5":
+        return fn.name in ('initialize', '__constructor')
+    if tag == "6":
+        auth_at = body.find('require_auth')
+        return auth_at != -1 and body[:auth_at].count('\n') > 5
+    if tag == "A":
+        return 'DataKey::Balance(' in body or (fn.name == 'initialize' and 'Symbol' in body)
+    return False
+
+
+def select_offending_functions(code: str, result: CodeValidationResult) -> Optional[List[Function]]:
+    """
+    Selecciona las funciones afectadas por los errores del validador.
+
+    Returns:
+        Lista de funciones a reparar, o None si algún error no puede
+        atribuirse a una función (p.ej. falta #[contract]) y el parche
+        no es viable.
+    """
+    functions = find_functions(code)
+    by_name = {}
+    for fn in functions:
+        by_name.setdefault(fn.name, []).append(fn)
+
+    selected = []
+    for error in result.errors:
+        matched = []
+
+        # Funciones mencionadas explícitamente: 'transfer', initialize()
+        for quoted, called in _QUOTED_NAME.findall(error):
+            matched.extend(by_name.get(quoted or called, []))
+
+        tag_match = _ANTIPATTERN_TAG.search(error)
+        if not matched and tag_match:
+            tag = tag_match.group(1) or "A"
+            matched = [fn for fn in functions if _matches_antipattern(tag, fn)]
+
+        if not matched:
+            return None
+
+        for fn in matched:
+            if fn not in selected:
+                selected.append(fn)
+
+    if not selected or len(selected) > REPAIR_MAX_FUNCTIONS:
+        return None
+
+    return sorted(selected, key=lambda fn: fn.start)
+
+
+def parse_hunks(text: str) -> List[Hunk]:
+    """
+    Extrae los hunks de la respuesta del LLM. Formato esperado:
+
+        ### REPLACE fn nombre
+        ```rust
+        <función completa>
+        ```
+        ### DELETE fn nombre
+        ### ADD
+        ```rust
+        <items nuevos a nivel de módulo>
+        ```
+    """
+    hunks = []
+    headers = list(_HUNK_HEADER.finditer(text))
+    for index, header in enumerate(headers):
+        action = header.group(1) or header.group(3)
+        name = header.group(2)
+        segment_end = headers[index + 1].start() if index + 1 < len(headers) else len(text)
+        segment = text[header.end():segment_end]
+
+        if action == "DELETE":
+            hunks.append(Hunk(action, name))
+            continue
+
+        block = _FENCED_BLOCK.search(segment)
+        if not block or not block.group(1).strip():
+            return []
+        hunks.append(Hunk(action, name, block.group(1).rstrip()))
+    return hunks
+
+
+def _reindent(body: str, indent: str) -> str:
+    """Re-indenta un hunk al nivel de la función original."""
+    lines = body.split('\n')
+    widths = [len(line) - len(line.lstrip()) for line in lines if line.strip()]
+    common = min(widths) if widths else 0
+    return '\n'.join(indent + line[common:] if line.strip() else '' for line in lines)
+
+
+def apply_hunks(code: str, hunks: List[Hunk]) -> Optional[str]:
+    """
+    Aplica los hunks sobre el código original.
+
+    Returns:
+        Código parcheado, o None si algún hunk no se puede aplicar
+        (función inexistente o ambigua).
+    """
+    if not hunks:
+        return None
+
+    functions = find_functions(code)
+    edits = []  # (start, end, reemplazo)
+    additions = []
+
+    for hunk in hunks:
+        if hunk.action == "ADD":
+            additions.append(hunk.body.strip('\n'))
+            continue
+
+        candidates = [fn for fn in functions if fn.name == hunk.name]
+        if len(candidates) != 1:
+            return None
+        fn = candidates[0]
+
+        if hunk.action == "DELETE":
+            # Eliminar también el salto de línea final de la función
+            end = fn.end + 1 if code[fn.end:fn.end + 1] == '\n' else fn.end
+            edits.append((fn.start, end, ""))
+        else:
+            indent = fn.text[:len(fn.text) - len(fn.text.lstrip())]
+            edits.append((fn.start, fn.end, _reindent(hunk.body, indent)))
+
+    # Aplicar de atrás hacia adelante para no invalidar los offsets
+    edits.sort(key=lambda edit: edit[0], reverse=True)
+    for index in range(1, len(edits)):
+        if edits[index][1] > edits[index - 1][0]:
+            return None  # Rangos solapados
+
+    patched = code
+    for start, end, replacement in edits:
+        patched = patched[:start] + replacement + patched[end:]
+
+    if additions:
+        block = '\n\n'.join(additions) + '\n\n'
+        anchor = patched.find('#[contract]')
+        if anchor == -1:
+            patched = patched.rstrip('\n') + '\n\n' + block
+        else:
+            patched = patched[:anchor] + block + patched[anchor:]
+
+    return patched
@@ -1,7 +1,80 @@
-from app.embeddings import embed_text
+from app.embeddings import embed_text, embed_texts, get_provider, index_model, truncate_embedding
+from app.config import EMBEDDING_SEARCH_DIMENSIONS, RETRIEVAL_RESCORE_FACTOR, RETRIEVAL_TWO_PHASE, CANONICAL_CACHE_TTL
 from app.db import supabase
-from typing import List, Dict, Any
+from app.rag.index_versions import active_index_version
+from app.deadline import Deadline
+from app.metrics import CACHE_REQUESTS, Counter, timed, observe_stage
+from app.log import get_logger
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+import contextvars
+import threading
 import re
+import time
+
+logger = get_logger(__name__)
+
+MODEL_MISMATCH = Counter(
+    "sorobai_retrieval_model_mismatch_total",
+    "Candidatos descartados por venir de otro modelo de embeddings que el de la query"
+)
+
+
+# Campos de metadata que usan los filtros y el rerank: es lo único que trae
+# la primera fase del retrieval en dos fases (sql/two_phase_retrieval.sql
+# arma el mismo subconjunto)
+RERANK_METADATA_FIELDS = (
+    "file", "section", "topic", "doc_type", "content_type", "has_code",
+    "security_topics", "language_doc", "embedding_model"
+)
+
+# Archivos que el rerank trae completos (fetch_canonical); el arranque los precarga
+TOKEN_CONTRACT_FILE = "examples_token_contract.md"
+CANONICAL_FILES = (TOKEN_CONTRACT_FILE,)
+
+
+def match_chunks(
+    embedding: List[float],
+    match_count: int,
+    ids_only: bool = False,
+    index_version: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Búsqueda vectorial en Supabase. Con EMBEDDING_SEARCH_DIMENSIONS la base
+    busca sobre el vector reducido y reordena los candidatos con el completo
+    (match_soroban_chunks_rescored); la respuesta tiene la misma forma.
+    
+    Con `ids_only` cada fila trae solo id_chunk, similarity y los campos
+    RERANK_METADATA_FIELDS de la metadata, sin content (ver fetch_contents).
+    Con `index_version` busca solo en esa versión del índice.
+    """
+    function = "match_soroban_chunk_ids" if ids_only else "match_soroban_chunks"
+    params: Dict[str, Any] = {
+        "query_embedding": embedding,
+        "match_count": match_count
+    }
+    if EMBEDDING_SEARCH_DIMENSIONS > 0:
+        function = f"{function}_rescored"
+        params["query_search"] = truncate_embedding(embedding, EMBEDDING_SEARCH_DIMENSIONS)
+        params["candidate_count"] = match_count * max(1, RETRIEVAL_RESCORE_FACTOR)
+    if index_version is not None:
+        params["index_version"] = index_version
+    return supabase.rpc(function, params).execute().data
+
+
+def same_model_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Descarta los chunks embebidos con otro modelo que el proveedor actual:
+    su similitud con la query no significa nada (ver app.embeddings).
+    """
+    model_id = get_provider().model_id
+    kept = [c for c in chunks if index_model(c.get("metadata") or {}) == model_id]
+    if len(kept) < len(chunks):
+        MODEL_MISMATCH.inc(len(chunks) - len(kept))
+        logger.warning("chunks de otro modelo de embeddings en el índice", extra={
+            "model": model_id, "discarded": len(chunks) - len(kept)
+        })
+    return kept
 
 def retrieve_context(query: str, k: int = 5, filter_metadata: Dict[str, Any] = None) -> List[str]:
     """
@@ -17,15 +90,10 @@ def retrieve_context(query: str, k: int = 5, filter_metadata: Dict[str, Any] = N
     """
     embedding = embed_text(query)
 
-    result = supabase.rpc(
-        "match_soroban_chunks",
-        {
-            "query_embedding": embedding,
-            "match_count": k * 2  # Recuperamos más para luego rerank
-        }
-    ).execute()
-
-    chunks = result.data
+    # Recuperamos más para luego rerank
+    chunks = same_model_chunks(match_chunks(
+        embedding, k * 2, ids_only=RETRIEVAL_TWO_PHASE, index_version=active_index_version()
+    ))
     
     # Reranking simple: priorizar chunks con código si la query lo sugiere
     code_keywords = ["example", "code", "implement", "how to", "function", "contract"]
@@ -45,14 +113,18 @@ def retrieve_context(query: str, k: int = 5, filter_metadata: Dict[str, Any] = N
         ]
     
     # Retornar top k
-    return [chunk["content"] for chunk in chunks[:k]]
+    return [chunk["content"] for chunk in fetch_contents(chunks[:k])]
 
 
 def retrieve_context_with_metadata(
     query: str, 
     k: int = 5,
     include_examples: bool = True,
-    language: str = None
+    language: str = None,
+    deadline: Optional[Deadline] = None,
+    embedding: Optional[List[float]] = None,
+    batch: Optional["RetrievalBatch"] = None,
+    index_version: Optional[str] = None
 ) -> List[Dict[str, Any]]:
     """
     Versión extendida que retorna chunks con metadata completa.
@@ -63,8 +135,18 @@ def retrieve_context_with_metadata(
         k: Número de chunks a recuperar
         include_examples: Si incluir ejemplos
         language: Filtrar por idioma ("es" o "en"), None para todos
+        deadline: Deadline del request; se verifica antes de cada llamada de red
+        embedding: Embedding ya calculado de la query (p.ej. en un batch)
+        batch: Estado compartido de un batch (ver retrieve_batch)
+        index_version: Versión del índice; None para la activa (o la del batch)
     """
-    embedding = embed_text(query)
+    if index_version is None:
+        index_version = batch.index_version if batch is not None else active_index_version()
+    if embedding is None:
+        if deadline:
+            deadline.check("embedding")
+        with timed("query_embedding"):
+            embedding = embed_text(query, timeout=deadline.budget("embedding") if deadline else None)
     
     # Detectar necesidad de contrato completo ANTES de la query
     token_contract_keywords = [
@@ -79,15 +161,15 @@ def retrieve_context_with_metadata(
     # que incluimos suficientes del archivo canónico
     match_count = k * 5 if needs_token_contract else k * 3
     
-    result = supabase.rpc(
-        "match_soroban_chunks",
-        {
-            "query_embedding": embedding,
-            "match_count": match_count
-        }
-    ).execute()
+    if deadline:
+        deadline.check("vector_rpc")
+    with timed("vector_rpc"):
+        matched = match_chunks(embedding, match_count, ids_only=RETRIEVAL_TWO_PHASE, index_version=index_version)
 
-    chunks = result.data
+    chunks = same_model_chunks(matched)
+    if batch is not None:
+        chunks = [batch.intern(c) for c in chunks]
+    rerank_started = time.perf_counter()
     
     # Filtrar por idioma si se especifica
     if language:
@@ -216,33 +298,30 @@ def retrieve_context_with_metadata(
     
     # Reordenar por score ajustado
     chunks.sort(key=lambda x: x.get("adjusted_score", 0), reverse=True)
+    observe_stage("rerank", time.perf_counter() - rerank_started)
     
     # ESTRATEGIA ESPECIAL para contratos completos de token
     if needs_token_contract and "token" in query.lower():
         # 1. Forzar recuperación DIRECTA de chunks del contrato canónico
-        canonical_file = "examples_token_contract.md"
-        
-        # Query directa a DB para el archivo canónico (SIEMPRE)
-        all_canonical = supabase.table("soroban_chunks") \
-            .select("content, metadata") \
-            .filter("metadata->>file", "eq", canonical_file) \
-            .limit(10) \
-            .execute()
+        canonical_file = TOKEN_CONTRACT_FILE
         
-        # Asignar scores altos a canonical chunks
-        for chunk in all_canonical.data:
-            chunk["adjusted_score"] = 0.75
-            chunk["similarity"] = 0
+        # Query directa a DB para el archivo canónico (SIEMPRE; una vez por batch)
+        if batch is not None:
+            canonical_data = batch.canonical(
+                canonical_file, lambda: fetch_canonical(canonical_file, deadline, index_version)
+            )
+        else:
+            canonical_data = fetch_canonical(canonical_file, deadline, index_version)
         
         # Filtrar otros chunks (no del contrato canónico)
         other_chunks = [c for c in chunks if canonical_file not in c.get("metadata", {}).get("file", "")]
         
         # Combinar: 90% canónico (más chunks del archivo canónico), 10% otros para contexto
-        canonical_count = min(len(all_canonical.data), max(int(k * 0.9), k - 1))
+        canonical_count = min(len(canonical_data), max(int(k * 0.9), k - 1))
         other_count = max(0, k - canonical_count)  # Permitir 0 otros si no hay espacio
         
-        result = all_canonical.data[:canonical_count] + other_chunks[:other_count]
-        return result[:k]
+        result = canonical_data[:canonical_count] + other_chunks[:other_count]
+        return fetch_contents(result[:k], deadline, batch)
     
     # Fallback: priorizar chunks del primer archivo si es contrato completo
     if chunks and chunks[0].get("metadata", {}).get("doc_type") == "complete_contract":
@@ -254,9 +333,208 @@ def retrieve_context_with_metadata(
         other_count = max(1, k - canonical_count)
         
         result = canonical_chunks[:canonical_count] + other_chunks[:other_count]
-        return result[:k]
+        return fetch_contents(result[:k], deadline, batch)
+    
+    return fetch_contents(chunks[:k], deadline, batch)
+
+
+def _fetch_rows(ids: List[Any], deadline: Optional[Deadline] = None) -> Dict[Any, Dict[str, Any]]:
+    if deadline:
+        deadline.check("content_fetch")
+    with timed("content_fetch"):
+        result = supabase.table("soroban_chunks") \
+            .select("id_chunk, content, metadata") \
+            .in_("id_chunk", ids) \
+            .execute()
+    return {row["id_chunk"]: row for row in result.data}
+
+
+def fetch_contents(
+    chunks: List[Dict[str, Any]],
+    deadline: Optional[Deadline] = None,
+    batch: Optional["RetrievalBatch"] = None
+) -> List[Dict[str, Any]]:
+    """
+    Segunda fase del retrieval en dos fases: completa content y metadata de
+    los chunks que llegaron sin contenido, con un solo select por ids.
+    Conserva orden y scores; descarta los chunks borrados entre las dos fases.
+    """
+    missing = [chunk["id_chunk"] for chunk in chunks if "content" not in chunk]
+    if not missing:
+        return chunks
+    rows = batch.rows(missing, lambda ids: _fetch_rows(ids, deadline)) if batch is not None else _fetch_rows(missing, deadline)
+    completed = []
+    for chunk in chunks:
+        if "content" not in chunk:
+            row = rows.get(chunk["id_chunk"])
+            if row is None:
+                continue
+            chunk.update(content=row["content"], metadata=row["metadata"])
+        completed.append(chunk)
+    return completed
+
+
+class CanonicalCache:
+    """
+    Chunks de los archivos canónicos en memoria por (archivo, versión del
+    índice), vigentes CANONICAL_CACHE_TTL segundos. Activar otra versión
+    cambia la clave; el TTL cubre las reingestas sobre la misma versión.
+    """
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, Optional[str]], Tuple[float, List[Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, canonical_file: str, index_version: Optional[str], fetch) -> List[Dict[str, Any]]:
+        if self.ttl <= 0:
+            return fetch()
+        key = (canonical_file, index_version)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and now - entry[0] < self.ttl:
+            CACHE_REQUESTS.inc(cache="canonical", result="hit")
+            return entry[1]
+        CACHE_REQUESTS.inc(cache="canonical", result="miss")
+        chunks = fetch()
+        with self._lock:
+            # Las entradas vencidas (p.ej. de versiones ya reemplazadas) se descartan acá
+            for stale in [k for k, (stored_at, _) in self._entries.items() if now - stored_at >= self.ttl]:
+                del self._entries[stale]
+            self._entries[key] = (now, chunks)
+        return chunks
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+canonical_cache = CanonicalCache(CANONICAL_CACHE_TTL)
+
+
+def _fetch_canonical(canonical_file: str, index_version: Optional[str]) -> List[Dict[str, Any]]:
+    with timed("canonical_fetch"):
+        query = supabase.table("soroban_chunks") \
+            .select("content, metadata") \
+            .filter("metadata->>file", "eq", canonical_file)
+        if index_version is not None:
+            query = query.eq("index_version", index_version)
+        all_canonical = query.limit(10).execute()
+    
+    # Asignar scores altos a canonical chunks
+    for chunk in all_canonical.data:
+        chunk["adjusted_score"] = 0.75
+        chunk["similarity"] = 0
+    return all_canonical.data
+
+
+def fetch_canonical(
+    canonical_file: str,
+    deadline: Optional[Deadline] = None,
+    index_version: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Chunks del archivo canónico con score fijo alto (de canonical_cache si están vigentes)."""
+    if deadline:
+        deadline.check("canonical_fetch")
+    chunks = canonical_cache.get(canonical_file, index_version, lambda: _fetch_canonical(canonical_file, index_version))
+    # Copias: el rerank y las respuestas escriben en los dicts
+    return [dict(chunk) for chunk in chunks]
+
+
+class RetrievalBatch:
+    """
+    Estado compartido entre las consultas de un batch: el contenido de los
+    chunks repetidos se guarda una sola vez y el fetch canónico se hace una vez.
+    En el retrieval en dos fases, las filas ya traídas por otra consulta no
+    se vuelven a pedir. Todas las consultas usan la misma versión del índice.
+    """
+    def __init__(self, index_version: Optional[str] = None):
+        self.index_version = index_version
+        self.contents: Dict[str, str] = {}
+        self._canonical: Dict[str, List[Dict[str, Any]]] = {}
+        self._rows: Dict[Any, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.candidates = 0
+
+    def intern(self, chunk: Dict[str, Any]) -> Dict[str, Any]:
+        # Cada consulta necesita su propio dict (el rerank escribe scores en él)
+        chunk = dict(chunk)
+        with self._lock:
+            self.candidates += 1
+            if "content" in chunk:
+                chunk["content"] = self.contents.setdefault(chunk["content"], chunk["content"])
+        return chunk
+
+    def rows(self, ids: List[Any], fetch) -> Dict[Any, Dict[str, Any]]:
+        with self._lock:
+            missing = [id_chunk for id_chunk in ids if id_chunk not in self._rows]
+        fetched = fetch(missing) if missing else {}
+        with self._lock:
+            for id_chunk, row in fetched.items():
+                row = dict(row, content=self.contents.setdefault(row["content"], row["content"]))
+                self._rows.setdefault(id_chunk, row)
+            return {id_chunk: self._rows[id_chunk] for id_chunk in ids if id_chunk in self._rows}
+
+    def canonical(self, canonical_file: str, fetch) -> List[Dict[str, Any]]:
+        with self._lock:
+            cached = self._canonical.get(canonical_file)
+        if cached is None:
+            cached = fetch()
+            with self._lock:
+                cached = self._canonical.setdefault(canonical_file, cached)
+        return [dict(chunk) for chunk in cached]
+
+    @property
+    def unique_chunks(self) -> int:
+        return len(self.contents)
+
+
+def retrieve_batch(
+    requests: List[Tuple[str, int, Optional[str]]],
+    deadline: Optional[Deadline] = None,
+    max_workers: int = 4
+) -> Tuple[List[List[Dict[str, Any]]], RetrievalBatch]:
+    """
+    Retrieval de varias consultas con un solo llamado de embeddings.
+    
+    Las consultas repetidas (mismo texto normalizado, k e idioma) se resuelven
+    una vez; los RPC de similitud corren en paralelo acotado.
+    
+    Args:
+        requests: Lista de (query, k, language)
+        deadline: Deadline compartido del batch
+        max_workers: RPCs de similitud concurrentes
+    
+    Returns:
+        (chunks por consulta en el orden de entrada, estado compartido del batch)
+    """
+    batch = RetrievalBatch(active_index_version())
+    keys = [(" ".join(query.lower().split()), k, language) for query, k, language in requests]
+    unique: Dict[tuple, int] = {}
+    for index, key in enumerate(keys):
+        unique.setdefault(key, index)
+    
+    texts = [requests[index][0] for index in unique.values()]
+    if deadline:
+        deadline.check("embedding")
+    with timed("query_embedding_batch"):
+        embeddings = embed_texts(texts, timeout=deadline.budget("embedding") if deadline else None)
+    
+    def run(index: int, embedding: List[float]) -> List[Dict[str, Any]]:
+        query, k, language = requests[index]
+        return retrieve_context_with_metadata(
+            query, k=k, language=language, deadline=deadline, embedding=embedding, batch=batch
+        )
+    
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrieve-batch") as pool:
+        # Cada tarea corre con una copia del contexto (labels de métricas, request_id)
+        futures = {
+            key: pool.submit(contextvars.copy_context().run, run, index, embedding)
+            for (key, index), embedding in zip(unique.items(), embeddings)
+        }
+        results = {key: future.result() for key, future in futures.items()}
     
-    return chunks[:k]
+    return [results[key] for key in keys], batch
 
 
 def retrieve_examples(topic: str = None, k: int = 3) -> List[str]:
@@ -0,0 +1,255 @@
+"""
+Routing de modelos por clase de consulta.
+
+Cada request se clasifica (explain, snippet, full_contract, code_only) y la
+clase se mapea a una cascada de tiers con un objetivo de latencia. Si un tier
+excede el objetivo (en la llamada actual o en su p95 reciente), o su modelo
+no tiene lugar (ver app.admission), el router pasa al siguiente tier de la
+cascada.
+"""
+
+from app.config import (
+    MODEL_TIER_FAST, MODEL_TIER_STANDARD, MODEL_TIER_STRONG, ROUTE_LATENCY_MAX_AGE,
+    ROUTE_TARGET_EXPLAIN, ROUTE_TARGET_SNIPPET, ROUTE_TARGET_CODE_ONLY, ROUTE_TARGET_FULL_CONTRACT
+)
+from app.admission import Overloaded
+from app.metrics import Counter, Histogram, TOKEN_BUCKETS
+from app.rag.llm import complete, Completion
+from app.deadline import Deadline
+from app.log import get_logger
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+import httpx
+import threading
+import time
+import openai
+
+logger = get_logger(__name__)
+
+
+QUERY_CLASSES = ("explain", "snippet", "full_contract", "code_only")
+
+# Modelo por tier
+MODEL_TIERS: Dict[str, str] = {
+    "fast": MODEL_TIER_FAST,
+    "standard": MODEL_TIER_STANDARD,
+    "strong": MODEL_TIER_STRONG,
+}
+
+# Cascada de tiers por clase (el primero es el preferido)
+CLASS_ROUTES: Dict[str, List[str]] = {
+    "explain": ["fast", "standard"],
+    "snippet": ["standard", "fast"],
+    "code_only": ["standard", "fast"],
+    "full_contract": ["standard", "strong"],
+}
+
+LATENCY_TARGETS: Dict[str, float] = {
+    "explain": ROUTE_TARGET_EXPLAIN,
+    "snippet": ROUTE_TARGET_SNIPPET,
+    "code_only": ROUTE_TARGET_CODE_ONLY,
+    "full_contract": ROUTE_TARGET_FULL_CONTRACT,
+}
+
+# Ventana de latencias recientes por (clase, tier) para decidir si saltar un
+# tier; las muestras de más de ROUTE_LATENCY_MAX_AGE segundos no cuentan
+LATENCY_WINDOW = 50
+MIN_SAMPLES = 10
+
+ROUTE_LATENCY = Histogram(
+    "sorobai_route_latency_seconds",
+    "Latencia de generación por clase de consulta y tier",
+    ("query_class", "tier", "model", "outcome")
+)
+
+ROUTE_TOKENS = Histogram(
+    "sorobai_route_tokens",
+    "Tokens por clase de consulta y modelo",
+    ("query_class", "model", "type"),
+    buckets=TOKEN_BUCKETS
+)
+
+ROUTE_FALLBACKS = Counter(
+    "sorobai_route_fallbacks_total",
+    "Fallbacks al siguiente tier por clase de consulta",
+    ("query_class", "tier", "reason")
+)
+
+_recent_latencies: Dict[tuple, deque] = {}
+_lock = threading.Lock()
+
+_FULL_CONTRACT_KEYWORDS = [
+    "contrato completo", "full contract", "complete contract", "token contract",
+    "contrato de token", "token completo", "full token", "sep-41", "sep41",
+    "erc20", "erc-20", "fungible token", "listo para producción", "production-ready",
+]
+
+_CREATION_KEYWORDS = [
+    "crea", "genera", "implementa", "escribe", "construye", "desarrolla",
+    "create", "generate", "implement", "write", "build", "develop",
+]
+
+
+def classify_query(user_query: str, mode: str = "code", code_only: bool = False) -> str:
+    """
+    Clasifica la consulta para elegir la cascada de modelos.
+
+    Returns:
+        "code_only", "explain", "full_contract" o "snippet"
+    """
+    if code_only:
+        return "code_only"
+
+    query_lower = user_query.lower()
+    wants_code = any(kw in query_lower for kw in _CREATION_KEYWORDS)
+
+    if mode == "explain" or (mode == "chat" and not wants_code):
+        return "explain"
+
+    if any(kw in query_lower for kw in _FULL_CONTRACT_KEYWORDS):
+        return "full_contract"
+    if wants_code and ("contrato" in query_lower or "contract" in query_lower or "token" in query_lower):
+        return "full_contract"
+
+    return "snippet"
+
+
+def _p95(samples) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def _observe(query_class: str, tier: str, latency: float):
+    with _lock:
+        window = _recent_latencies.setdefault((query_class, tier), deque(maxlen=LATENCY_WINDOW))
+        window.append((time.monotonic(), latency))
+
+
+def _recent_samples(query_class: str, tier: str) -> List[float]:
+    """
+    Latencias de la ventana que no vencieron. Un tier degradado casi no
+    recibe tráfico (va al final de la cascada): sin vencimiento sus muestras
+    lentas lo dejarían degradado hasta reiniciar el proceso.
+    """
+    oldest = time.monotonic() - ROUTE_LATENCY_MAX_AGE
+    with _lock:
+        window = _recent_latencies.get((query_class, tier))
+        if not window:
+            return []
+        while window and window[0][0] < oldest:
+            window.popleft()
+        return [latency for _, latency in window]
+
+
+def is_over_budget(query_class: str, tier: str) -> bool:
+    """True si el p95 reciente del tier supera el objetivo de la clase."""
+    samples = _recent_samples(query_class, tier)
+    if len(samples) < MIN_SAMPLES:
+        return False
+    return _p95(samples) > LATENCY_TARGETS[query_class]
+
+
+class Route:
+    """
+    Plan de routing: clase de consulta y cascada de (tier, modelo) a intentar.
+    """
+    def __init__(self, query_class: str, tiers: List[Tuple[str, str]]):
+        self.query_class = query_class
+        self.tiers = tiers
+        self.latency_target = LATENCY_TARGETS[query_class]
+        self.tier: Optional[str] = None
+        self.model: str = tiers[0][1]
+        self.fallbacks = 0
+        self.hedged = False
+
+    def describe(self) -> Dict[str, object]:
+        return {
+            "class": self.query_class,
+            "tier": self.tier,
+            "model": self.model,
+            "latency_target": self.latency_target,
+            "fallbacks": self.fallbacks,
+            "hedged": self.hedged,
+        }
+
+    def __repr__(self):
+        return f"Route({self.query_class}, tiers={self.tiers})"
+
+
+def plan_route(query_class: str, model: Optional[str] = None) -> Route:
+    """
+    Ordena la cascada de la clase poniendo al final los tiers cuyo p95
+    reciente excede el objetivo de latencia. Al vencer sus muestras (ver
+    ROUTE_LATENCY_MAX_AGE) el tier vuelve a su lugar y se prueba de nuevo.
+
+    Args:
+        query_class: Clase de la consulta (ver classify_query)
+        model: Si se indica, fija ese modelo sin cascada
+    """
+    if model:
+        return Route(query_class, [("pinned", model)])
+
+    tiers = CLASS_ROUTES[query_class]
+    healthy = [tier for tier in tiers if not is_over_budget(query_class, tier)]
+    degraded = [tier for tier in tiers if tier not in healthy]
+    for tier in degraded:
+        ROUTE_FALLBACKS.inc(query_class=query_class, tier=tier, reason="p95_over_budget")
+    return Route(query_class, [(tier, MODEL_TIERS[tier]) for tier in healthy + degraded])
+
+
+def complete_routed(
+    route: Route,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    deadline: Optional[Deadline] = None
+) -> Completion:
+    """
+    Ejecuta la completion recorriendo la cascada del route. Todos los tiers
+    salvo el último usan como timeout el objetivo de latencia de la clase: si
+    la completion no termina en ese tiempo (aunque siga mandando tokens) se
+    pasa al siguiente tier.
+    """
+    for index, (tier, model) in enumerate(route.tiers):
+        is_last = index == len(route.tiers) - 1
+        try:
+            completion = complete(
+                messages,
+                model=model,
+                temperature=temperature,
+                timeout=None if is_last else route.latency_target,
+                deadline=deadline
+            )
+        except (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError,
+                openai.InternalServerError, httpx.TimeoutException, Overloaded) as e:
+            if is_last:
+                raise
+            if isinstance(e, Overloaded):
+                reason = "overloaded"
+            elif isinstance(e, (openai.APITimeoutError, httpx.TimeoutException)):
+                reason = "timeout"
+            else:
+                reason = "error"
+            if reason == "timeout":
+                # Un timeout cuenta como muestra lenta para el p95 del tier
+                ROUTE_LATENCY.observe(route.latency_target, query_class=route.query_class, tier=tier, model=model, outcome=reason)
+                _observe(route.query_class, tier, route.latency_target)
+            ROUTE_FALLBACKS.inc(query_class=route.query_class, tier=tier, reason=reason)
+            route.fallbacks += 1
+            logger.warning("tier falló, probando siguiente", extra={"tier": tier, "model": model, "reason": reason})
+            continue
+
+        route.tier = tier
+        route.model = model
+        route.hedged = completion.hedged
+        record_completion(route, completion)
+        return completion
+
+
+def record_completion(route: Route, completion: Completion):
+    """Registra latencia y tokens de una completion exitosa."""
+    tier = route.tier or route.tiers[0][0]
+    ROUTE_LATENCY.observe(completion.latency, query_class=route.query_class, tier=tier, model=completion.model, outcome="ok")
+    _observe(route.query_class, tier, completion.latency)
+    if completion.usage is not None:
+        ROUTE_TOKENS.observe(completion.usage.prompt_tokens or 0, query_class=route.query_class, model=completion.model, type="prompt")
+        ROUTE_TOKENS.observe(completion.usage.completion_tokens or 0, query_class=route.query_class, model=completion.model, type="completion")
@@ -0,0 +1,668 @@
+"""
+Análisis estructural mínimo de código Rust.
+
+Un lexer lineal (strings, caracteres, lifetimes y comentarios, incluidos los
+anidados) alimenta un parser de items: funciones, impl, struct, enum, trait,
+mod y atributos, con sus bloques y rangos. `parse(code)` se construye una
+sola vez por código y lo comparten el validador (app.rag.validators) y la
+reparación por parches (app.rag.repair).
+
+`parse_incremental(code)` da el mismo resultado para edición en vivo: corta
+el código en segmentos (items de nivel superior y miembros de impl/trait/mod)
+con un escaneo rápido, parsea cada segmento por separado con caché por texto
+y los une. Una edición solo re-parsea los segmentos que cambiaron.
+"""
+
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import copy
+import re
+import threading
+
+
+_TOKEN = re.compile('|'.join((
+    r'(?P<line_comment>//[^\n]*)',
+    r'(?P<block_comment>/\*)',
+    r'(?P<raw_string>b?r#*")',
+    r'(?P<string>b?"(?:[^"\\]|\\.)*(?:"|\\?\Z))',
+    r"(?P<char>b?'(?:[^'\\\n]|\\(?:u\{[0-9A-Fa-f]{1,6}\}|x[0-9A-Fa-f]{2}|.))')",
+    r"(?P<lifetime>'[A-Za-z_]\w*)",
+    r'(?P<ident>[A-Za-z_]\w*)',
+    r'(?P<number>\d\w*(?:\.\d\w*)?)',
+    # Corridas de delimitadores (`}}}}`, `((`): un match para toda la corrida
+    r'(?P<punct_run>[{}()\[\];,]{2,})',
+    r'(?P<punct>::|->|=>|\S)',
+)), re.DOTALL)
+_BLOCK_COMMENT_MARK = re.compile(r'/\*|\*/')
+_ATTRIBUTE_PATH = re.compile(r'[\w:]+')
+_TOKEN_KINDS = {"line_comment": "comment", "block_comment": "comment", "raw_string": "string"}
+# Caracteres que pueden abrir/cerrar un bloque, terminar un item o empezar un literal
+_SEGMENT_SCAN = re.compile(r'[{};/"\']')
+# Prefijo de raw string (`r#"`, `br"`) que termina justo antes de un `"`
+_RAW_PREFIX = re.compile(r'(?<![\w])b?r#*$')
+# Resto de la línea después del fin de un segmento (espacios y comentario de línea)
+_TRAILING = re.compile(r'[ \t]*(?://[^\n]*)?\n?')
+
+# Palabras clave que abren un item
+ITEM_KEYWORDS = ('fn', 'impl', 'struct', 'enum', 'trait', 'mod')
+
+
+class Token:
+    """Token léxico: tipo ("ident", "punct", "string", "comment", ...) y rango."""
+    __slots__ = ("kind", "text", "start", "end")
+
+    def __init__(self, kind: str, text: str, start: int, end: int):
+        self.kind = kind
+        self.text = text
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.text!r})"
+
+
+def tokenize(code: str) -> List[Token]:
+    """
+    Convierte el código en tokens (los espacios se descartan). Los literales
+    y comentarios sin cerrar llegan hasta el final del código.
+    """
+    tokens = []
+    append = tokens.append
+    position = 0
+    while True:
+        # finditer recorre el código de corrido; solo se reinicia después de
+        # un comentario de bloque o un raw string, cuyo fin se busca aparte
+        for match in _TOKEN.finditer(code, position):
+            kind = match.lastgroup
+            start, end = match.span()
+            if kind == "block_comment" or kind == "raw_string":
+                end = _literal_end(code, kind, start, end)
+                append(Token(_TOKEN_KINDS[kind], code[start:end], start, end))
+                position = end
+                break
+            if kind == "punct_run":
+                tokens.extend([Token("punct", char, offset, offset + 1) for offset, char in enumerate(match.group(), start)])
+                continue
+            append(Token(_TOKEN_KINDS.get(kind, kind), match.group(), start, end))
+        else:
+            return tokens
+
+
+def _literal_end(code: str, kind: str, start: int, end: int) -> int:
+    """Fin de un comentario de bloque o raw string cuyo inicio matcheó en [start, end)."""
+    if kind == "block_comment":
+        return _block_comment_end(code, start)
+    closing = '"' + '#' * (end - start - (3 if code[start] == 'b' else 2))
+    found = code.find(closing, end)
+    return len(code) if found == -1 else found + len(closing)
+
+
+def _block_comment_end(code: str, start: int) -> int:
+    """Fin de un comentario /* */ que empieza en `start`, respetando anidamiento."""
+    depth = 0
+    for mark in _BLOCK_COMMENT_MARK.finditer(code, start):
+        depth += 1 if mark.group() == '/*' else -1
+        if depth == 0:
+            return mark.end()
+    return len(code)
+
+
+class Item:
+    """
+    Item de Rust localizado en el código.
+
+    El rango [start, end) empieza al inicio de la línea de la palabra clave
+    (incluye `pub` e indentación, no los atributos) y termina en la llave de
+    cierre, o en el `;` si el item no tiene cuerpo.
+    """
+    def __init__(self, source: "SourceFile", kind: str, name: Optional[str], start: int,
+                 attributes: List[str], parent: Optional["Item"]):
+        self.source = source
+        self.kind = kind
+        self.name = name
+        self.start = start
+        self.end = start
+        self.open_brace = -1
+        self.attributes = attributes
+        self.parent = parent
+        self.children: List["Item"] = []
+        self.complete = False  # False si el bloque no se cerró antes del fin del código
+
+    @property
+    def text(self) -> str:
+        return self.source.code[self.start:self.end]
+
+    @property
+    def code(self) -> str:
+        """Texto del item sin comentarios (mismos offsets que `text`)."""
+        return self.source.masked[self.start:self.end]
+
+    @property
+    def has_body(self) -> bool:
+        return self.open_brace != -1
+
+    @property
+    def signature(self) -> str:
+        """Texto desde el inicio de la línea de la firma hasta la llave de apertura."""
+        end = self.open_brace if self.has_body else self.end
+        return self.source.code[self.start:end]
+
+    @property
+    def body(self) -> str:
+        """Contenido entre las llaves del cuerpo."""
+        if not self.has_body:
+            return ""
+        return self.source.code[self.open_brace + 1:self.end - 1 if self.complete else self.end]
+
+    @property
+    def body_code(self) -> str:
+        """Cuerpo sin comentarios."""
+        if not self.has_body:
+            return ""
+        return self.source.masked[self.open_brace + 1:self.end - 1 if self.complete else self.end]
+
+    def has_attribute(self, name: str) -> bool:
+        return any(attribute_path(attribute) == name for attribute in self.attributes)
+
+    def rebased(self, source: "SourceFile", offset: int) -> "Item":
+        """Copia del item dentro de `source`, desplazada `offset` caracteres y sin parent/children."""
+        item = copy.copy(self)
+        item.source = source
+        item.start += offset
+        item.end += offset
+        if item.open_brace != -1:
+            item.open_brace += offset
+        item.parent = None
+        item.children = []
+        return item
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name}, {self.start}:{self.end})"
+
+
+class Function(Item):
+    """`fn nombre(params) -> retorno { cuerpo }`; sin cuerpo si es una declaración (`fn x();`)."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.params_start = -1
+        self.params_end = -1
+
+    def rebased(self, source: "SourceFile", offset: int) -> "Function":
+        item = super().rebased(source, offset)
+        if item.params_start != -1:
+            item.params_start += offset
+        if item.params_end != -1:
+            item.params_end += offset
+        return item
+
+    @property
+    def params(self) -> str:
+        """Texto entre los paréntesis de los parámetros."""
+        if self.params_start == -1:
+            return ""
+        return self.source.code[self.params_start + 1:self.params_end]
+
+
+class Impl(Item):
+    """`impl [Trait for] Tipo { ... }`; `name` es el tipo y `trait` el trait implementado."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.trait: Optional[str] = None
+
+    @property
+    def functions(self) -> List[Function]:
+        return [item for item in self.children if isinstance(item, Function) and item.has_body and item.complete]
+
+
+def attribute_path(attribute: str) -> str:
+    """Nombre de un atributo sin argumentos: `contract(impl = X)` -> `contract`."""
+    match = _ATTRIBUTE_PATH.match(attribute)
+    return match.group() if match else ""
+
+
+class SourceFile:
+    """
+    Resultado del parseo: tokens, items y atributos internos (`#![...]`).
+    Un SourceFile compuesto (`compose`) no conserva los tokens.
+
+    open_blocks y open_header describen el estado al final del código:
+    llaves sin cerrar y una cabecera de item o atributo a medio leer.
+    """
+    def __init__(self, code: str):
+        self.code = code
+        self.tokens = tokenize(code)
+        self.masked = _mask_comments(code, self.tokens)
+        self.items: List[Item] = []
+        self.inner_attributes: List[str] = []
+        self.open_blocks = 0
+        self.open_header = False
+        _ItemParser(self).run()
+        self._index()
+
+    def _index(self):
+        self.items.sort(key=lambda item: item.start)
+        self.functions: List[Function] = [
+            item for item in self.items if isinstance(item, Function) and item.has_body and item.complete
+        ]
+        self.impls: List[Impl] = [item for item in self.items if isinstance(item, Impl)]
+
+    @classmethod
+    def compose(cls, code: str, segments: List[Tuple["Segment", "SourceFile"]]) -> "SourceFile":
+        """
+        Une los SourceFile de segmentos contiguos (ver `split_segments`) en
+        uno equivalente a parsear `code` completo, sin volver a tokenizar.
+        """
+        source = cls.__new__(cls)
+        source.code = code
+        source.tokens = []
+        source.masked = "".join(parsed.masked for _, parsed in segments)
+        source.items = []
+        source.inner_attributes = []
+        source.open_blocks = segments[-1][1].open_blocks if segments else 0
+        source.open_header = segments[-1][1].open_header if segments else False
+        container: Optional[Item] = None  # impl/trait/mod abierto por un segmento "header"
+
+        for segment, parsed in segments:
+            source.inner_attributes.extend(parsed.inner_attributes)
+            if segment.role == "close":
+                if container is not None:
+                    container.end = segment.start + parsed.code.index('}') + 1
+                    container.complete = True
+                container = None
+                continue
+            copies = {}
+            for item in parsed.items:
+                rebased = item.rebased(source, segment.start)
+                if rebased.start == segment.start:
+                    # El segmento puede empezar a mitad de línea (`} fn b() {`)
+                    line_start = code.rfind('\n', 0, segment.start) + 1
+                    if rebased.end == rebased.start:
+                        rebased.end = line_start  # Cabecera sin terminar
+                    rebased.start = line_start
+                copies[id(item)] = rebased
+                parent = copies.get(id(item.parent)) if item.parent is not None else container
+                if parent is not None:
+                    rebased.parent = parent
+                    parent.children.append(rebased)
+                source.items.append(rebased)
+            if segment.role == "header":
+                container = copies[id(parsed.items[-1])]
+                # Hasta que llegue el cierre, el contenedor abarca el resto del código
+                container.end = len(code)
+        source._index()
+        return source
+
+    def items_of_kind(self, kind: str) -> List[Item]:
+        return [item for item in self.items if item.kind == kind]
+
+    def functions_named(self, *names: str) -> List[Function]:
+        return [fn for fn in self.functions if fn.name in names]
+
+    def impls_of(self, trait: str) -> List[Impl]:
+        return [impl for impl in self.impls if impl.trait == trait]
+
+    def has_inner_attribute(self, name: str) -> bool:
+        return any(attribute_path(attribute) == name for attribute in self.inner_attributes)
+
+    def __repr__(self):
+        return f"SourceFile(items={len(self.items)}, tokens={len(self.tokens)})"
+
+
+def _mask_comments(code: str, tokens: List[Token]) -> str:
+    """Reemplaza los comentarios por espacios conservando saltos de línea y offsets."""
+    pieces = []
+    last = 0
+    for token in tokens:
+        if token.kind == "comment":
+            pieces.append(code[last:token.start])
+            pieces.append(re.sub(r'[^\n]', ' ', token.text))
+            last = token.end
+    if not pieces:
+        return code
+    pieces.append(code[last:])
+    return "".join(pieces)
+
+
+class _ItemParser:
+    """Recorre los tokens una vez con una pila de bloques."""
+    def __init__(self, source: SourceFile):
+        self.source = source
+        self.tokens = [token for token in source.tokens if token.kind != "comment"]
+        # Por cada llave abierta: (item que abre o None, item contenedor)
+        self.stack: List[tuple] = []
+        self.pending: Optional[Item] = None  # Item cuya cabecera se está leyendo
+        self.pending_token = 0  # Índice del token de la palabra clave del item pendiente
+        self.nesting = 0  # Paréntesis/corchetes abiertos en la cabecera pendiente
+        self.attributes: List[str] = []
+
+    def enclosing(self) -> Optional[Item]:
+        return self.stack[-1][1] if self.stack else None
+
+    def run(self):
+        tokens = self.tokens
+        code = self.source.code
+        count = len(tokens)
+        i = 0
+        while i < count:
+            token = tokens[i]
+            text = token.text
+
+            if token.kind == "punct" and text == '#' and self.pending is None:
+                i = self.read_attribute(i)
+                continue
+
+            if token.kind == "ident" and text in ITEM_KEYWORDS and self.pending is None:
+                i = self.start_item(i)
+                continue
+
+            if token.kind != "punct":
+                i += 1
+                continue
+
+            if text == '{':
+                item = None
+                if self.pending is not None and self.nesting == 0:
+                    item = self.pending
+                    item.open_brace = token.start
+                    if isinstance(item, Impl):
+                        self.read_impl_header(item, self.pending_token + 1, i)
+                    self.pending = None
+                self.attributes = []
+                self.stack.append((item, item or self.enclosing()))
+            elif text == '}':
+                if self.stack:
+                    item, _ = self.stack.pop()
+                    if item is not None:
+                        item.end = token.end
+                        item.complete = True
+                self.attributes = []
+            elif text in '([':
+                if self.pending is not None:
+                    if text == '(' and self.nesting == 0 and isinstance(self.pending, Function) \
+                            and self.pending.params_start == -1:
+                        self.pending.params_start = token.start
+                    self.nesting += 1
+            elif text in ')]':
+                if self.pending is not None:
+                    self.nesting = max(0, self.nesting - 1)
+                    if self.nesting == 0 and isinstance(self.pending, Function) \
+                            and self.pending.params_end == -1 and self.pending.params_start != -1:
+                        self.pending.params_end = token.start
+            elif text == ';':
+                if self.pending is not None and self.nesting == 0:
+                    # Item sin cuerpo: `fn x();`, `struct A;`, `mod m;`
+                    self.pending.end = token.end
+                    self.pending.complete = True
+                    self.pending = None
+                self.attributes = []
+            i += 1
+
+        # Bloques sin cerrar: llegan hasta el final del código
+        for item, _ in self.stack:
+            if item is not None:
+                item.end = len(code)
+        self.source.open_blocks = len(self.stack)
+        self.source.open_header = self.source.open_header or self.pending is not None
+
+    def read_attribute(self, i: int) -> int:
+        """Lee `#[...]` o `#![...]` y retorna el índice del token siguiente."""
+        tokens = self.tokens
+        inner = i + 1 < len(tokens) and tokens[i + 1].text == '!'
+        open_index = i + 2 if inner else i + 1
+        if open_index >= len(tokens) or tokens[open_index].text != '[':
+            return i + 1
+        depth = 0
+        j = open_index
+        while j < len(tokens):
+            text = tokens[j].text
+            if tokens[j].kind == "punct":
+                if text == '[':
+                    depth += 1
+                elif text == ']':
+                    depth -= 1
+                    if depth == 0:
+                        break
+            j += 1
+        if j >= len(tokens):
+            self.source.open_header = True
+        close = tokens[j].start if j < len(tokens) else len(self.source.code)
+        attribute = self.source.code[tokens[open_index].end:close].strip()
+        if inner:
+            self.source.inner_attributes.append(attribute)
+        else:
+            self.attributes.append(attribute)
+        return j + 1
+
+    def start_item(self, i: int) -> int:
+        tokens = self.tokens
+        keyword = tokens[i].text
+        name = None
+        if keyword != 'impl':
+            # `fn(u32) -> u32` es un tipo, no un item
+            if i + 1 >= len(tokens) or tokens[i + 1].kind != "ident":
+                return i + 1
+            name = tokens[i + 1].text
+        code = self.source.code
+        start = code.rfind('\n', 0, tokens[i].start) + 1
+        cls = Function if keyword == 'fn' else Impl if keyword == 'impl' else Item
+        item = cls(self.source, keyword, name, start, self.attributes, self.enclosing())
+        self.attributes = []
+        if item.parent is not None:
+            item.parent.children.append(item)
+        self.source.items.append(item)
+        self.pending = item
+        self.pending_token = i
+        self.nesting = 0
+        return i + 1 if name is None else i + 2
+
+    def read_impl_header(self, impl: Impl, first: int, brace: int):
+        """Separa `impl<...> Trait for Tipo<...> where ...` en trait y tipo."""
+        parts: List[Optional[str]] = [None]
+        depth = 0
+        for token in self.tokens[first:brace]:
+            text = token.text
+            if text == '<':
+                depth += 1
+            elif text == '>':
+                depth = max(0, depth - 1)
+            elif depth == 0 and token.kind == "ident":
+                if text == 'where':
+                    break
+                if text == 'for':
+                    parts.append(None)
+                elif text not in ('dyn', 'mut', 'unsafe', 'const'):
+                    parts[-1] = text  # Último segmento del path
+        if len(parts) > 1:
+            impl.trait, impl.name = parts[0], parts[-1]
+        else:
+            impl.name = parts[0]
+
+
+class Segment:
+    """
+    Rango [start, end) del código que se parsea por separado.
+
+    role: "item" (item de nivel superior u otro texto), "header" (cabecera de
+    impl/trait/mod hasta su llave), "member" (item dentro de un contenedor)
+    o "close" (llave de cierre del contenedor).
+    """
+    __slots__ = ("start", "end", "role")
+
+    def __init__(self, start: int, end: int, role: str):
+        self.start = start
+        self.end = end
+        self.role = role
+
+    def __repr__(self):
+        return f"Segment({self.role}, {self.start}:{self.end})"
+
+
+def _skip_literal(code: str, i: int) -> int:
+    """Fin del comentario o literal que empieza en i, o i si no hay ninguno."""
+    if code[i] == '"':
+        prefix = _RAW_PREFIX.search(code, max(0, i - 16), i)
+        if prefix is not None:
+            i = prefix.start()
+    match = _TOKEN.match(code, i)
+    kind = match.lastgroup
+    if kind in ("line_comment", "string", "char"):
+        return match.end()
+    if kind in ("block_comment", "raw_string"):
+        return _literal_end(code, kind, i, match.end())
+    return i
+
+
+def _opens_container(header: str) -> bool:
+    """Indica si la cabecera (terminada en `{`) abre un impl, trait o mod."""
+    items = _parse_segment(header).items
+    if not items:
+        return False
+    last = items[-1]
+    return last.kind in ('impl', 'trait', 'mod') and not last.complete and last.open_brace == len(header) - 1
+
+
+def split_segments(code: str, max_segments: Optional[int] = None) -> Optional[List[Segment]]:
+    """
+    Corta el código en segmentos contiguos que cubren todo el texto: items de
+    nivel superior y, dentro de impl/trait/mod, cada miembro por separado.
+    Cada segmento termina en su `}` o `;` más el resto de esa línea.
+
+    Retorna None si se superan max_segments.
+    """
+    segments: List[Segment] = []
+    length = len(code)
+    depth = 0
+    in_container = False
+    segment_start = 0
+    i = 0
+
+    def cut(end: int, role: str) -> int:
+        end = _TRAILING.match(code, end).end()
+        segments.append(Segment(segment_start, end, role))
+        return end
+
+    while True:
+        if max_segments is not None and len(segments) > max_segments:
+            return None
+        match = _SEGMENT_SCAN.search(code, i)
+        if match is None:
+            break
+        i = match.start()
+        char = code[i]
+        if char not in '{};':
+            skipped = _skip_literal(code, i)
+            i = skipped if skipped != i else i + 1
+            continue
+        if char == '{':
+            depth += 1
+            if depth == 1 and not in_container and _opens_container(code[segment_start:i + 1]):
+                segment_start = i = cut(i + 1, "header")
+                in_container = True
+                continue
+        elif char == '}':
+            depth = max(0, depth - 1)
+            if in_container and depth == 0:
+                if code[segment_start:i].strip():
+                    segments.append(Segment(segment_start, i, "member"))
+                    segment_start = i
+                segment_start = i = cut(i + 1, "close")
+                in_container = False
+                continue
+            if depth == (1 if in_container else 0):
+                segment_start = i = cut(i + 1, "member" if in_container else "item")
+                continue
+        elif depth == (1 if in_container else 0):
+            # `;` que termina un item (`use ...;`, `fn x();`, `struct A;`)
+            segment_start = i = cut(i + 1, "member" if in_container else "item")
+            continue
+        i += 1
+
+    if segment_start < length:
+        segments.append(Segment(segment_start, length, "member" if in_container else "item"))
+    return segments
+
+
+# Segmentos parseados (sin tokens) por texto, para parse_incremental. El
+# límite es en caracteres: un segmento puede ser el código completo.
+SEGMENT_CACHE_CHARS = 4_000_000
+_segment_cache: "OrderedDict[str, SourceFile]" = OrderedDict()
+_segment_cache_chars = 0
+_segment_lock = threading.Lock()
+
+
+def _parse_segment(text: str) -> SourceFile:
+    with _segment_lock:
+        parsed = _segment_cache.get(text)
+        if parsed is not None:
+            _segment_cache.move_to_end(text)
+            return parsed
+    global _segment_cache_chars
+    parsed = SourceFile(text)
+    parsed.tokens = []  # Solo se usan para parsear; no vale la pena retenerlos
+    if len(text) > SEGMENT_CACHE_CHARS // 8:
+        return parsed
+    with _segment_lock:
+        if text not in _segment_cache:
+            _segment_cache[text] = parsed
+            _segment_cache_chars += len(text)
+        while _segment_cache_chars > SEGMENT_CACHE_CHARS:
+            evicted, _ = _segment_cache.popitem(last=False)
+            _segment_cache_chars -= len(evicted)
+    return parsed
+
+
+# Veces que se une un segmento que no cierra limpio con el siguiente antes de
+# parsear el código completo
+_MAX_SEGMENT_MERGES = 4
+# Con más segmentos que esto (p.ej. miles de `}` sueltas) unirlos cuesta más
+# que parsear el código completo
+_MAX_SEGMENTS = 2048
+
+
+def parse_incremental(code: str) -> SourceFile:
+    """
+    Equivalente a `parse(code)` para código que se edita de a poco: solo se
+    parsean los segmentos que no están en la caché.
+
+    El corte de split_segments es aproximado (no sigue paréntesis ni
+    atributos), así que un segmento que termina con una cabecera o bloque
+    abierto (`fn f(a: [u8;`) se une con el siguiente; si no alcanza, se
+    parsea el código completo.
+    """
+    segments = split_segments(code, _MAX_SEGMENTS)
+    if segments is None:
+        return parse(code)
+    parsed_segments: List[Tuple[Segment, SourceFile]] = []
+    open_segment: Optional[Segment] = None
+    merges = 0
+    for segment in segments:
+        if open_segment is not None:
+            merges += 1
+            if segment.role != open_segment.role or merges > _MAX_SEGMENT_MERGES:
+                return parse(code)
+            segment = Segment(open_segment.start, segment.end, segment.role)
+        parsed = _parse_segment(code[segment.start:segment.end])
+        if parsed.open_header or parsed.open_blocks != (1 if segment.role == "header" else 0):
+            open_segment = segment
+            continue
+        open_segment = None
+        parsed_segments.append((segment, parsed))
+    if open_segment is not None:
+        # El último segmento puede quedar abierto: llega hasta el final, como en parse()
+        parsed_segments.append((open_segment, _parse_segment(code[open_segment.start:open_segment.end])))
+    return SourceFile.compose(code, parsed_segments)
+
+
+@lru_cache(maxsize=64)
+def parse(code: str) -> SourceFile:
+    """Parsea el código una vez; llamadas repetidas con el mismo texto reutilizan el resultado."""
+    return SourceFile(code)
+
+
+def find_functions(code: str) -> List[Function]:
+    """
+    Funciones con cuerpo del código, en orden de aparición. Las declaraciones
+    sin cuerpo (`fn x();`) y las funciones sin cerrar se ignoran.
+    """
+    return parse(code).functions
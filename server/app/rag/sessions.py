@@ -0,0 +1,325 @@
+"""
+Sesiones de chat en servidor con memoria acotada.
+
+Cada sesión guarda los turnos literales recientes y un resumen acumulado de
+los anteriores. En cada turno solo se envía al LLM el resumen más los turnos
+que caben en SESSION_HISTORY_TOKENS; cuando el historial literal excede ese
+presupuesto, los turnos más antiguos se comprimen al resumen en segundo plano
+(con el modelo de SESSION_SUMMARY_MODEL o, si falla, de forma extractiva).
+
+El `SessionStore` expira sesiones inactivas (TTL), mantiene un máximo de
+sesiones (LRU) y un tope de memoria aproximado.
+"""
+
+from app.config import (
+    SESSION_TTL, SESSION_MAX_SESSIONS, SESSION_MAX_BYTES,
+    SESSION_HISTORY_TOKENS, SESSION_SUMMARY_TOKENS, SESSION_SUMMARY_MODEL
+)
+from app.rag.prompts import build_summary_prompt, estimate_tokens, CHARS_PER_TOKEN
+from app.rag.llm import complete
+from app.metrics import Counter, CACHE_REQUESTS
+from app.log import get_logger
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+import contextvars
+import threading
+import time
+import uuid
+
+logger = get_logger(__name__)
+
+# Contextos recuperados que se guardan por sesión (por consulta normalizada)
+CONTEXT_CACHE_SIZE = 8
+
+# Timeout de la llamada de resumen; si vence se usa el resumen extractivo
+SUMMARY_TIMEOUT = 20.0
+
+# Caracteres por turno en el resumen extractivo
+EXTRACTIVE_TURN_CHARS = 200
+
+SUMMARY_HEADERS = {
+    "es": "Resumen de la conversación previa:\n",
+    "en": "Summary of the previous conversation:\n",
+}
+
+SESSION_EVICTIONS = Counter(
+    "sorobai_session_evictions_total",
+    "Sesiones de chat eliminadas por motivo (expired, lru, memory, deleted)",
+    ("reason",)
+)
+
+SESSION_COMPACTIONS = Counter(
+    "sorobai_session_compactions_total",
+    "Compresiones de turnos antiguos al resumen por método (llm, extractive)",
+    ("method",)
+)
+
+_summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="session-summary")
+
+
+def _turn_tokens(turn: Dict[str, str]) -> int:
+    return estimate_tokens(turn.get("content", ""))
+
+
+def fit_history(history: List[Dict[str, str]], max_tokens: int) -> List[Dict[str, str]]:
+    """
+    Últimos turnos del historial que caben en `max_tokens`. Siempre conserva
+    el turno más reciente aunque por sí solo exceda el presupuesto.
+    """
+    kept = []
+    used = 0
+    for turn in reversed(history):
+        tokens = _turn_tokens(turn)
+        if kept and used + tokens > max_tokens:
+            break
+        kept.append(turn)
+        used += tokens
+    kept.reverse()
+    return kept
+
+
+def fit_context(chunks: List[Dict], max_tokens: int) -> List[Dict]:
+    """Chunks (en orden de relevancia) que caben en `max_tokens`; al menos uno."""
+    kept = []
+    used = 0
+    for chunk in chunks:
+        tokens = estimate_tokens(chunk.get("content", ""))
+        if kept and used + tokens > max_tokens:
+            break
+        kept.append(chunk)
+        used += tokens
+    return kept
+
+
+def extractive_summary(previous_summary: str, turns: List[Dict[str, str]], max_tokens: int) -> str:
+    """Resumen de respaldo: primeras líneas de cada turno, recortado desde el inicio."""
+    lines = [previous_summary] if previous_summary else []
+    for turn in turns:
+        text = " ".join(turn.get("content", "").split())
+        if len(text) > EXTRACTIVE_TURN_CHARS:
+            text = text[:EXTRACTIVE_TURN_CHARS].rsplit(" ", 1)[0] + "…"
+        lines.append(f"{turn['role']}: {text}")
+    summary = "\n".join(lines)
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(summary) > max_chars:
+        # Se conserva lo más reciente
+        summary = "…" + summary[-max_chars:]
+    return summary
+
+
+def summarize_turns(previous_summary: str, turns: List[Dict[str, str]], language: str = "es") -> str:
+    """Comprime `turns` en el resumen acumulado usando el LLM, con respaldo extractivo."""
+    system_prompt, user_prompt = build_summary_prompt(previous_summary, turns, SESSION_SUMMARY_TOKENS, language)
+    try:
+        completion = complete(
+            [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+            model=SESSION_SUMMARY_MODEL,
+            temperature=0.0,
+            timeout=SUMMARY_TIMEOUT,
+            hedge=False
+        )
+        summary = completion.content.strip()
+        if summary:
+            SESSION_COMPACTIONS.inc(method="llm")
+            max_chars = SESSION_SUMMARY_TOKENS * CHARS_PER_TOKEN
+            return summary if len(summary) <= max_chars else summary[:max_chars]
+    except Exception as e:
+        logger.warning("resumen con LLM falló, se usa extractivo", extra={"error": str(e)})
+    SESSION_COMPACTIONS.inc(method="extractive")
+    return extractive_summary(previous_summary, turns, SESSION_SUMMARY_TOKENS)
+
+
+class ChatSession:
+    """Estado de una conversación: turnos recientes, resumen y contextos recuperados."""
+    def __init__(self, session_id: str, language: Optional[str] = None):
+        self.session_id = session_id
+        self.language = language
+        self.turns: List[Dict[str, str]] = []
+        self.summary = ""
+        self.summarized_turns = 0
+        self.context_cache: "OrderedDict[tuple, List[Dict]]" = OrderedDict()
+        self.created_at = time.time()
+        self.last_access = time.monotonic()
+        self.nbytes = 0
+        # Serializa los turnos de la sesión; la compresión solo lo toma al aplicar
+        self.lock = threading.Lock()
+        self._compacting = False
+
+    def history_tokens(self) -> int:
+        return sum(_turn_tokens(turn) for turn in self.turns)
+
+    def window(self, max_tokens: int = SESSION_HISTORY_TOKENS) -> List[Dict[str, str]]:
+        """Mensajes de historial para el prompt: resumen + turnos que caben en el presupuesto."""
+        messages = []
+        if self.summary:
+            header = SUMMARY_HEADERS.get(self.language or "es", SUMMARY_HEADERS["es"])
+            messages.append({"role": "system", "content": header + self.summary})
+        messages.extend(fit_history(self.turns, max_tokens))
+        return messages
+
+    def cached_context(
+        self, query: str, k: int, retrieve: Callable[[], List[Dict]], index_version: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Contexto recuperado para `query`, reutilizado si ya se recuperó en esta
+        sesión con la misma versión del índice.
+        """
+        key = (" ".join(query.lower().split()), k, index_version)
+        chunks = self.context_cache.get(key)
+        if chunks is not None:
+            CACHE_REQUESTS.inc(cache="session_context", result="hit")
+            self.context_cache.move_to_end(key)
+            return chunks
+        CACHE_REQUESTS.inc(cache="session_context", result="miss")
+        chunks = retrieve()
+        self.context_cache[key] = chunks
+        while len(self.context_cache) > CONTEXT_CACHE_SIZE:
+            self.context_cache.popitem(last=False)
+        return chunks
+
+    def compute_nbytes(self) -> int:
+        """Tamaño aproximado en memoria (caracteres de turnos, resumen y contextos)."""
+        size = len(self.summary) + sum(len(turn.get("content", "")) for turn in self.turns)
+        for chunks in self.context_cache.values():
+            size += sum(len(chunk.get("content", "")) for chunk in chunks)
+        return size
+
+    def overflow(self, max_tokens: int = SESSION_HISTORY_TOKENS) -> int:
+        """
+        Cantidad de turnos antiguos a comprimir para que el historial literal
+        quepa en el presupuesto. Se comprime por pares (usuario + asistente)
+        y siempre se conserva el último par.
+        """
+        total = self.history_tokens()
+        count = 0
+        while total > max_tokens and count + 2 < len(self.turns):
+            total -= _turn_tokens(self.turns[count]) + _turn_tokens(self.turns[count + 1])
+            count += 2
+        return count
+
+    def describe(self) -> Dict[str, object]:
+        return {
+            "session_id": self.session_id,
+            "turns": len(self.turns),
+            "summarized_turns": self.summarized_turns,
+            "history_tokens": self.history_tokens(),
+            "summary_tokens": estimate_tokens(self.summary),
+            "cached_contexts": len(self.context_cache),
+        }
+
+
+class SessionStore:
+    """
+    Sesiones en memoria con expiración por inactividad, límite LRU y tope de
+    memoria aproximado. El orden del OrderedDict es el de último acceso.
+    """
+    def __init__(self, ttl: float, max_sessions: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def create(self, language: Optional[str] = None) -> ChatSession:
+        session = ChatSession(uuid.uuid4().hex, language)
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._evict_locked(keep=session.session_id)
+        return session
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        """Sesión activa o None si no existe o expiró."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            now = time.monotonic()
+            if now - session.last_access > self.ttl:
+                self._remove_locked(session_id, "expired")
+                return None
+            session.last_access = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            self._remove_locked(session_id, "deleted")
+            return True
+
+    def record_turn(self, session: ChatSession, user_message: str, answer: str):
+        """Agrega un turno, actualiza el tamaño y agenda la compresión si hace falta."""
+        session.turns.append({"role": "user", "content": user_message})
+        session.turns.append({"role": "assistant", "content": answer})
+        self.resize(session)
+        if session.overflow() and not session._compacting:
+            session._compacting = True
+            context = contextvars.copy_context()
+            _summary_pool.submit(context.run, self._compact, session)
+
+    def resize(self, session: ChatSession):
+        """Recalcula el tamaño de la sesión y aplica los límites del store."""
+        nbytes = session.compute_nbytes()
+        with self._lock:
+            if self._sessions.get(session.session_id) is not session:
+                return
+            self._bytes += nbytes - session.nbytes
+            session.nbytes = nbytes
+            self._evict_locked(keep=session.session_id)
+
+    def _compact(self, session: ChatSession):
+        try:
+            count = session.overflow()
+            if not count:
+                return
+            # Solo se agregan turnos al final, así que los primeros `count` no cambian
+            old_turns = session.turns[:count]
+            summary = summarize_turns(session.summary, old_turns, session.language or "es")
+            with session.lock:
+                session.summary = summary
+                del session.turns[:count]
+                session.summarized_turns += count
+            self.resize(session)
+        except Exception:
+            logger.exception("error comprimiendo sesión", extra={"session_id": session.session_id})
+        finally:
+            session._compacting = False
+
+    def sweep(self):
+        """Elimina las sesiones expiradas."""
+        with self._lock:
+            self._evict_locked()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "bytes": self._bytes}
+
+    def _remove_locked(self, session_id: str, reason: str):
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.nbytes
+        SESSION_EVICTIONS.inc(reason=reason)
+
+    def _evict_locked(self, keep: Optional[str] = None):
+        now = time.monotonic()
+        # Las más antiguas por acceso están al inicio
+        for session_id, session in list(self._sessions.items()):
+            if now - session.last_access <= self.ttl:
+                break
+            if session_id != keep:
+                self._remove_locked(session_id, "expired")
+
+        for reason, over in (
+            ("lru", lambda: len(self._sessions) > self.max_sessions),
+            ("memory", lambda: self._bytes > self.max_bytes),
+        ):
+            while over():
+                oldest = next((sid for sid in self._sessions if sid != keep), None)
+                if oldest is None:
+                    break
+                self._remove_locked(oldest, reason)
+
+
+session_store = SessionStore(SESSION_TTL, SESSION_MAX_SESSIONS, SESSION_MAX_BYTES)
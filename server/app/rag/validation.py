@@ -0,0 +1,242 @@
+"""
+Validación de código para el endpoint /validate.
+
+La validación es CPU pura, así que corre en un pool de procesos
+(VALIDATE_WORKERS) para no bloquear el event loop ni competir por el GIL con
+los hilos de los requests. Los snippets de menos de VALIDATE_INLINE_MAX_CHARS
+se validan en el proceso de la API: cuestan menos que el viaje al pool.
+
+Los resultados se cachean (LRU en memoria) por hash del código, tipo de
+contrato y VALIDATOR_VERSION, así que un cambio de reglas invalida la caché.
+Los snippets repetidos dentro de un mismo request se validan una sola vez.
+
+En modo incremental (edición en vivo desde el studio) la validación corre en
+un hilo del proceso de la API: las cachés por item de `validate_incremental`
+tienen que sobrevivir entre requests, y con ellas una edición chica cuesta
+milisegundos aunque el contrato sea grande.
+"""
+
+from app.config import (
+    VALIDATE_WORKERS, VALIDATE_CACHE_SIZE, VALIDATE_INLINE_MAX_CHARS, VALIDATE_TIMEOUT
+)
+from app.rag.validators import (
+    VALIDATOR_VERSION, validate_soroban_code, validate_incremental, format_validation_message
+)
+from app.metrics import CACHE_REQUESTS, Histogram
+from app.log import get_logger
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import multiprocessing
+import threading
+import time
+
+logger = get_logger(__name__)
+
+VALIDATE_LATENCY = Histogram(
+    "sorobai_validate_seconds",
+    "Duración de cada validación de /validate por ejecutor (inline, pool o incremental)",
+    ("executor",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+
+def validation_report(code: str, contract_type: Optional[str] = None, incremental: bool = False) -> Dict[str, Any]:
+    """
+    Valida el código y arma el resultado serializable (lo que devuelve
+    /validate y validate_code_only). `incremental` da el mismo resultado.
+    """
+    validate = validate_incremental if incremental else validate_soroban_code
+    validation_result = validate(code, contract_type)
+
+    return {
+        "is_valid": validation_result.is_valid,
+        "has_warnings": len(validation_result.warnings) > 0,
+        "errors": validation_result.errors,
+        "warnings": validation_result.warnings,
+        "message": format_validation_message(validation_result),
+        "findings": [finding.to_dict() for finding in validation_result.findings],
+        "skipped_rules": validation_result.skipped,
+        "summary": {
+            "total_errors": len(validation_result.errors),
+            "total_warnings": len(validation_result.warnings),
+            "antipatterns_detected": [
+                err for err in validation_result.errors
+                if "ANTIPATRÓN" in err
+            ]
+        }
+    }
+
+
+def cache_key(code: str, contract_type: Optional[str] = None) -> str:
+    digest = hashlib.sha256(code.encode("utf-8")).hexdigest()
+    return f"{VALIDATOR_VERSION}:{contract_type or '-'}:{digest}"
+
+
+class ValidationCache:
+    """Caché LRU de resultados de validación, segura entre hilos."""
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            report = self._entries.get(key)
+            if report is not None:
+                self._entries.move_to_end(key)
+        CACHE_REQUESTS.inc(cache="validation", result="hit" if report is not None else "miss")
+        return report
+
+    def put(self, key: str, report: Dict[str, Any]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = report
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+validation_cache = ValidationCache(VALIDATE_CACHE_SIZE)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # "spawn": el proceso de la API tiene hilos (logging, pools) que no
+            # sobreviven bien a un fork
+            _pool = ProcessPoolExecutor(
+                max_workers=VALIDATE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """Descarta un pool roto (p.ej. un worker murió) para que se cree uno nuevo."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def warm_pool() -> int:
+    """
+    Arranca los VALIDATE_WORKERS workers del pool con una validación mínima:
+    con "spawn" cada worker importa los validadores al nacer, y así ese costo
+    lo paga el arranque y no el primer /validate. Retorna los workers listos.
+    """
+    if VALIDATE_WORKERS <= 0:
+        return 0
+    pool = _get_pool()
+    futures = [pool.submit(validation_report, "#![no_std]\n") for _ in range(VALIDATE_WORKERS)]
+    for future in futures:
+        future.result(timeout=VALIDATE_TIMEOUT)
+    return len(futures)
+
+
+def shutdown_pool():
+    """
+    Apaga el pool esperando a los workers (shutdown de la API). Sin esperar,
+    los procesos "spawn" quedan huérfanos y el resource_tracker reporta sus
+    semáforos como perdidos; las validaciones en curso están acotadas por
+    VALIDATOR_TIME_BUDGET, así que la espera es corta.
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+async def _run_validation(code: str, contract_type: Optional[str], incremental: bool = False) -> Dict[str, Any]:
+    started = time.perf_counter()
+    if incremental:
+        report = await asyncio.wait_for(
+            asyncio.to_thread(validation_report, code, contract_type, True),
+            timeout=VALIDATE_TIMEOUT
+        )
+        VALIDATE_LATENCY.observe(time.perf_counter() - started, executor="incremental")
+        return report
+
+    if len(code) <= VALIDATE_INLINE_MAX_CHARS or VALIDATE_WORKERS <= 0:
+        report = validation_report(code, contract_type)
+        VALIDATE_LATENCY.observe(time.perf_counter() - started, executor="inline")
+        return report
+
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = _get_pool()
+        try:
+            report = await asyncio.wait_for(
+                loop.run_in_executor(pool, validation_report, code, contract_type),
+                timeout=VALIDATE_TIMEOUT
+            )
+            break
+        except BrokenProcessPool:
+            logger.warning("pool de validación roto, recreando", extra={"attempt": attempt})
+            _discard_pool(pool)
+            if attempt == 1:
+                raise
+    VALIDATE_LATENCY.observe(time.perf_counter() - started, executor="pool")
+    return report
+
+
+async def validate_many(items: List[Tuple[str, Optional[str]]], incremental: bool = False) -> List[Dict[str, Any]]:
+    """
+    Valida varios snippets (código, tipo de contrato) en paralelo.
+    Con `incremental`, sin pool de procesos (ver el docstring del módulo).
+
+    Returns:
+        Un dict por snippet en el mismo orden: el resultado de
+        `validation_report` más `cached`, o {"error": ...} si falló.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    tasks: Dict[str, asyncio.Task] = {}
+    waiting: List[Tuple[int, str]] = []
+
+    for index, (code, contract_type) in enumerate(items):
+        key = cache_key(code, contract_type)
+        report = validation_cache.get(key)
+        if report is not None:
+            results[index] = dict(report, cached=True)
+            continue
+        if key not in tasks:
+            tasks[key] = asyncio.ensure_future(_run_validation(code, contract_type, incremental))
+        waiting.append((index, key))
+
+    if tasks:
+        await asyncio.wait(tasks.values())
+
+    outcomes: Dict[str, Dict[str, Any]] = {}
+    for key, task in tasks.items():
+        error = task.exception()
+        if error is None:
+            validation_cache.put(key, task.result())
+            outcomes[key] = dict(task.result(), cached=False)
+        elif isinstance(error, asyncio.TimeoutError):
+            outcomes[key] = {"error": f"La validación superó {VALIDATE_TIMEOUT:.0f}s"}
+        else:
+            logger.error("error validando código", extra={"error": repr(error)})
+            outcomes[key] = {"error": str(error) or type(error).__name__}
+
+    for index, key in waiting:
+        results[index] = dict(outcomes[key])
+    return results
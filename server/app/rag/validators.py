@@ -1,414 +1,907 @@
 """
 Validadores para código generado por el RAG.
 Detectan patrones incorrectos y sugieren correcciones.
+
+Cada antipatrón es una `Rule` declarativa (patrones precompilados, severidad
+y mensaje) registrada en TOKEN_RULES o GENERAL_RULES. El código se parsea
+una sola vez (`CodeAnalysis` sobre app.rag.rust_parser: items, atributos,
+impl de TokenInterface y texto sin comentarios) y todas las reglas consultan
+ese análisis compartido. El resultado incluye hallazgos estructurados y el
+tiempo de cada regla.
+
+Para no bloquear el hilo del request, el código de más de
+VALIDATOR_MAX_CODE_CHARS caracteres no se valida y las reglas que no
+alcanzan a evaluarse dentro de VALIDATOR_TIME_BUDGET se omiten. El
+presupuesto cuenta desde antes del parseo (el parseo no se interrumpe; su
+costo lo acota el tamaño máximo). Un resultado con reglas omitidas no es
+válido (`is_valid` False, sin errores, con una advertencia y las reglas en
+`skipped`):
+el código no se revisó entero. benchmarks/validator.py mide el motor con
+entradas grandes y patológicas.
+
+`validate_incremental` es el modo para edición en vivo: parsea con
+`parse_incremental` (solo los items que cambiaron) y las reglas por función
+reutilizan sus resultados por hash de la función; las reglas que cruzan
+items se evalúan siempre. El resultado es el mismo que el de
+`validate_soroban_code`.
 """
 
-from typing import Dict, List, Optional
+from app.rag.rust_parser import Function, Impl, SourceFile, parse, parse_incremental
+from app.config import VALIDATOR_MAX_CODE_CHARS, VALIDATOR_TIME_BUDGET, VALIDATOR_FUNCTION_CACHE_SIZE
+from app.metrics import CACHE_REQUESTS, Counter, Histogram
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+import hashlib
 import re
+import threading
+import time
+
+
+# Versión de las reglas y del parser. Subirla al cambiar qué se detecta o los
+# mensajes: forma parte de la clave de la caché de /validate
+VALIDATOR_VERSION = "4"
+
+RULE_LATENCY = Histogram(
+    "sorobai_validator_rule_seconds",
+    "Tiempo de evaluación de cada regla del validador",
+    ("rule",),
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+)
+
+VALIDATIONS_INCOMPLETE = Counter(
+    "sorobai_validator_incomplete_total",
+    "Validaciones incompletas por motivo (too_large, time_budget)",
+    ("reason",)
+)
+
+_DEFAULT_TIME_BUDGET = VALIDATOR_TIME_BUDGET if VALIDATOR_TIME_BUDGET > 0 else None
+
+
+class Finding:
+    """Hallazgo de una regla: severidad, mensaje y función afectada (si aplica)."""
+    def __init__(self, rule: str, severity: str, message: str, function: Optional[str] = None):
+        self.rule = rule
+        self.severity = severity
+        self.message = message
+        self.function = function
+
+    def to_dict(self) -> Dict[str, Optional[str]]:
+        return {"rule": self.rule, "severity": self.severity, "message": self.message, "function": self.function}
+
+    def __repr__(self):
+        return f"Finding({self.rule}, {self.severity})"
 
 
 class CodeValidationResult:
     """Resultado de validación de código"""
-    def __init__(self, is_valid: bool, errors: List[str] = None, warnings: List[str] = None):
+    def __init__(
+        self,
+        is_valid: bool,
+        errors: List[str] = None,
+        warnings: List[str] = None,
+        findings: List[Finding] = None,
+        timings: Dict[str, float] = None,
+        skipped: List[str] = None
+    ):
         self.is_valid = is_valid
         self.errors = errors or []
         self.warnings = warnings or []
-    
+        self.findings = findings or []
+        self.timings = timings or {}
+        self.skipped = skipped or []  # Reglas no evaluadas por límite de tiempo o tamaño
+
+    @property
+    def incomplete(self) -> bool:
+        """Alguna regla no se evaluó: el código no se revisó entero."""
+        return bool(self.skipped)
+
     def __bool__(self):
         return self.is_valid
-    
+
     def __repr__(self):
         return f"CodeValidationResult(valid={self.is_valid}, errors={len(self.errors)}, warnings={len(self.warnings)})"
 
 
-def validate_token_contract(code: str) -> CodeValidationResult:
+# Patrones compartidos por las reglas
+_STORAGE_SET = re.compile(r'(?:persistent|temporary|instance)\(\)\.set\(')
+_PERSISTENT_GET = re.compile(r'persistent\(\)\.get\(')
+_ADDRESS_TYPE = re.compile(r'\bAddress\b')
+
+
+class FunctionCheckCache:
     """
-    Valida que un contrato de token siga las reglas correctas.
-    
-    Detecta TODOS los antipatrones del documento examples_token_antipattern.md:
-    1. Self-Client (Recursión Innecesaria)
-    2. Zombie Storage (Ignorar TTL)
-    3. Fake Auth (Verificación Manual)
-    4. Panic por Todo
-    5. Initialización Abierta (Front-Running)
-    6. Cálculo Pesado antes de Auth (Gas Griefing)
-    
-    Soporta dos casos:
-    - Caso A: Token usando TokenInterface (validación estricta)
-    - Caso B: Token custom sin TokenInterface (validación flexible)
+    Caché LRU de resultados de checks por función, con clave (regla, hash
+    del texto de la función). El texto incluye atributos, firma y cuerpo,
+    que es todo lo que un check por función puede leer.
     """
-    errors = []
-    warnings = []
-    
-    # ANTIPATRÓN 1: Self-Client (Recursión Innecesaria)
-    # Detectar token::Client::new(&e, &e.current_contract_address())
-    if re.search(r'token::Client::new\([^)]*current_contract_address', code):
-        errors.append(
-            "❌ [ANTIPATRÓN #1: Self-Client] Detectado uso de token::Client para llamarse a sí mismo. "
-            "Esto causa costos de gas innecesarios y posible recursión. "
-            "SOLUCIÓN: Accede directamente al storage o llama a funciones internas."
-        )
-    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, bytes], Optional[Dict[str, object]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_run(self, rule_id: str, fn: Function, check: "FunctionCheck") -> Optional[Dict[str, object]]:
+        key = (rule_id, hashlib.blake2b(fn.text.encode("utf-8"), digest_size=16).digest())
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        params = check(fn)
+        with self._lock:
+            self.misses += 1
+            if self.max_entries > 0:
+                self._entries[key] = params
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return params
+
+    def flush_metrics(self):
+        """Publica en CACHE_REQUESTS los hits/misses acumulados (una vez por validación)."""
+        with self._lock:
+            hits, misses, self.hits, self.misses = self.hits, self.misses, 0, 0
+        if hits:
+            CACHE_REQUESTS.inc(hits, cache="validator_functions", result="hit")
+        if misses:
+            CACHE_REQUESTS.inc(misses, cache="validator_functions", result="miss")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class CodeAnalysis:
+    """
+    Análisis compartido por todas las reglas, calculado una vez por código.
+
+    `text` es el código con los comentarios reemplazados por espacios: un
+    `require_auth` comentado no cuenta como verificación, ni un ejemplo
+    comentado dispara una regla.
+
+    Con `function_cache`, los checks por función (Rule.function_check)
+    reutilizan los resultados de funciones que no cambiaron.
+    """
+    def __init__(
+        self,
+        code: str,
+        source: Optional[SourceFile] = None,
+        function_cache: Optional[FunctionCheckCache] = None
+    ):
+        self.code = code
+        self.source = source if source is not None else parse(code)
+        self.function_cache = function_cache
+        self.text = self.source.masked
+        self.lower = self.text.lower()
+        self.functions: List[Function] = self.source.functions
+
+        # `impl TokenInterface for X { ... }` y sus funciones
+        token_impls = self.source.impls_of('TokenInterface')
+        self.implements_token_interface = bool(token_impls)
+        self.token_impl: Optional[Impl] = token_impls[0] if token_impls else None
+        self.token_impl_functions: List[Function] = self.token_impl.functions if self.token_impl else []
+
+    def functions_named(self, *names: str) -> List[Function]:
+        return self.source.functions_named(*names)
+
+    def has_attribute(self, kind: str, name: str) -> bool:
+        """Indica si algún item del tipo `kind` ("struct", "impl", ...) tiene el atributo."""
+        return any(item.has_attribute(name) for item in self.source.items_of_kind(kind))
+
+    def check_function(self, rule_id: str, fn: Function, check: "FunctionCheck") -> Optional[Dict[str, object]]:
+        if self.function_cache is None:
+            return check(fn)
+        return self.function_cache.get_or_run(rule_id, fn, check)
+
+
+def _code_lines(body: str) -> List[str]:
+    """Líneas no vacías que no son comentarios."""
+    return [line.strip() for line in body.strip().split('\n') if line.strip() and not line.strip().startswith('//')]
+
+
+# Un check recibe el análisis y produce un dict de parámetros por hallazgo
+# (para formatear el mensaje; "variant" elige entre mensajes alternativos y
+# "function" indica la función afectada)
+Check = Callable[[CodeAnalysis], Iterable[Dict[str, object]]]
+# Un check por función mira solo el texto de la función: parámetros del
+# hallazgo o None
+FunctionCheck = Callable[[Function], Optional[Dict[str, object]]]
+
+
+class Rule:
+    """
+    Regla declarativa del validador.
+
+    Args:
+        rule_id: Identificador estable de la regla
+        severity: "error" o "warning"
+        message: Plantilla del mensaje, o dict variante -> plantilla
+        pattern: Patrón precompilado; sin `check`, la regla dispara si aparece
+        check: Función que produce los hallazgos a partir del análisis
+        when: Condición previa sobre el análisis (p.ej. implementa TokenInterface)
+        function_check: Check por función, en lugar de `check`; su resultado
+            se cachea por función en la validación incremental
+        functions: Funciones a las que se aplica `function_check` (por
+            defecto, todas las funciones con cuerpo)
+        first_only: Reportar solo la primera función que dispara
+    """
+    def __init__(
+        self,
+        rule_id: str,
+        severity: str,
+        message: Union[str, Dict[str, str]],
+        pattern: Optional[re.Pattern] = None,
+        check: Optional[Check] = None,
+        when: Optional[Callable[[CodeAnalysis], bool]] = None,
+        function_check: Optional[FunctionCheck] = None,
+        functions: Optional[Callable[[CodeAnalysis], List[Function]]] = None,
+        first_only: bool = False
+    ):
+        self.rule_id = rule_id
+        self.severity = severity
+        self.message = message
+        self.pattern = pattern
+        self.check = check
+        self.when = when
+        self.function_check = function_check
+        self.functions = functions
+        self.first_only = first_only
+
+    def _function_hits(self, analysis: CodeAnalysis) -> List[Dict[str, object]]:
+        hits = []
+        functions = self.functions(analysis) if self.functions is not None else analysis.functions
+        for fn in functions:
+            params = analysis.check_function(self.rule_id, fn, self.function_check)
+            if params is not None:
+                hits.append(params)
+                if self.first_only:
+                    break
+        return hits
+
+    def evaluate(self, analysis: CodeAnalysis) -> List[Finding]:
+        if self.when is not None and not self.when(analysis):
+            return []
+        if self.function_check is not None:
+            hits = self._function_hits(analysis)
+        elif self.check is not None:
+            hits = self.check(analysis)
+        else:
+            hits = [{}] if self.pattern.search(analysis.text) else []
+        findings = []
+        for params in hits:
+            template = self.message[params["variant"]] if isinstance(self.message, dict) else self.message
+            findings.append(Finding(self.rule_id, self.severity, template.format(**params), params.get("function")))
+        return findings
+
+    def __repr__(self):
+        return f"Rule({self.rule_id}, {self.severity})"
+
+
+_INCOMPLETE_MESSAGE = (
+    "⚠️  Validación incompleta: se agotó el tiempo de análisis y no se evaluaron "
+    "{count} reglas ({rules}). Revisa el código manualmente."
+)
+_TOO_LARGE_MESSAGE = (
+    "⚠️  Código demasiado grande para validar automáticamente "
+    "({chars} caracteres, máximo {max_chars}). Revisa el código manualmente."
+)
+
+
+def run_rules(
+    rules: List[Rule],
+    analysis: CodeAnalysis,
+    time_budget: Optional[float] = None,
+    started: Optional[float] = None
+) -> CodeValidationResult:
+    """
+    Evalúa las reglas en orden sobre el análisis compartido.
+
+    Args:
+        rules: Reglas a evaluar
+        analysis: Análisis del código
+        time_budget: Segundos disponibles desde `started`; las reglas que no
+            alcanzan a empezar dentro del presupuesto se omiten y el
+            resultado deja de ser válido
+        started: Inicio de la validación (perf_counter); por defecto, ahora
+    """
+    findings: List[Finding] = []
+    timings: Dict[str, float] = {}
+    skipped: List[str] = []
+    deadline = None
+    if time_budget is not None:
+        deadline = (started if started is not None else time.perf_counter()) + time_budget
+
+    for rule in rules:
+        rule_started = time.perf_counter()
+        if deadline is not None and rule_started >= deadline:
+            skipped.append(rule.rule_id)
+            continue
+        findings.extend(rule.evaluate(analysis))
+        elapsed = time.perf_counter() - rule_started
+        timings[rule.rule_id] = elapsed
+        RULE_LATENCY.observe(elapsed, rule=rule.rule_id)
+
+    if skipped:
+        VALIDATIONS_INCOMPLETE.inc(reason="time_budget")
+        findings.append(Finding(
+            "validation_incomplete", "warning",
+            _INCOMPLETE_MESSAGE.format(count=len(skipped), rules=", ".join(skipped))
+        ))
+
+    errors = [finding.message for finding in findings if finding.severity == "error"]
+    warnings = [finding.message for finding in findings if finding.severity == "warning"]
+    return CodeValidationResult(not errors and not skipped, errors, warnings, findings, timings, skipped)
+
+
+# ---------------------------------------------------------------------------
+# Checks de contratos de token (antipatrones de examples_token_antipattern.md)
+# ---------------------------------------------------------------------------
+
+def _call_has_argument(text: str, call: str, needle: str) -> bool:
+    """
+    Indica si alguna llamada `call` (que termina en `(`) contiene `needle`
+    antes de su primer `)`. Equivale a `call[^)]*needle` pero en tiempo
+    lineal: el próximo `)` y la próxima aparición de `needle` se reutilizan
+    entre llamadas consecutivas en lugar de re-escanear el resto del código.
+    """
+    next_close = next_needle = -1
+    position = text.find(call)
+    while position != -1:
+        arguments = position + len(call)
+        if next_close < arguments:
+            next_close = text.find(')', arguments)
+            if next_close == -1:
+                next_close = len(text)
+        if next_needle < arguments:
+            next_needle = text.find(needle, arguments)
+            if next_needle == -1:
+                return False
+        if next_needle < next_close:
+            return True
+        position = text.find(call, arguments)
+    return False
+
+
+def _check_self_client(analysis: CodeAnalysis):
+    # token::Client::new(..., current_contract_address ...)
+    if _call_has_argument(analysis.text, 'token::Client::new(', 'current_contract_address'):
+        return [{}]
+    return []
+
+
+_TOKEN_INTERFACE_RECURSION = re.compile(r'TokenInterface::(transfer|mint|burn|balance|approve|allowance|decimals|name|symbol)')
+_TOKEN_INTERFACE_CALL = re.compile(r'TokenInterface::(transfer|mint|burn|balance|approve|allowance|decimals|name|symbol|initialize)')
+
+
+def _check_token_interface_recursion(analysis: CodeAnalysis):
     # Detectar TokenInterface::método() llamado desde dentro de impl TokenInterface
     # Esto causa RECURSIÓN INFINITA
-    impl_token_interface = re.search(r'impl\s+TokenInterface\s+for\s+(\w+)', code)
-    if impl_token_interface:
-        contract_name = impl_token_interface.group(1)
-        
-        # Extraer TODO el cuerpo del impl (puede tener múltiples funciones anidadas)
-        # Buscar desde "impl TokenInterface" hasta el último "}" del bloque
-        impl_start = code.find(f'impl TokenInterface for {contract_name}')
-        if impl_start != -1:
-            # Encontrar el cierre del bloque impl
-            brace_count = 0
-            impl_body_start = code.find('{', impl_start)
-            impl_body_end = impl_body_start
-            
-            for i in range(impl_body_start, len(code)):
-                if code[i] == '{':
-                    brace_count += 1
-                elif code[i] == '}':
-                    brace_count -= 1
-                    if brace_count == 0:
-                        impl_body_end = i
-                        break
-            
-            impl_body = code[impl_body_start:impl_body_end]
-            
-            # Detectar llamadas recursivas a TokenInterface::
-            has_recursion = bool(re.search(r'TokenInterface::(transfer|mint|burn|balance|approve|allowance|decimals|name|symbol)', impl_body))
-            
-            if has_recursion:
-                # Contar ocurrencias de TokenInterface:: method calls
-                method_calls = re.findall(r'TokenInterface::(transfer|mint|burn|balance|approve|allowance|decimals|name|symbol|initialize)', impl_body)
-                call_count = len(method_calls)
-                
-                # Contar funciones definidas
-                function_definitions = re.findall(r'fn\s+\w+\s*\(', impl_body)
-                func_count = len(function_definitions)
-                
-                if call_count >= func_count and func_count > 0:
-                    errors.append(
-                        "❌ [ANTIPATRÓN #1: Self-Client CRÍTICO] Detectada RECURSIÓN INFINITA MASIVA. "
-                        f"Estás implementando TokenInterface pero hay {call_count} llamadas a TokenInterface:: "
-                        f"en {func_count} funciones (eso es llamarte a ti mismo). "
-                        "Esto causará stack overflow inmediato. "
-                        "SOLUCIÓN: NO implementes TokenInterface así. "
-                        "Debes implementar la lógica REAL de storage y balances, NO delegar."
-                    )
-                else:
-                    errors.append(
-                        "❌ [ANTIPATRÓN #1: Self-Client CRÍTICO] Detectada RECURSIÓN INFINITA. "
-                        f"Estás implementando TokenInterface pero hay {call_count} llamadas recursivas a TokenInterface::. "
-                        "Esto causará stack overflow. "
-                        "SOLUCIÓN: Si implementas TokenInterface, debes escribir la lógica REAL, "
-                        "no delegar a TokenInterface (eso es llamarte a ti mismo)."
-                    )
-            
-            # Detectar implementación vacía/proxy (solo delega sin lógica real)
-            functions_in_impl = re.findall(r'fn\s+(\w+)\s*\([^)]*\)(?:\s*->\s*[^{]+)?\s*\{([^}]+)\}', impl_body)
-            
-            if functions_in_impl:
-                empty_count = 0
-                delegation_count = 0
-                
-                for func_name, func_body in functions_in_impl:
-                    # Si el cuerpo solo tiene una línea y es una llamada, es proxy vacío
-                    body_lines = [line.strip() for line in func_body.strip().split('\n') if line.strip() and not line.strip().startswith('//')]
-                    
-                    if len(body_lines) <= 1:
-                        empty_count += 1
-                        # Contar específicamente delegaciones a TokenInterface
-                        if 'TokenInterface::' in func_body:
-                            delegation_count += 1
-                
-                # Si TODAS las funciones son delegaciones a TokenInterface
-                if delegation_count > 0 and delegation_count == len(functions_in_impl):
-                    errors.append(
-                        "❌ [ANTIPATRÓN #1: Implementación Proxy Inútil] "
-                        "TODAS tus funciones solo llaman a TokenInterface::método(). "
-                        "Esto es RECURSIÓN INFINITA - cada método se llama a sí mismo indefinidamente. "
-                        "SOLUCIÓN: NO implementes TokenInterface manualmente. "
-                        "Usa #[contract(impl = TokenInterface)] o implementa la lógica REAL de storage."
-                    )
-                # Si más del 80% de funciones son proxies vacíos
-                elif empty_count > len(functions_in_impl) * 0.8:
-                    errors.append(
-                        "❌ [ANTIPATRÓN #1: Implementación Proxy Inútil] "
-                        "Tu implementación de TokenInterface solo delega sin agregar lógica. "
-                        "Esto NO funciona - debes implementar la lógica REAL de balances, storage, etc. "
-                        "SOLUCIÓN: Usa soroban_token_sdk correctamente o implementa toda la lógica desde cero."
-                    )
-    
+    impl = analysis.token_impl
+    if impl is None or not _TOKEN_INTERFACE_RECURSION.search(impl.body_code):
+        return []
+    call_count = len(_TOKEN_INTERFACE_CALL.findall(impl.body_code))
+    func_count = len(analysis.token_impl_functions)
+    variant = "massive" if call_count >= func_count and func_count > 0 else "recursive"
+    return [{"variant": variant, "call_count": call_count, "func_count": func_count}]
+
+
+def _check_proxy_implementation(analysis: CodeAnalysis):
+    # Detectar implementación vacía/proxy (solo delega sin lógica real)
+    functions = analysis.token_impl_functions
+    if not functions:
+        return []
+    empty_count = 0
+    delegation_count = 0
+    for fn in functions:
+        # Si el cuerpo solo tiene una línea y es una llamada, es proxy vacío
+        body = fn.body_code
+        if len(_code_lines(body)) <= 1:
+            empty_count += 1
+            # Contar específicamente delegaciones a TokenInterface
+            if 'TokenInterface::' in body:
+                delegation_count += 1
+    # Si TODAS las funciones son delegaciones a TokenInterface
+    if delegation_count > 0 and delegation_count == len(functions):
+        return [{"variant": "all_delegate"}]
+    # Si más del 80% de funciones son proxies vacíos
+    if empty_count > len(functions) * 0.8:
+        return [{"variant": "mostly_empty"}]
+    return []
+
+
+_LET_CLIENT = re.compile(r'let\s+client\s*=\s*token::Client::new')
+
+
+def _check_client_usage(analysis: CodeAnalysis):
     # Detectar cualquier uso sospechoso de Client dentro del propio contrato
-    if re.search(r'let\s+client\s*=\s*token::Client::new', code) and 'current_contract_address' in code:
-        warnings.append(
-            "⚠️  [ANTIPATRÓN #1] Uso de token::Client detectado. "
-            "Verifica que NO estés llamando al propio contrato (self-client antipattern)."
-        )
-    
-    # ANTIPATRÓN 2: Zombie Storage (Ignorar TTL)
-    # Detectar storage.set() sin extend_ttl
-    storage_set_pattern = r'(persistent|temporary|instance)\(\)\.set\('
-    storage_sets = re.findall(storage_set_pattern, code)
-    
-    if storage_sets:
-        # Verificar que exista extend_ttl cerca (misma función)
-        functions_with_set = re.findall(r'fn\s+\w+[^{]*\{[^}]*(?:persistent|temporary|instance)\(\)\.set\([^}]*\}', code, re.DOTALL)
-        
-        for func in functions_with_set:
-            if '.set(' in func and 'extend_ttl' not in func:
-                errors.append(
-                    "❌ [ANTIPATRÓN #2: Zombie Storage] Detectado storage.set() sin extend_ttl(). "
-                    "Los datos pueden expirar y ser archivados. "
-                    "SOLUCIÓN: Siempre llama a extend_ttl() después de set() para Persistent/Temporary storage."
-                )
-                break  # Solo reportar una vez
-    
+    if _LET_CLIENT.search(analysis.text) and 'current_contract_address' in analysis.text:
+        return [{}]
+    return []
+
+
+def _check_zombie_set(fn: Function):
+    # Detectar storage.set() sin extend_ttl en la misma función
+    if _STORAGE_SET.search(fn.code) and 'extend_ttl' not in fn.code:
+        return {"function": fn.name}
+    return None
+
+
+def _check_persistent_get(fn: Function):
     # Detectar get() sin extend_ttl para Persistent storage
-    if re.search(r'persistent\(\)\.get\(', code):
-        functions_with_get = re.findall(r'fn\s+\w+[^{]*\{[^}]*persistent\(\)\.get\([^}]*\}', code, re.DOTALL)
-        
-        for func in functions_with_get:
-            if '.get(' in func and 'extend_ttl' not in func:
-                warnings.append(
-                    "⚠️  [ANTIPATRÓN #2] Detectado persistent().get() sin extend_ttl(). "
-                    "Considera extender el TTL al leer datos críticos."
-                )
-                break
-    
-    # ANTIPATRÓN 3: Fake Auth (Verificación Manual)
-    # Detectar comparaciones de Address sin require_auth
-    if re.search(r'if\s+\w+\s*==\s*\w+.*Address', code) and 'require_auth' not in code:
-        errors.append(
-            "❌ [ANTIPATRÓN #3: Fake Auth] Detectada comparación manual de Address sin require_auth(). "
-            "Esto NO verifica criptográficamente la identidad. "
-            "SOLUCIÓN: Usa address.require_auth() para verificar firmas."
-        )
-    
-    # Detectar funciones con Address pero sin require_auth
-    auth_required_ops = ['transfer', 'transfer_from', 'approve', 'mint', 'burn', 'burn_from']
-
-    for op in auth_required_ops:
-        # Buscar implementaciones de estas funciones
-        pattern = rf'fn\s+{op}\s*\([^)]*\)(?:\s*->\s*[^{{]+)?\s*\{{([\s\S]*?)\n\s*\}}'
-        matches = re.findall(pattern, code)
-        
-        for body in matches:
+    if _PERSISTENT_GET.search(fn.code) and 'extend_ttl' not in fn.code:
+        return {"function": fn.name}
+    return None
+
+
+_IF_EQUALS = re.compile(r'if\s+\w+\s*==\s*\w+')
+
+
+def _check_fake_auth_comparison(analysis: CodeAnalysis):
+    # Detectar comparaciones de Address sin require_auth (en la misma línea del if)
+    code = analysis.text
+    if 'require_auth' in code:
+        return []
+    for match in _IF_EQUALS.finditer(code):
+        line_end = code.find('\n', match.end())
+        if 'Address' in code[match.end():len(code) if line_end == -1 else line_end]:
+            return [{}]
+    return []
+
+
+AUTH_REQUIRED_OPS = ('transfer', 'transfer_from', 'approve', 'mint', 'burn', 'burn_from')
+
+
+def _check_missing_require_auth(analysis: CodeAnalysis):
+    # Detectar funciones que modifican estado pero no usan require_auth
+    hits = []
+    for op in AUTH_REQUIRED_OPS:
+        for fn in analysis.functions_named(op):
+            body = fn.body_code
             # Si delega a TokenInterface::, es RECURSIÓN (ya detectado arriba)
             if 'TokenInterface::' + op in body:
-                continue  # Ya lo marcamos como recursión infinita
-            
-            # Si no usa require_auth Y tiene lógica real (más de 1 línea)
-            body_lines = [line.strip() for line in body.strip().split('\n') if line.strip() and not line.strip().startswith('//')]
-            
-            if len(body_lines) > 0 and 'require_auth' not in body:
-                errors.append(
-                    f"❌ [ANTIPATRÓN #3: Fake Auth] "
-                    f"La función '{op}' modifica estado pero no usa require_auth(). "
-                    f"Cualquiera puede llamar esta función. SOLUCIÓN: Agrega address.require_auth() al inicio."
-                )
+                continue
+            if _code_lines(body) and 'require_auth' not in body:
+                hits.append({"op": op, "function": op})
                 break
+    return hits
 
-    # ANTIPATRÓN 4: Panic por Todo
+
+_PANIC = re.compile(r'\bpanic!\(')
+_RESULT_TYPE = re.compile(r'Result<')
+
+
+def _check_panic_everything(analysis: CodeAnalysis):
     # Detectar panic! en lógica de negocio (muchos panics sin Result)
-    panic_count = len(re.findall(r'\bpanic!\(', code))
-    has_result_type = bool(re.search(r'Result<', code))
-    has_contract_error = bool(re.search(r'#\[contracterror\]', code))
-    
-    if panic_count > 3 and not (has_result_type or has_contract_error):
-        errors.append(
-            f"❌ [ANTIPATRÓN #4: Panic por Todo] Detectados {panic_count} usos de panic!() sin manejo de errores. "
-            "Los clientes reciben errores genéricos sin saber qué falló. "
-            "SOLUCIÓN: Define un enum con #[contracterror] y retorna Result<T, Error>."
-        )
-    
-    # Detectar panic! en validaciones comunes
-    common_panics = [
-        (r'panic!\([^)]*"negative', 'cantidad negativa'),
-        (r'panic!\([^)]*"insufficient', 'balance insuficiente'),
-        (r'panic!\([^)]*"unauthorized', 'no autorizado'),
-    ]
-    
-    for pattern, error_type in common_panics:
-        if re.search(pattern, code, re.IGNORECASE):
-            warnings.append(
-                f"⚠️  [ANTIPATRÓN #4] Detectado panic!() para '{error_type}'. "
-                "Considera usar #[contracterror] con códigos de error específicos."
-            )
-            break
-    
-    # ANTIPATRÓN 5: Initialización Abierta (Front-Running)
-    # initialize() debe verificar que no fue llamado antes
-    init_functions = re.findall(
-        r'fn\s+(initialize|__constructor)\s*\([^)]*\)(?:\s*->\s*[^{]+)?\s*\{([\s\S]*?)\}',
-        code,
-        re.DOTALL
-    )
+    panic_count = len(_PANIC.findall(analysis.text))
+    has_error_handling = bool(_RESULT_TYPE.search(analysis.text)) or analysis.has_attribute('enum', 'contracterror')
+    if panic_count > 3 and not has_error_handling:
+        return [{"panic_count": panic_count}]
+    return []
 
-    for name, body in init_functions:
-        # Si delega a TokenInterface::initialize, PUEDE estar OK (pero verificar)
-        if 'TokenInterface::initialize' in body:
-            # Si solo delega sin verificación previa, advertir
-            if 'has(' not in body and 'require_auth' not in body:
-                warnings.append(
-                    f"⚠️  [ANTIPATRÓN #5] La función {name}() delega a TokenInterface::initialize "
-                    "sin verificación previa. Asegúrate de que TokenInterface maneje la protección contra front-running."
-                )
-            continue
-        
-        # Para implementaciones custom
-        has_check = 'has(' in body or 'has(&' in body
-        calls_set = 'set(' in body or 'set(&' in body
-        uses_require_auth = 'require_auth' in body
-        
-        # Si escribe datos sin verificar que no existe
-        if calls_set and not has_check:
-            errors.append(
-                f"❌ [ANTIPATRÓN #5: Initialización Abierta] {name}() escribe datos sin verificar que no fue inicializado. "
-                "Un atacante puede front-run tu transacción. "
-                "SOLUCIÓN: Verifica storage.has(&key) antes de set()."
-            )
-        
-        # Si no requiere auth (aunque sea del deployer)
-        if calls_set and not uses_require_auth:
-            warnings.append(
-                f"⚠️  [ANTIPATRÓN #5] {name}() no usa require_auth(). "
-                "Considera requerir autorización del deployer o admin."
-            )
 
+_COMMON_PANICS = (
+    ('"negative', 'cantidad negativa'),
+    ('"insufficient', 'balance insuficiente'),
+    ('"unauthorized', 'no autorizado'),
+)
+
+
+def _check_common_panics(analysis: CodeAnalysis):
+    # panic!("negative ...") y similares, sin distinguir mayúsculas
+    for message, error_type in _COMMON_PANICS:
+        if _call_has_argument(analysis.lower, 'panic!(', message):
+            return [{"error_type": error_type}]
+    return []
+
+
+def _init_functions(analysis: CodeAnalysis) -> List[Function]:
+    return analysis.functions_named('initialize', '__constructor')
+
+
+def _check_init_delegation(fn: Function):
+    # Si delega a TokenInterface::initialize sin verificación previa, advertir
+    body = fn.body_code
+    if 'TokenInterface::initialize' in body and 'has(' not in body and 'require_auth' not in body:
+        return {"name": fn.name, "function": fn.name}
+    return None
+
+
+def _is_custom_init(fn: Function) -> bool:
+    """initialize()/__constructor() con lógica propia que escribe storage."""
+    return 'TokenInterface::initialize' not in fn.body_code and 'set(' in fn.body_code
+
+
+def _check_open_initialize(fn: Function):
+    # Si escribe datos sin verificar que no existe
+    if _is_custom_init(fn) and 'has(' not in fn.body_code:
+        return {"name": fn.name, "function": fn.name}
+    return None
+
+
+def _check_init_without_auth(fn: Function):
+    # Si no requiere auth (aunque sea del deployer)
+    if _is_custom_init(fn) and 'require_auth' not in fn.body_code:
+        return {"name": fn.name, "function": fn.name}
+    return None
+
+
+# Mínimo de caracteres del cuerpo antes de require_auth para considerarlo tardío
+_GAS_GRIEFING_MIN_CHARS = 50
+_GAS_GRIEFING_MAX_LINES = 5
+
+
+def _check_gas_griefing(fn: Function):
+    # Detectar funciones con Address donde require_auth está muy abajo
+    body = fn.body_code
+    auth_at = body.find('require_auth')
+    if auth_at < _GAS_GRIEFING_MIN_CHARS or not _ADDRESS_TYPE.search(fn.params):
+        return None
+    # Un bloque cerrado antes de require_auth (p.ej. un guard con return) no cuenta
+    if '}' in body[:auth_at]:
+        return None
+    # Contar líneas desde la firma hasta require_auth
+    lines_before_auth = fn.signature.count('\n') + body[:auth_at].count('\n')
+    if lines_before_auth > _GAS_GRIEFING_MAX_LINES:
+        return {"lines": lines_before_auth, "function": fn.name}
+    return None
+
+
+CUSTOM_BALANCE_FUNCTIONS = (
+    'spend_balance', 'receive_balance', 'get_balance',
+    'set_balance', 'add_balance', 'subtract_balance',
+    'read_balance', 'write_balance'
+)
+def _check_custom_balance_functions(analysis: CodeAnalysis):
+    # Incluye declaraciones sin cuerpo (p.ej. en un trait propio)
+    found = {item.name for item in analysis.source.items_of_kind('fn')}
+    return [{"func": func, "function": func} for func in CUSTOM_BALANCE_FUNCTIONS if func in found]
+
+
+def _symbol_param_check(param: str) -> Check:
+    """Parámetro `param: Symbol` en initialize() (debe ser String según TokenInterface)."""
+    pattern = re.compile(r'\b' + param + r'\s*:\s*Symbol\b')
+
+    def check(analysis: CodeAnalysis):
+        for fn in analysis.source.items_of_kind('fn'):
+            if fn.name == 'initialize' and pattern.search(fn.params):
+                return [{"function": fn.name}]
+        return []
+    return check
+
+
+def _implements_token_interface(analysis: CodeAnalysis) -> bool:
+    return analysis.implements_token_interface
+
+
+def _is_custom_token(analysis: CodeAnalysis) -> bool:
+    return not analysis.implements_token_interface and ('token' in analysis.lower or 'balance' in analysis.lower)
+
+
+TOKEN_RULES: List[Rule] = [
+    # ANTIPATRÓN 1: Self-Client (Recursión Innecesaria)
+    Rule(
+        "self_client", "error",
+        "❌ [ANTIPATRÓN #1: Self-Client] Detectado uso de token::Client para llamarse a sí mismo. "
+        "Esto causa costos de gas innecesarios y posible recursión. "
+        "SOLUCIÓN: Accede directamente al storage o llama a funciones internas.",
+        check=_check_self_client
+    ),
+    Rule(
+        "token_interface_recursion", "error",
+        {
+            "massive": (
+                "❌ [ANTIPATRÓN #1: Self-Client CRÍTICO] Detectada RECURSIÓN INFINITA MASIVA. "
+                "Estás implementando TokenInterface pero hay {call_count} llamadas a TokenInterface:: "
+                "en {func_count} funciones (eso es llamarte a ti mismo). "
+                "Esto causará stack overflow inmediato. "
+                "SOLUCIÓN: NO implementes TokenInterface así. "
+                "Debes implementar la lógica REAL de storage y balances, NO delegar."
+            ),
+            "recursive": (
+                "❌ [ANTIPATRÓN #1: Self-Client CRÍTICO] Detectada RECURSIÓN INFINITA. "
+                "Estás implementando TokenInterface pero hay {call_count} llamadas recursivas a TokenInterface::. "
+                "Esto causará stack overflow. "
+                "SOLUCIÓN: Si implementas TokenInterface, debes escribir la lógica REAL, "
+                "no delegar a TokenInterface (eso es llamarte a ti mismo)."
+            ),
+        },
+        check=_check_token_interface_recursion
+    ),
+    Rule(
+        "proxy_implementation", "error",
+        {
+            "all_delegate": (
+                "❌ [ANTIPATRÓN #1: Implementación Proxy Inútil] "
+                "TODAS tus funciones solo llaman a TokenInterface::método(). "
+                "Esto es RECURSIÓN INFINITA - cada método se llama a sí mismo indefinidamente. "
+                "SOLUCIÓN: NO implementes TokenInterface manualmente. "
+                "Usa #[contract(impl = TokenInterface)] o implementa la lógica REAL de storage."
+            ),
+            "mostly_empty": (
+                "❌ [ANTIPATRÓN #1: Implementación Proxy Inútil] "
+                "Tu implementación de TokenInterface solo delega sin agregar lógica. "
+                "Esto NO funciona - debes implementar la lógica REAL de balances, storage, etc. "
+                "SOLUCIÓN: Usa soroban_token_sdk correctamente o implementa toda la lógica desde cero."
+            ),
+        },
+        check=_check_proxy_implementation
+    ),
+    Rule(
+        "token_client_usage", "warning",
+        "⚠️  [ANTIPATRÓN #1] Uso de token::Client detectado. "
+        "Verifica que NO estés llamando al propio contrato (self-client antipattern).",
+        check=_check_client_usage
+    ),
+    # ANTIPATRÓN 2: Zombie Storage (Ignorar TTL)
+    Rule(
+        "zombie_storage", "error",
+        "❌ [ANTIPATRÓN #2: Zombie Storage] Detectado storage.set() sin extend_ttl(). "
+        "Los datos pueden expirar y ser archivados. "
+        "SOLUCIÓN: Siempre llama a extend_ttl() después de set() para Persistent/Temporary storage.",
+        function_check=_check_zombie_set,
+        first_only=True  # Solo reportar una vez
+    ),
+    Rule(
+        "persistent_get_without_ttl", "warning",
+        "⚠️  [ANTIPATRÓN #2] Detectado persistent().get() sin extend_ttl(). "
+        "Considera extender el TTL al leer datos críticos.",
+        function_check=_check_persistent_get,
+        first_only=True  # Solo reportar una vez
+    ),
+    # ANTIPATRÓN 3: Fake Auth (Verificación Manual)
+    Rule(
+        "fake_auth_comparison", "error",
+        "❌ [ANTIPATRÓN #3: Fake Auth] Detectada comparación manual de Address sin require_auth(). "
+        "Esto NO verifica criptográficamente la identidad. "
+        "SOLUCIÓN: Usa address.require_auth() para verificar firmas.",
+        check=_check_fake_auth_comparison
+    ),
+    Rule(
+        "missing_require_auth", "error",
+        "❌ [ANTIPATRÓN #3: Fake Auth] "
+        "La función '{op}' modifica estado pero no usa require_auth(). "
+        "Cualquiera puede llamar esta función. SOLUCIÓN: Agrega address.require_auth() al inicio.",
+        check=_check_missing_require_auth
+    ),
+    # ANTIPATRÓN 4: Panic por Todo
+    Rule(
+        "panic_everything", "error",
+        "❌ [ANTIPATRÓN #4: Panic por Todo] Detectados {panic_count} usos de panic!() sin manejo de errores. "
+        "Los clientes reciben errores genéricos sin saber qué falló. "
+        "SOLUCIÓN: Define un enum con #[contracterror] y retorna Result<T, Error>.",
+        check=_check_panic_everything
+    ),
+    Rule(
+        "panic_for_validation", "warning",
+        "⚠️  [ANTIPATRÓN #4] Detectado panic!() para '{error_type}'. "
+        "Considera usar #[contracterror] con códigos de error específicos.",
+        check=_check_common_panics
+    ),
+    # ANTIPATRÓN 5: Initialización Abierta (Front-Running)
+    Rule(
+        "init_delegation", "warning",
+        "⚠️  [ANTIPATRÓN #5] La función {name}() delega a TokenInterface::initialize "
+        "sin verificación previa. Asegúrate de que TokenInterface maneje la protección contra front-running.",
+        function_check=_check_init_delegation,
+        functions=_init_functions
+    ),
+    Rule(
+        "open_initialize", "error",
+        "❌ [ANTIPATRÓN #5: Initialización Abierta] {name}() escribe datos sin verificar que no fue inicializado. "
+        "Un atacante puede front-run tu transacción. "
+        "SOLUCIÓN: Verifica storage.has(&key) antes de set().",
+        function_check=_check_open_initialize,
+        functions=_init_functions
+    ),
+    Rule(
+        "init_without_auth", "warning",
+        "⚠️  [ANTIPATRÓN #5] {name}() no usa require_auth(). "
+        "Considera requerir autorización del deployer o admin.",
+        function_check=_check_init_without_auth,
+        functions=_init_functions
+    ),
     # ANTIPATRÓN 6: Cálculo Pesado antes de Auth (Gas Griefing)
-    # Detectar funciones donde require_auth está muy abajo
-    functions_with_auth = re.findall(
-        r'(fn\s+\w+\s*\([^)]*Address[^{]*\{(?:[^}]|\n){50,}?require_auth)',
-        code,
-        re.DOTALL
-    )
-    
-    for func in functions_with_auth:
-        # Contar líneas antes de require_auth
-        lines_before_auth = func[:func.index('require_auth')].count('\n')
-        
-        if lines_before_auth > 5:
-            warnings.append(
-                f"⚠️  [ANTIPATRÓN #6: Gas Griefing] require_auth() está muy abajo en la función (~{lines_before_auth} líneas). "
-                "Ejecutar lógica costosa antes de verificar autorización desperdicia recursos. "
-                "SOLUCIÓN: Mueve require_auth() al INICIO de la función (fail fast)."
-            )
-            break
-    
-    # Verificar si implementa TokenInterface
-    implements_token_interface = bool(re.search(r'impl\s+TokenInterface', code))
-    
-    if implements_token_interface:
-        # CASO A: Token usando TokenInterface - Validación ESTRICTA adicional
-        
-        # Error: Funciones helper custom de balances
-        custom_balance_functions = [
-            'spend_balance', 'receive_balance', 'get_balance', 
-            'set_balance', 'add_balance', 'subtract_balance',
-            'read_balance', 'write_balance'
-        ]
-        
-        for func in custom_balance_functions:
-            if re.search(rf'\bfn\s+{func}\b', code):
-                errors.append(
-                    f"❌ [CASO A] Detectada función custom '{func}'. "
-                    f"TokenInterface maneja balances internamente. "
-                    f"NO debes implementar funciones de balance personalizadas."
-                )
-        
-        # Error: Storage manual de balances
-        if re.search(r'DataKey::Balance\(', code):
-            errors.append(
-                "❌ [CASO A] Detectado storage manual de balances (DataKey::Balance). "
-                "TokenInterface gestiona el storage internamente. "
-                "NO debes acceder directamente al storage de balances."
-            )
-        
-        # Error: Uso de Symbol en vez de String
-        if re.search(r'fn\s+initialize\([^)]*name:\s*Symbol', code):
-            errors.append(
-                "❌ [CASO A] Detectado uso de 'Symbol' para 'name' en initialize(). "
-                "DEBE usar 'String' según TokenInterface. "
-                "Cambiar: name: Symbol → name: String"
-            )
-        
-        if re.search(r'fn\s+initialize\([^)]*symbol:\s*Symbol', code):
-            errors.append(
-                "❌ [CASO A] Detectado uso de 'Symbol' para 'symbol' en initialize(). "
-                "DEBE usar 'String' según TokenInterface. "
-                "Cambiar: symbol: Symbol → symbol: String"
-            )
-    
-    else:
-        # CASO B: Token Custom sin TokenInterface - Validación FLEXIBLE
-        
-        # Info: Es un token custom
-        if 'token' in code.lower() or 'balance' in code.lower():
-            warnings.append(
-                "ℹ️  [CASO B] Token custom sin TokenInterface detectado. "
-                "Asegúrate de que esta complejidad es necesaria. "
-                "Para tokens estándar, considera usar TokenInterface."
-            )
-    
+    Rule(
+        "gas_griefing", "warning",
+        "⚠️  [ANTIPATRÓN #6: Gas Griefing] require_auth() está muy abajo en la función (~{lines} líneas). "
+        "Ejecutar lógica costosa antes de verificar autorización desperdicia recursos. "
+        "SOLUCIÓN: Mueve require_auth() al INICIO de la función (fail fast).",
+        function_check=_check_gas_griefing,
+        first_only=True  # Solo reportar una vez
+    ),
+    # CASO A: Token usando TokenInterface - Validación ESTRICTA adicional
+    Rule(
+        "custom_balance_function", "error",
+        "❌ [CASO A] Detectada función custom '{func}'. "
+        "TokenInterface maneja balances internamente. "
+        "NO debes implementar funciones de balance personalizadas.",
+        check=_check_custom_balance_functions,
+        when=_implements_token_interface
+    ),
+    Rule(
+        "manual_balance_storage", "error",
+        "❌ [CASO A] Detectado storage manual de balances (DataKey::Balance). "
+        "TokenInterface gestiona el storage internamente. "
+        "NO debes acceder directamente al storage de balances.",
+        pattern=re.compile(r'DataKey::Balance\('),
+        when=_implements_token_interface
+    ),
+    Rule(
+        "symbol_name", "error",
+        "❌ [CASO A] Detectado uso de 'Symbol' para 'name' en initialize(). "
+        "DEBE usar 'String' según TokenInterface. "
+        "Cambiar: name: Symbol → name: String",
+        check=_symbol_param_check('name'),
+        when=_implements_token_interface
+    ),
+    Rule(
+        "symbol_symbol", "error",
+        "❌ [CASO A] Detectado uso de 'Symbol' para 'symbol' en initialize(). "
+        "DEBE usar 'String' según TokenInterface. "
+        "Cambiar: symbol: Symbol → symbol: String",
+        check=_symbol_param_check('symbol'),
+        when=_implements_token_interface
+    ),
+    # CASO B: Token Custom sin TokenInterface - Validación FLEXIBLE
+    Rule(
+        "custom_token", "warning",
+        "ℹ️  [CASO B] Token custom sin TokenInterface detectado. "
+        "Asegúrate de que esta complejidad es necesaria. "
+        "Para tokens estándar, considera usar TokenInterface.",
+        check=lambda analysis: [{}],
+        when=_is_custom_token
+    ),
     # Validaciones generales adicionales
-    
-    # Warning: Falta #![no_std]
-    if '#![no_std]' not in code and 'contract' in code.lower():
-        warnings.append(
-            "⚠️  Falta directiva '#![no_std]' al inicio. "
-            "Los contratos Soroban deben ser no_std."
+    Rule(
+        "missing_no_std", "warning",
+        "⚠️  Falta directiva '#![no_std]' al inicio. "
+        "Los contratos Soroban deben ser no_std.",
+        check=lambda analysis: [{}],
+        when=lambda analysis: not analysis.source.has_inner_attribute('no_std') and 'contract' in analysis.lower
+    ),
+]
+
+
+GENERAL_RULES: List[Rule] = [
+    # Check básico: sintaxis de contrato
+    Rule(
+        "missing_contract_attribute", "error",
+        "❌ Falta anotación #[contract] en la estructura del contrato.",
+        check=lambda analysis: [{}],
+        when=lambda analysis: not analysis.has_attribute('struct', 'contract') and 'pub struct' in analysis.text
+    ),
+    Rule(
+        "missing_contractimpl_attribute", "error",
+        "❌ Falta anotación #[contractimpl] en la implementación.",
+        check=lambda analysis: [{}],
+        when=lambda analysis: (
+            not analysis.has_attribute('impl', 'contractimpl') and bool(analysis.source.impls) and 'contract' in analysis.lower
         )
-    
-    is_valid = len(errors) == 0
-    
-    return CodeValidationResult(is_valid, errors, warnings)
+    ),
+    # Warnings sobre mejores prácticas
+    Rule(
+        "sensitive_without_auth", "warning",
+        "⚠️  No se detectó uso de require_auth() en operaciones sensibles. "
+        "Verifica la seguridad del contrato.",
+        check=lambda analysis: [{}],
+        when=lambda analysis: 'require_auth' not in analysis.text and ('transfer' in analysis.lower or 'spend' in analysis.lower)
+    ),
+]
+
+
+def _too_large(code: str, max_chars: Optional[int]) -> Optional[CodeValidationResult]:
+    """Resultado sin validar (solo una advertencia) si el código supera `max_chars`."""
+    if max_chars is None or len(code) <= max_chars:
+        return None
+    VALIDATIONS_INCOMPLETE.inc(reason="too_large")
+    finding = Finding(
+        "validation_skipped", "warning",
+        _TOO_LARGE_MESSAGE.format(chars=len(code), max_chars=max_chars)
+    )
+    return CodeValidationResult(False, [], [finding.message], [finding], skipped=["*"])
+
+
+def validate_token_contract(
+    code: str,
+    analysis: Optional[CodeAnalysis] = None,
+    time_budget: Optional[float] = _DEFAULT_TIME_BUDGET,
+    max_chars: Optional[int] = VALIDATOR_MAX_CODE_CHARS
+) -> CodeValidationResult:
+    """
+    Valida que un contrato de token siga las reglas correctas.
+
+    Detecta TODOS los antipatrones del documento examples_token_antipattern.md:
+    1. Self-Client (Recursión Innecesaria)
+    2. Zombie Storage (Ignorar TTL)
+    3. Fake Auth (Verificación Manual)
+    4. Panic por Todo
+    5. Initialización Abierta (Front-Running)
+    6. Cálculo Pesado antes de Auth (Gas Griefing)
 
+    Soporta dos casos:
+    - Caso A: Token usando TokenInterface (validación estricta)
+    - Caso B: Token custom sin TokenInterface (validación flexible)
 
-def validate_soroban_code(code: str, contract_type: Optional[str] = None) -> CodeValidationResult:
+    `time_budget` y `max_chars` limitan el costo (None = sin límite).
+    """
+    started = time.perf_counter()
+    too_large = _too_large(code, max_chars)
+    if too_large is not None:
+        return too_large
+    return run_rules(TOKEN_RULES, analysis or CodeAnalysis(code), time_budget, started)
+
+
+def validate_soroban_code(
+    code: str,
+    contract_type: Optional[str] = None,
+    time_budget: Optional[float] = _DEFAULT_TIME_BUDGET,
+    max_chars: Optional[int] = VALIDATOR_MAX_CODE_CHARS
+) -> CodeValidationResult:
     """
     Validación general de código Soroban.
-    
+
     Args:
         code: Código Rust a validar
         contract_type: Tipo de contrato ("token", "nft", "custom", etc.)
+        time_budget: Segundos para parsear y evaluar las reglas; las que no
+            alcanzan a evaluarse se omiten (None = sin límite)
+        max_chars: Tamaño máximo del código a validar (None = sin límite)
     """
-    
+    started = time.perf_counter()
+    too_large = _too_large(code, max_chars)
+    if too_large is not None:
+        return too_large
+    return _run_for_contract_type(CodeAnalysis(code), contract_type, time_budget, started)
+
+
+# Resultados de checks por función compartidos entre validaciones incrementales
+function_check_cache = FunctionCheckCache(VALIDATOR_FUNCTION_CACHE_SIZE)
+
+
+def validate_incremental(
+    code: str,
+    contract_type: Optional[str] = None,
+    time_budget: Optional[float] = _DEFAULT_TIME_BUDGET,
+    max_chars: Optional[int] = VALIDATOR_MAX_CODE_CHARS
+) -> CodeValidationResult:
+    """
+    Igual que `validate_soroban_code`, pensado para validar el mismo código
+    tras cada edición: solo se re-parsean los items que cambiaron y las
+    reglas por función reutilizan los resultados de las funciones sin
+    cambios. Las cachés viven en el proceso que llama.
+    """
+    started = time.perf_counter()
+    too_large = _too_large(code, max_chars)
+    if too_large is not None:
+        return too_large
+    analysis = CodeAnalysis(code, parse_incremental(code), function_check_cache)
+    try:
+        return _run_for_contract_type(analysis, contract_type, time_budget, started)
+    finally:
+        function_check_cache.flush_metrics()
+
+
+def _run_for_contract_type(
+    analysis: CodeAnalysis,
+    contract_type: Optional[str],
+    time_budget: Optional[float],
+    started: float
+) -> CodeValidationResult:
     # Detectar automáticamente si es un token
     if contract_type is None:
-        if 'TokenInterface' in code or 'token' in code.lower():
+        if 'TokenInterface' in analysis.code or 'token' in analysis.lower:
             contract_type = "token"
-    
+
     # Validación específica por tipo
     if contract_type == "token":
-        return validate_token_contract(code)
-    
+        return run_rules(TOKEN_RULES, analysis, time_budget, started)
+
     # Validación general para otros contratos
-    errors = []
-    warnings = []
-    
-    # Check básico: sintaxis de contrato
-    if '#[contract]' not in code and 'pub struct' in code:
-        errors.append(
-            "❌ Falta anotación #[contract] en la estructura del contrato."
-        )
-    
-    if '#[contractimpl]' not in code and 'impl' in code and 'contract' in code.lower():
-        errors.append(
-            "❌ Falta anotación #[contractimpl] en la implementación."
-        )
-    
-    # Warnings sobre mejores prácticas
-    if 'require_auth' not in code and ('transfer' in code.lower() or 'spend' in code.lower()):
-        warnings.append(
-            "⚠️  No se detectó uso de require_auth() en operaciones sensibles. "
-            "Verifica la seguridad del contrato."
-        )
-    
-    is_valid = len(errors) == 0
-    
-    return CodeValidationResult(is_valid, errors, warnings)
+    return run_rules(GENERAL_RULES, analysis, time_budget, started)
 
 
 def format_validation_message(result: CodeValidationResult) -> str:
@@ -0,0 +1,158 @@
+"""
+Warm-up del proceso de la API.
+
+El lifespan de app.main lanza `warmup.run` en un hilo apenas arranca el
+servidor; /health responde desde el principio (el proceso está vivo) y
+/ready recién cuando el warm-up terminó, así el balanceador no manda tráfico
+a una instancia que todavía pagaría en el primer request el handshake TLS,
+la carga del modelo de embeddings o el arranque de los workers.
+
+Fases, en orden (cada una se loguea con su duración):
+
+- supabase: abre la conexión HTTP/2 a PostgREST y lee la versión activa del índice
+- upstream: abre la conexión TLS a la API compatible con OpenAI (LLM)
+- embeddings: crea el proveedor (carga el modelo ONNX si es local), embebe un texto
+  y verifica que la dimensión sea la del esquema (EMBEDDING_DIMENSIONS)
+- canonical: precarga los archivos canónicos del rerank (canonical_cache)
+- validation_pool: arranca los workers del pool de /validate
+
+Las fases marcadas como requeridas (supabase, embeddings) se reintentan cada
+STARTUP_RETRY_INTERVAL segundos hasta que pasan: sin ellas ningún request
+puede responder, así que la instancia no se declara lista. Las demás solo
+adelantan trabajo; si fallan se registra el error y el request que lo
+necesite lo hará como siempre.
+"""
+
+from app.config import OPENROUTER_BASE_URL, INDEX_VERSIONING
+from app.log import get_logger
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
+import time
+
+logger = get_logger(__name__)
+
+STARTUP_RETRY_INTERVAL = 5.0
+
+
+def _warm_supabase() -> Dict[str, Any]:
+    from app.db import supabase
+    from app.rag.index_versions import active_index_version
+
+    if INDEX_VERSIONING:
+        return {"index_version": active_index_version(refresh=True)}
+    supabase.table("soroban_chunks").select("id_chunk").limit(1).execute()
+    return {}
+
+
+def _warm_upstream() -> Dict[str, Any]:
+    from app.clients import upstream_http_client
+
+    # Cualquier respuesta sirve: lo que interesa es la conexión abierta en el pool
+    response = upstream_http_client().head(OPENROUTER_BASE_URL, timeout=10.0)
+    return {"status_code": response.status_code}
+
+
+def _warm_embeddings() -> Dict[str, Any]:
+    from app.embeddings import check_dimensions, get_provider
+
+    provider = get_provider()
+    return {"model": provider.model_id, "dimensions": check_dimensions(provider)}
+
+
+def _warm_canonical() -> Dict[str, Any]:
+    from app.rag.index_versions import active_index_version
+    from app.rag.retrieve import CANONICAL_FILES, fetch_canonical
+
+    index_version = active_index_version()
+    return {"chunks": {name: len(fetch_canonical(name, index_version=index_version)) for name in CANONICAL_FILES}}
+
+
+def _warm_validation_pool() -> Dict[str, Any]:
+    from app.rag.validation import warm_pool
+
+    return {"workers": warm_pool()}
+
+
+# (nombre, función, requerida)
+PHASES: List[Tuple[str, Callable[[], Dict[str, Any]], bool]] = [
+    ("supabase", _warm_supabase, True),
+    ("upstream", _warm_upstream, False),
+    ("embeddings", _warm_embeddings, True),
+    ("canonical", _warm_canonical, False),
+    ("validation_pool", _warm_validation_pool, False),
+]
+
+
+class Warmup:
+    """Estado del arranque: duración y resultado por fase, y si la instancia está lista."""
+    def __init__(self, phases=PHASES):
+        self.phases = phases
+        self.timings: Dict[str, float] = {}
+        self.details: Dict[str, Dict[str, Any]] = {}
+        self.errors: Dict[str, str] = {}
+        self.started_at = time.perf_counter()
+        self.total: Optional[float] = None
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def record(self, phase: str, seconds: float, **details):
+        self.timings[phase] = round(seconds, 3)
+        if details:
+            self.details[phase] = details
+        logger.info("fase de arranque", extra={"phase": phase, "seconds": round(seconds, 3), **details})
+
+    def _run_phase(self, name: str, func: Callable[[], Dict[str, Any]]) -> bool:
+        started = time.perf_counter()
+        try:
+            details = func() or {}
+        except Exception as e:
+            self.errors[name] = str(e) or type(e).__name__
+            logger.warning("fase de arranque fallida", extra={
+                "phase": name, "seconds": round(time.perf_counter() - started, 3), "error": self.errors[name]
+            })
+            return False
+        self.errors.pop(name, None)
+        self.record(name, time.perf_counter() - started, **details)
+        return True
+
+    def run(self):
+        """Corre las fases en orden y marca la instancia como lista."""
+        pending, optional = [], []
+        for name, func, required in self.phases:
+            if not self._run_phase(name, func):
+                (pending if required else optional).append((name, func))
+        if pending:
+            while pending and not self._stopped.wait(STARTUP_RETRY_INTERVAL):
+                pending = [(name, func) for name, func in pending if not self._run_phase(name, func)]
+            # Las opcionales suelen fallar por la misma causa: un intento más
+            for name, func in optional:
+                if not self._stopped.is_set():
+                    self._run_phase(name, func)
+        if self._stopped.is_set():
+            return
+        self.mark_ready()
+
+    def mark_ready(self):
+        self.total = round(time.perf_counter() - self.started_at, 3)
+        self._ready.set()
+        logger.info("arranque completo", extra={"seconds": self.total, "phases": self.timings, "errors": self.errors})
+
+    def stop(self):
+        """Corta los reintentos de un warm-up en curso (shutdown)."""
+        self._stopped.set()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "status": "ready" if self.ready else "starting",
+            "startup_s": self.total,
+            "phases": dict(self.timings),
+            "details": dict(self.details),
+            "errors": dict(self.errors),
+        }
+
+
+warmup = Warmup()
@@ -0,0 +1,16 @@
+"""
+Benchmarks de componentes de la API.
+
+- `benchmarks.validator_corpus`: entradas para el validador (contratos
+  reales de data/docs, muestras de antipatrones, contratos grandes
+  generados y entradas patológicas).
+- `benchmarks.validator`: mide `validate_soroban_code` por entrada y por
+  regla, con un límite de tiempo duro por entrada.
+- `benchmarks.retrieval`: recall de la búsqueda vectorial con vectores
+  reducidos (dimensiones truncadas, float16/int8) con y sin rescoring.
+
+Uso típico (desde server/):
+
+    python -m benchmarks.validator --repeat 5 --limit 1.0
+    python -m benchmarks.retrieval --k 5 --dimensions 256 512 768
+"""
@@ -0,0 +1,161 @@
+"""
+Benchmark de la búsqueda vectorial con vectores reducidos.
+
+Embebe los chunks de data/docs (el mismo chunking que la ingesta) y una
+consulta por encabezado de la documentación con el proveedor configurado
+(EMBEDDING_PROVIDER), y compara en memoria cada configuración de primera
+etapa contra la búsqueda exacta con el vector completo:
+
+- dimensiones: los primeros N valores renormalizados (como la columna
+  embedding_search, ver sql/search_embedding.sql)
+- precisión: float16 (halfvec) o int8 (escala simétrica por vector)
+
+Por configuración se reporta el recall@k de la primera etapa sola y después
+de reordenar `factor × k` candidatos con el vector completo, y los bytes por
+vector.
+
+    python -m benchmarks.retrieval --k 5 --dimensions 256 512 768 --factor 4
+    python -m benchmarks.retrieval --cache /tmp/embeddings.json --json out.json
+
+Los embeddings se pueden guardar con `--cache` para no recalcularlos.
+"""
+
+from app.embeddings import get_provider
+from app.rag.chunking import chunk_markdown
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import numpy as np
+import time
+
+DOCS_PATH = Path(__file__).resolve().parent.parent / "data" / "docs"
+
+_BYTES = {"float16": 2, "int8": 1}
+
+
+def load_texts() -> Tuple[List[str], List[str]]:
+    """(chunks, consultas): las consultas son los encabezados únicos de la documentación."""
+    chunks: List[str] = []
+    queries: List[str] = []
+    for path in sorted(DOCS_PATH.glob("*/*.md")):
+        for text, headings in chunk_markdown(path.read_text(encoding="utf-8")):
+            chunks.append(text)
+            if headings and headings[-1] not in queries:
+                queries.append(headings[-1])
+    return chunks, queries
+
+
+def embed_all(texts: List[str], cache: Optional[Path]) -> np.ndarray:
+    provider = get_provider()
+    cached = json.loads(cache.read_text(encoding="utf-8")) if cache and cache.exists() else {}
+    if cached.get("model") != provider.model_id:
+        cached = {"model": provider.model_id, "vectors": {}}
+    missing = [text for text in dict.fromkeys(texts) if text not in cached["vectors"]]
+    for start in range(0, len(missing), 64):
+        batch = missing[start:start + 64]
+        cached["vectors"].update(zip(batch, provider.embed(batch)))
+    if cache and missing:
+        cache.write_text(json.dumps(cached), encoding="utf-8")
+    return np.array([cached["vectors"][text] for text in texts], dtype=np.float32)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def reduce(vectors: np.ndarray, dimensions: int, precision: str) -> np.ndarray:
+    """Vectores de primera etapa, devueltos en float32 para puntuar con coseno."""
+    head = _normalize(vectors[:, :dimensions])
+    if precision == "float16":
+        return head.astype(np.float16).astype(np.float32)
+    scale = np.clip(np.abs(head).max(axis=1, keepdims=True), 1e-12, None) / 127
+    return _normalize(np.round(head / scale).astype(np.int8).astype(np.float32))
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Índices de los k mayores puntajes por fila, en orden descendente."""
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+
+def _recall(found: np.ndarray, expected: np.ndarray) -> float:
+    hits = sum(len(set(row) & set(truth)) for row, truth in zip(found.tolist(), expected.tolist()))
+    return hits / expected.size
+
+
+def run_benchmark(
+    chunks: np.ndarray,
+    queries: np.ndarray,
+    k: int = 5,
+    dimensions: Optional[List[int]] = None,
+    factor: int = 4
+) -> List[Dict[str, object]]:
+    chunks = _normalize(chunks)
+    queries = _normalize(queries)
+    full = chunks.shape[1]
+    exact = _top(queries @ chunks.T, k)
+    rows: List[Dict[str, object]] = [{
+        "dimensions": full, "precision": "float32", "bytes": full * 4,
+        "recall": 1.0, "recall_rescored": 1.0, "search_ms": None,
+    }]
+    for size in sorted(d for d in (dimensions or [256, 512, 768]) if d < full):
+        for precision in ("float16", "int8"):
+            stage_chunks = reduce(chunks, size, precision)
+            stage_queries = reduce(queries, size, precision)
+            started = time.perf_counter()
+            candidates = _top(stage_queries @ stage_chunks.T, k * factor)
+            elapsed = (time.perf_counter() - started) / len(queries)
+            rescored = np.take_along_axis(
+                candidates,
+                _top(np.einsum("qd,qcd->qc", queries, chunks[candidates]), k),
+                axis=1
+            )
+            rows.append({
+                "dimensions": size,
+                "precision": precision,
+                "bytes": size * _BYTES[precision],
+                "recall": _recall(candidates[:, :k], exact),
+                "recall_rescored": _recall(rescored, exact),
+                "search_ms": elapsed * 1000,
+            })
+    return rows
+
+
+def format_report(rows: List[Dict[str, object]], k: int, factor: int, model: str, counts: Tuple[int, int]) -> str:
+    lines = [
+        f"modelo {model}: {counts[0]} chunks, {counts[1]} consultas, recall@{k} contra float32 completo",
+        "",
+        f"{'dims':>6} {'precisión':<9} {'bytes':>7} {'recall':>8} {f'+rescoring ×{factor}':>15} {'ms/consulta':>12}",
+    ]
+    for row in rows:
+        search = "-" if row["search_ms"] is None else f"{row['search_ms']:.3f}"
+        lines.append(
+            f"{row['dimensions']:>6} {row['precision']:<9} {row['bytes']:>7} {row['recall']:>8.3f} "
+            f"{row['recall_rescored']:>15.3f} {search:>12}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall de la búsqueda con vectores reducidos y rescoring")
+    parser.add_argument("--k", type=int, default=5, help="Chunks por consulta")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[256, 512, 768], help="Dimensiones de primera etapa")
+    parser.add_argument("--factor", type=int, default=4, help="Candidatos por chunk pedido que se reordenan")
+    parser.add_argument("--cache", type=Path, help="Archivo JSON donde guardar/reusar los embeddings")
+    parser.add_argument("--json", dest="json_output", help="Escribir los resultados en este archivo JSON")
+    args = parser.parse_args()
+
+    chunk_texts, query_texts = load_texts()
+    chunks = embed_all(chunk_texts, args.cache)
+    queries = embed_all(query_texts, args.cache)
+    rows = run_benchmark(chunks, queries, args.k, args.dimensions, args.factor)
+    print(format_report(rows, args.k, args.factor, get_provider().model_id, (len(chunk_texts), len(query_texts))))
+    if args.json_output:
+        Path(args.json_output).write_text(json.dumps(rows, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
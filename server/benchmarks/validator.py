@@ -0,0 +1,154 @@
+"""
+Benchmark del validador de código (`validate_soroban_code`).
+
+Cada entrada del corpus (ver benchmarks.validator_corpus) se valida
+`--repeat` veces en un proceso hijo, sin caché de parseo y sin los límites
+de producción (VALIDATOR_TIME_BUDGET, VALIDATOR_MAX_CODE_CHARS), para medir
+el costo real del motor.
+Se reporta el tiempo total y el de parseo por entrada y el costo acumulado
+de cada regla. Una entrada falla si alguna validación supera `--limit`
+segundos; si el proceso hijo no termina a tiempo se mata y se reporta
+como timeout.
+
+    python -m benchmarks.validator --repeat 5 --limit 1.0
+    python -m benchmarks.validator --category pathological --json out.json
+
+Sale con código 1 si alguna entrada falla.
+"""
+
+from benchmarks.validator_corpus import all_cases
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import json
+import multiprocessing
+import statistics
+import sys
+import time
+
+
+def _measure(code: str, repeat: int, connection):
+    """Proceso hijo: valida `repeat` veces y envía los tiempos por el pipe."""
+    from app.rag.rust_parser import parse
+    from app.rag.validators import validate_soroban_code
+
+    try:
+        totals = []
+        rules: Dict[str, float] = {}
+        summary = None
+        for _ in range(repeat):
+            parse.cache_clear()
+            started = time.perf_counter()
+            result = validate_soroban_code(code, time_budget=None, max_chars=None)
+            totals.append(time.perf_counter() - started)
+            for rule, elapsed in result.timings.items():
+                rules[rule] = rules.get(rule, 0.0) + elapsed
+            summary = {"errors": len(result.errors), "warnings": len(result.warnings)}
+        rule_total = sum(rules.values()) / repeat
+        connection.send({
+            "status": "ok",
+            "totals": totals,
+            "parse_s": max(0.0, statistics.median(totals) - rule_total),
+            "rules": {rule: elapsed / repeat for rule, elapsed in rules.items()},
+            "result": summary,
+        })
+    except Exception as e:
+        connection.send({"status": "error", "error": f"{type(e).__name__}: {e}"})
+    finally:
+        connection.close()
+
+
+def run_case(code: str, repeat: int, limit: float) -> Dict[str, object]:
+    """Mide una entrada en un proceso hijo con un límite de tiempo duro."""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_measure, args=(code, repeat, sender), daemon=True)
+    process.start()
+    sender.close()
+    # Tiempo para importar la app en el hijo más `repeat` validaciones al límite
+    hard_limit = 5.0 + limit * repeat
+    if receiver.poll(hard_limit):
+        measurement = receiver.recv()
+    else:
+        process.terminate()
+        measurement = {"status": "timeout", "error": f"sin respuesta en {hard_limit:.1f}s"}
+    process.join(timeout=5)
+    if measurement["status"] == "ok" and max(measurement["totals"]) > limit:
+        measurement["status"] = "slow"
+    return measurement
+
+
+def run_benchmark(
+    repeat: int = 3,
+    limit: float = 1.0,
+    categories: Optional[List[str]] = None,
+    names: Optional[List[str]] = None,
+    size: int = 200_000
+) -> List[Dict[str, object]]:
+    rows = []
+    for category, name, code in all_cases(size):
+        if categories and category not in categories:
+            continue
+        if names and not any(fragment in name for fragment in names):
+            continue
+        measurement = run_case(code, repeat, limit)
+        rows.append(dict(measurement, category=category, name=name, chars=len(code)))
+    return rows
+
+
+def _ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+
+def format_report(rows: List[Dict[str, object]], limit: float, top_rules: int = 10) -> str:
+    lines = [f"{'categoría':<13} {'entrada':<34} {'chars':>8} {'p50 ms':>9} {'max ms':>9} {'parse ms':>9}  estado"]
+    rule_totals: Dict[str, float] = {}
+    rule_worst: Dict[str, tuple] = {}
+    for row in rows:
+        totals = row.get("totals")
+        p50 = statistics.median(totals) if totals else None
+        worst = max(totals) if totals else None
+        status = row["status"] if row["status"] != "ok" else ""
+        if row.get("error"):
+            status = f"{row['status']} ({row['error']})"
+        lines.append(
+            f"{row['category']:<13} {row['name'][:34]:<34} {row['chars']:>8} {_ms(p50):>9} {_ms(worst):>9} "
+            f"{_ms(row.get('parse_s')):>9}  {status}"
+        )
+        for rule, elapsed in (row.get("rules") or {}).items():
+            rule_totals[rule] = rule_totals.get(rule, 0.0) + elapsed
+            if elapsed > rule_worst.get(rule, (0.0, ""))[0]:
+                rule_worst[rule] = (elapsed, row["name"])
+
+    lines.append("")
+    lines.append(f"{'regla':<34} {'total ms':>9} {'peor ms':>9}  peor entrada")
+    for rule, total in sorted(rule_totals.items(), key=lambda item: item[1], reverse=True)[:top_rules]:
+        worst, worst_name = rule_worst[rule]
+        lines.append(f"{rule:<34} {_ms(total):>9} {_ms(worst):>9}  {worst_name}")
+
+    failed = [row for row in rows if row["status"] != "ok"]
+    lines.append("")
+    lines.append(f"{len(rows)} entradas, {len(failed)} fuera del límite de {limit * 1000:.0f} ms")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del validador de código Soroban")
+    parser.add_argument("--repeat", type=int, default=3, help="Validaciones por entrada")
+    parser.add_argument("--limit", type=float, default=1.0, help="Tiempo máximo por validación (segundos)")
+    parser.add_argument("--category", action="append", help="Solo estas categorías (contract, antipattern, generated, pathological)")
+    parser.add_argument("--name", action="append", help="Solo entradas cuyo nombre contiene este texto")
+    parser.add_argument("--size", type=int, default=200_000, help="Tamaño de las entradas patológicas (caracteres)")
+    parser.add_argument("--top-rules", type=int, default=10, help="Reglas a listar en el reporte")
+    parser.add_argument("--json", dest="json_output", help="Escribir los resultados en este archivo JSON")
+    args = parser.parse_args()
+
+    rows = run_benchmark(args.repeat, args.limit, args.category, args.name, args.size)
+    print(format_report(rows, args.limit, args.top_rules))
+    if args.json_output:
+        Path(args.json_output).write_text(json.dumps(rows, indent=2), encoding="utf-8")
+    if any(row["status"] != "ok" for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
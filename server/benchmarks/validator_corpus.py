@@ -0,0 +1,147 @@
+"""
+Corpus de entradas para el benchmark del validador.
+
+Cada caso es (categoría, nombre, código). Las categorías son:
+
+    contract      contratos reales de data/docs/*/examples_token_contract.md
+    antipattern   muestras de data/docs/*/examples_token_antipattern.md
+    generated     contratos y respuestas de LLM grandes (hasta ~200 KB)
+    pathological  llaves sin balancear, literales sin cerrar y entradas
+                  pensadas para provocar backtracking en las expresiones
+"""
+
+from pathlib import Path
+from typing import List, Tuple
+import random
+import re
+
+
+DOCS_PATH = Path(__file__).resolve().parent.parent / "data" / "docs"
+
+_RUST_BLOCK = re.compile(r"```rust\n(.*?)```", re.DOTALL)
+
+Case = Tuple[str, str, str]
+
+
+def _doc_blocks(pattern: str) -> List[Tuple[str, str]]:
+    """Bloques ```rust de los documentos que coinciden con el patrón."""
+    blocks = []
+    for path in sorted(DOCS_PATH.glob(pattern)):
+        for index, block in enumerate(_RUST_BLOCK.findall(path.read_text(encoding="utf-8"))):
+            blocks.append((f"{path.parent.name}/{path.stem}#{index}", block))
+    return blocks
+
+
+def doc_cases() -> List[Case]:
+    cases = [("contract", name, code) for name, code in _doc_blocks("*/examples_token_contract.md")]
+    cases += [("antipattern", name, code) for name, code in _doc_blocks("*/examples_token_antipattern.md")]
+    return cases
+
+
+_FUNCTION_TEMPLATES = (
+    """    pub fn transfer_{n}(env: Env, from: Address, to: Address, amount: i128) {{
+        from.require_auth();
+        let key = DataKey::Balance(from.clone());
+        let balance: i128 = env.storage().persistent().get(&key).unwrap_or(0);
+        if balance < amount {{
+            panic!("insufficient balance");
+        }}
+        env.storage().persistent().set(&key, &(balance - amount));
+        env.storage().persistent().extend_ttl(&key, 100, 100);
+    }}
+""",
+    """    pub fn counter_{n}(env: Env) -> u32 {{
+        // Contador sin extend_ttl: dispara Zombie Storage
+        let mut count: u32 = env.storage().instance().get(&COUNTER).unwrap_or(0);
+        count += 1;
+        env.storage().instance().set(&COUNTER, &count);
+        count
+    }}
+""",
+    """    pub fn late_auth_{n}(env: Env, user: Address, values: Vec<i128>) -> i128 {{
+        let mut total = 0;
+        for value in values.iter() {{
+            total += value;
+        }}
+        let label = "}} {{ fn fake() {{";
+        let brace = '{{';
+        let _ = (label, brace);
+        user.require_auth();
+        total
+    }}
+""",
+)
+
+
+def generated_contract(target_chars: int, seed: int = 0) -> str:
+    """Contrato sintético con funciones de plantilla hasta ~target_chars."""
+    rng = random.Random(seed)
+    parts = [
+        "#![no_std]\n",
+        "use soroban_sdk::{contract, contractimpl, contracttype, symbol_short, Address, Env, Symbol, Vec};\n\n",
+        "const COUNTER: Symbol = symbol_short!(\"COUNTER\");\n\n",
+        "#[contracttype]\npub enum DataKey {\n    Balance(Address),\n}\n\n",
+        "#[contract]\npub struct Generated;\n\n#[contractimpl]\nimpl Generated {\n",
+    ]
+    size = sum(len(part) for part in parts)
+    n = 0
+    while size < target_chars:
+        function = rng.choice(_FUNCTION_TEMPLATES).format(n=n)
+        parts.append(function)
+        size += len(function)
+        n += 1
+    parts.append("}\n")
+    return "".join(parts)
+
+
+def generated_answer(target_chars: int, seed: int = 0) -> str:
+    """Respuesta de LLM grande: prosa en markdown intercalada con bloques de código."""
+    rng = random.Random(seed)
+    prose = (
+        "Este contrato usa TokenInterface para la transferencia de balances. "
+        "Recuerda llamar a require_auth() antes de modificar el estado y extender el TTL. "
+    )
+    parts = []
+    size = 0
+    while size < target_chars:
+        chunk = prose * rng.randint(1, 4) + "\n\n```rust\n" + generated_contract(4000, seed=rng.random()) + "```\n\n"
+        parts.append(chunk)
+        size += len(chunk)
+    return "".join(parts)
+
+
+def generated_cases() -> List[Case]:
+    return [
+        ("generated", "contract_20k", generated_contract(20_000)),
+        ("generated", "contract_200k", generated_contract(200_000)),
+        ("generated", "answer_200k", generated_answer(200_000)),
+        ("generated", "docs_contracts_x8", "\n".join(code for _, _, code in doc_cases()) * 8),
+    ]
+
+
+def pathological_cases(size: int = 200_000) -> List[Case]:
+    """Entradas de ~size caracteres que rompen supuestos de estructura o de las expresiones."""
+    def repeat(unit: str) -> str:
+        return unit * max(1, size // len(unit))
+
+    return [
+        ("pathological", "unclosed_fns", repeat("pub fn f(env: Env, a: Address) {\n")),
+        ("pathological", "closing_braces", repeat("}")),
+        ("pathological", "deep_nesting", "fn f() " + "{" * (size // 2) + "}" * (size // 2)),
+        ("pathological", "unterminated_string", "fn f() { let s = \"" + "x" * size),
+        ("pathological", "escaped_quotes", repeat("\"\\")),
+        ("pathological", "lone_apostrophes", repeat("'a ")),
+        ("pathological", "unclosed_block_comments", repeat("/* ")),
+        ("pathological", "single_long_line", "fn f() { " + repeat("let x = 1; ") + "}"),
+        ("pathological", "open_parens", repeat("fn f(")),
+        # Prefijos de las expresiones con `[^)]*` sin paréntesis de cierre
+        ("pathological", "panic_without_close", repeat("panic!(\"x ")),
+        ("pathological", "client_without_close", repeat("token::Client::new(&env, ")),
+        ("pathological", "if_chains", repeat("if aaaaaaaaaaaaaaaaaaaa ")),
+        ("pathological", "storage_calls", "fn f(env: Env) {\n" + repeat("env.storage().persistent().set(&k, &v);\n") + "}"),
+        ("pathological", "many_small_fns", repeat("fn f(e: Env, a: Address) { a.require_auth(); }\n")),
+    ]
+
+
+def all_cases(pathological_size: int = 200_000) -> List[Case]:
+    return doc_cases() + generated_cases() + pathological_cases(pathological_size)
@@ -0,0 +1,15 @@
+"""
+Herramientas de prueba de carga para la API.
+
+- `loadtest.stubs`: servidor local que imita OpenRouter (`/v1/embeddings`,
+  `/v1/chat/completions` con streaming) y PostgREST (`soroban_chunks` y el
+  RPC `match_soroban_chunks`), con latencias configurables.
+- `loadtest.driver`: genera carga contra `/chat` con concurrencia fija y
+  reporta RPS, percentiles de latencia y tasa de errores.
+- `loadtest.run`: levanta los stubs y la app apuntando a ellos y ejecuta el
+  driver, sin gastar créditos ni tocar la base real.
+
+Uso típico (desde server/):
+
+    python -m loadtest.run --concurrency 16 --duration 30
+"""
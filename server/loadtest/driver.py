@@ -0,0 +1,181 @@
+"""
+Generador de carga para `/chat`.
+
+Mantiene `concurrency` requests en vuelo hasta completar `--requests` o
+durante `--duration` segundos, y reporta throughput, percentiles de latencia
+y errores por tipo.
+
+    python -m loadtest.driver --url http://127.0.0.1:8000 --concurrency 16 --duration 30
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import itertools
+import json
+import time
+
+import httpx
+
+
+DEFAULT_QUERIES = [
+    {"query": "¿Qué es el instance storage en Soroban?", "mode": "explain"},
+    {"query": "Explain how require_auth works", "mode": "explain"},
+    {"query": "Crea una función que incremente un contador", "mode": "code"},
+    {"query": "Write a function that transfers tokens between two addresses", "mode": "code"},
+    {"query": "¿Cuál es la diferencia entre persistent y temporary storage?", "mode": "explain"},
+    {"query": "Genera un contrato de token completo", "mode": "code"},
+]
+
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    """Percentil por rango más cercano sobre una lista ordenada."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class LoadResult:
+    """Resultados acumulados de una corrida."""
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.ok_latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self.finished = self.started
+
+    def record(self, latency: float, error: Optional[str]):
+        self.latencies.append(latency)
+        if error is None:
+            self.ok_latencies.append(latency)
+        else:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def summary(self) -> Dict[str, object]:
+        elapsed = max(self.finished - self.started, 1e-9)
+        total = len(self.latencies)
+        ok = sorted(self.ok_latencies)
+        return {
+            "requests": total,
+            "ok": len(ok),
+            "duration_s": round(elapsed, 2),
+            "rps": round(total / elapsed, 2),
+            "ok_rps": round(len(ok) / elapsed, 2),
+            "error_rate": round((total - len(ok)) / total, 4) if total else 0.0,
+            "errors": dict(sorted(self.errors.items())),
+            "latency_s": {
+                "p50": percentile(ok, 50),
+                "p95": percentile(ok, 95),
+                "p99": percentile(ok, 99),
+                "max": ok[-1] if ok else None,
+                "mean": round(sum(ok) / len(ok), 4) if ok else None,
+            },
+        }
+
+
+def format_summary(summary: Dict[str, object]) -> str:
+    latency = summary["latency_s"]
+
+    def fmt(value):
+        return "-" if value is None else f"{value * 1000:.0f} ms"
+
+    lines = [
+        f"requests   {summary['requests']} ({summary['ok']} ok) en {summary['duration_s']}s",
+        f"throughput {summary['rps']} req/s ({summary['ok_rps']} ok/s)",
+        f"latencia   p50 {fmt(latency['p50'])}  p95 {fmt(latency['p95'])}  p99 {fmt(latency['p99'])}  max {fmt(latency['max'])}",
+        f"errores    {summary['error_rate'] * 100:.2f}%",
+    ]
+    for error, count in summary["errors"].items():
+        lines.append(f"  {error}: {count}")
+    return "\n".join(lines)
+
+
+async def run_load(
+    url: str,
+    concurrency: int,
+    requests: Optional[int] = None,
+    duration: Optional[float] = None,
+    queries: Optional[List[Dict]] = None,
+    path: str = "/chat",
+    timeout: float = 200.0,
+    warmup: int = 0
+) -> LoadResult:
+    """
+    Ejecuta la carga con `concurrency` workers.
+
+    Args:
+        url: URL base de la app
+        concurrency: Requests en vuelo simultáneos
+        requests: Total de requests (excluye el warmup); None para usar `duration`
+        duration: Segundos de carga si no se indica `requests`
+        queries: Payloads a enviar en rotación
+        path: Endpoint a probar
+        timeout: Timeout por request
+        warmup: Requests iniciales que no se cuentan
+    """
+    payloads = itertools.cycle(queries or DEFAULT_QUERIES)
+    result = LoadResult()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        for _ in range(warmup):
+            await client.post(path, json=next(payloads))
+
+        result.started = time.perf_counter()
+        stop_at = result.started + duration if duration else None
+        counter = itertools.count()
+
+        async def worker():
+            while True:
+                if requests is not None and next(counter) >= requests:
+                    return
+                if stop_at is not None and time.perf_counter() >= stop_at:
+                    return
+                payload = next(payloads)
+                started = time.perf_counter()
+                error = None
+                try:
+                    response = await client.post(path, json=payload)
+                    if response.status_code >= 400:
+                        error = f"http_{response.status_code}"
+                except httpx.HTTPError as e:
+                    error = type(e).__name__
+                result.record(time.perf_counter() - started, error)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        result.finished = time.perf_counter()
+
+    return result
+
+
+def add_driver_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests en vuelo simultáneos")
+    parser.add_argument("--requests", type=int, help="Total de requests (por defecto se usa --duration)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Duración de la carga en segundos")
+    parser.add_argument("--warmup", type=int, default=0, help="Requests iniciales excluidos del reporte")
+    parser.add_argument("--path", default="/chat", help="Endpoint a probar")
+    parser.add_argument("--queries", help="Archivo JSON con la lista de payloads a enviar")
+    parser.add_argument("--json", dest="json_output", help="Escribir el resumen en este archivo JSON")
+
+
+def load_queries(path: Optional[str]) -> Optional[List[Dict]]:
+    return json.loads(Path(path).read_text(encoding="utf-8")) if path else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de /chat")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="URL base de la app")
+    add_driver_arguments(parser)
+    args = parser.parse_args()
+
+    result = asyncio.run(run_load(
+        args.url, args.concurrency,
+        requests=args.requests, duration=None if args.requests else args.duration,
+        queries=load_queries(args.queries), path=args.path, warmup=args.warmup
+    ))
+    summary = result.summary()
+    print(format_summary(summary))
+    if args.json_output:
+        Path(args.json_output).write_text(json.dumps(summary, indent=2), encoding="utf-8")
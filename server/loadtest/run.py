@@ -0,0 +1,109 @@
+"""
+Prueba de carga de punta a punta con servicios externos simulados.
+
+Levanta los stubs en un hilo, arranca la app (uvicorn en un subproceso)
+apuntando a ellos y ejecuta el driver contra `/chat`.
+
+    python -m loadtest.run --concurrency 16 --duration 30 --ttft lognormal:1.5,0.6
+"""
+
+from loadtest.driver import add_driver_arguments, format_summary, load_queries, run_load
+from loadtest.stubs import add_stub_arguments, create_stub_app, stub_config_from_args
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import uvicorn
+
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+
+
+def start_stubs(app, host: str, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    wait_until_up(f"http://{host}:{port}/_stats")
+    return server
+
+
+def start_app(host: str, port: int, stub_url: str, workers: int, extra_env: dict) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "OPENROUTER_BASE_URL": f"{stub_url}/v1",
+        "OPENROUTER_API_KEY": "stub",
+        "SUPABASE_URL": stub_url,
+        "SUPABASE_SERVICE_KEY": "stub",
+        "LOG_LEVEL": "WARNING",
+    })
+    env.update(extra_env)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", host, "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=SERVER_DIR, env=env
+    )
+    try:
+        wait_until_up(f"http://{host}:{port}/ready", process=process)
+    except Exception:
+        process.terminate()
+        raise
+    return process
+
+
+def wait_until_up(url: str, timeout: float = 30.0, process: subprocess.Popen = None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"El proceso terminó antes de responder en {url}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timeout esperando {url}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de /chat con OpenRouter y Supabase simulados")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--app-port", type=int, default=8800)
+    parser.add_argument("--stub-port", type=int, default=8900)
+    parser.add_argument("--workers", type=int, default=1, help="Workers de uvicorn para la app")
+    parser.add_argument("--env", action="append", default=[], metavar="CLAVE=VALOR",
+                        help="Variables de entorno extra para la app (p.ej. HEDGE_ENABLED=true)")
+    add_stub_arguments(parser)
+    add_driver_arguments(parser)
+    args = parser.parse_args()
+
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    stub_url = f"http://{args.host}:{args.stub_port}"
+
+    stubs = start_stubs(create_stub_app(stub_config_from_args(args)), args.host, args.stub_port)
+    app = start_app(args.host, args.app_port, stub_url, args.workers, extra_env)
+    try:
+        result = asyncio.run(run_load(
+            f"http://{args.host}:{args.app_port}", args.concurrency,
+            requests=args.requests, duration=None if args.requests else args.duration,
+            queries=load_queries(args.queries), path=args.path, warmup=args.warmup
+        ))
+        summary = result.summary()
+        summary["upstream_calls"] = httpx.get(f"{stub_url}/_stats").json()
+        print(format_summary(summary))
+        print("llamadas a upstream:", json.dumps(summary["upstream_calls"]))
+        if args.json_output:
+            Path(args.json_output).write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    finally:
+        app.terminate()
+        app.wait(timeout=10)
+        stubs.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Stubs locales compatibles con OpenAI (OpenRouter) y PostgREST (Supabase).
+
+La app se apunta a ellos con:
+
+    OPENROUTER_BASE_URL=http://127.0.0.1:<puerto>/v1
+    SUPABASE_URL=http://127.0.0.1:<puerto>
+
+Las latencias se describen con distribuciones en texto:
+
+    fixed:0.2            siempre 0.2s
+    uniform:0.1,0.5      uniforme entre 0.1s y 0.5s
+    normal:0.3,0.05      normal (media, desvío), truncada en 0
+    lognormal:0.3,0.5    lognormal con mediana 0.3s y sigma 0.5 (colas largas)
+"""
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+
+
+EMBEDDING_DIMENSIONS = 1536
+
+# Igual que app.rag.retrieve.RERANK_METADATA_FIELDS (los stubs no importan la app)
+RERANK_METADATA_FIELDS = (
+    "file", "section", "topic", "doc_type", "content_type", "has_code",
+    "security_topics", "language_doc", "embedding_model"
+)
+
+DOCS_PATH = Path(__file__).resolve().parent.parent / "data" / "docs"
+
+DEFAULT_ANSWER = """Aquí tienes una implementación mínima de un contador en Soroban.
+
+```rust
+#![no_std]
+use soroban_sdk::{contract, contractimpl, symbol_short, Env, Symbol};
+
+const COUNTER: Symbol = symbol_short!("COUNTER");
+
+#[contract]
+pub struct IncrementContract;
+
+#[contractimpl]
+impl IncrementContract {
+    pub fn increment(env: Env) -> u32 {
+        let mut count: u32 = env.storage().instance().get(&COUNTER).unwrap_or(0);
+        count += 1;
+        env.storage().instance().set(&COUNTER, &count);
+        env.storage().instance().extend_ttl(100, 100);
+        count
+    }
+}
+```
+
+El contador se guarda en instance storage y se extiende su TTL en cada llamada."""
+
+
+def parse_distribution(spec: str) -> Callable[[], float]:
+    """Convierte una especificación de latencia en una función que muestrea segundos."""
+    name, _, raw = spec.partition(":")
+    params = [float(value) for value in raw.split(",") if value.strip()] if raw else []
+    if name == "fixed" and len(params) == 1:
+        return lambda: params[0]
+    if name == "uniform" and len(params) == 2:
+        return lambda: random.uniform(params[0], params[1])
+    if name == "normal" and len(params) == 2:
+        return lambda: max(0.0, random.gauss(params[0], params[1]))
+    if name == "lognormal" and len(params) == 2:
+        mu = math.log(params[0])
+        return lambda: random.lognormvariate(mu, params[1])
+    raise ValueError(f"Distribución inválida: '{spec}'")
+
+
+def load_corpus(chunk_chars: int = 1000) -> List[Dict]:
+    """Chunks sintéticos a partir de data/docs, con la metadata que usa el retrieval."""
+    corpus = []
+    for path in sorted(DOCS_PATH.glob("*/*.md")):
+        language = path.parent.name
+        text = path.read_text(encoding="utf-8")
+        paragraphs = [p for p in re.split(r"\n\s*\n", text) if p.strip()]
+        current = ""
+        for paragraph in paragraphs:
+            if current and len(current) + len(paragraph) > chunk_chars:
+                corpus.append(_chunk_row(len(corpus) + 1, current, path.name, language))
+                current = ""
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current:
+            corpus.append(_chunk_row(len(corpus) + 1, current, path.name, language))
+    if not corpus:
+        corpus = [_chunk_row(i + 1, f"Chunk sintético {i}. " * 40, "synthetic.md", "es") for i in range(50)]
+    return corpus
+
+
+def _chunk_row(id_chunk: int, content: str, file: str, language: str) -> Dict:
+    doc_type = None
+    if file.startswith("examples_token_contract"):
+        doc_type = "complete_contract"
+    elif file.startswith("examples_token_antipattern"):
+        doc_type = "security_guide"
+    elif file.startswith("examples_token"):
+        doc_type = "patterns_guide"
+    metadata = {
+        "file": file,
+        "language_doc": language,
+        "section": file.split("_")[0].removesuffix(".md"),
+        "has_code": "```" in content,
+    }
+    if doc_type:
+        metadata["doc_type"] = doc_type
+    return {"id_chunk": id_chunk, "content": content, "metadata": metadata}
+
+
+class StubConfig:
+    """Parámetros de latencia y errores de los stubs."""
+    def __init__(
+        self,
+        embed_latency: str = "lognormal:0.08,0.4",
+        rpc_latency: str = "lognormal:0.05,0.4",
+        table_latency: str = "fixed:0.02",
+        ttft: str = "lognormal:0.8,0.5",
+        token_interval: str = "fixed:0.004",
+        llm_error_rate: float = 0.0,
+        rpc_error_rate: float = 0.0,
+        answer: str = DEFAULT_ANSWER
+    ):
+        self.embed_latency = parse_distribution(embed_latency)
+        self.rpc_latency = parse_distribution(rpc_latency)
+        self.table_latency = parse_distribution(table_latency)
+        self.ttft = parse_distribution(ttft)
+        self.token_interval = parse_distribution(token_interval)
+        self.llm_error_rate = llm_error_rate
+        self.rpc_error_rate = rpc_error_rate
+        self.answer = answer
+
+
+def _tokens(text: str) -> List[str]:
+    """Parte el texto en piezas de ~4 caracteres, como llegarían en streaming."""
+    return re.findall(r"\s*\S{1,4}|\s+", text)
+
+
+def _error(status: int, message: str) -> JSONResponse:
+    return JSONResponse({"error": {"message": message, "type": "stub_error", "code": status}}, status_code=status)
+
+
+def create_stub_app(config: Optional[StubConfig] = None, corpus: Optional[List[Dict]] = None) -> FastAPI:
+    config = config or StubConfig()
+    corpus = corpus if corpus is not None else load_corpus()
+    vector = [round(random.uniform(-1, 1), 6) for _ in range(EMBEDDING_DIMENSIONS)]
+    stats: Dict[str, int] = {}
+
+    def count(name: str):
+        stats[name] = stats.get(name, 0) + 1
+
+    app = FastAPI(title="SorobAI load-test stubs")
+
+    @app.get("/_stats")
+    def get_stats():
+        return stats
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        count("embeddings")
+        await asyncio.sleep(config.embed_latency())
+        return {
+            "object": "list",
+            "model": body.get("model"),
+            "data": [{"object": "embedding", "index": i, "embedding": vector} for i in range(len(inputs))],
+            "usage": {"prompt_tokens": sum(len(text) // 4 for text in inputs), "total_tokens": sum(len(text) // 4 for text in inputs)},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        count("chat_completions")
+        if random.random() < config.llm_error_rate:
+            count("chat_completions_errors")
+            return _error(503, "stub: upstream unavailable")
+
+        model = body.get("model", "stub")
+        prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+        pieces = _tokens(config.answer)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(pieces),
+            "total_tokens": prompt_tokens + len(pieces),
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.ttft() + sum(config.token_interval() for _ in pieces))
+            return {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": config.answer}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def event(choices, usage=None) -> str:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model, "choices": choices}
+            if usage is not None:
+                chunk["usage"] = usage
+            return f"data: {json.dumps(chunk)}\n\n"
+
+        async def stream():
+            await asyncio.sleep(config.ttft())
+            yield event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+            for piece in pieces:
+                yield event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+                await asyncio.sleep(config.token_interval())
+            yield event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if include_usage:
+                yield event([], usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/rest/v1/rpc/match_soroban_chunks")
+    async def match_soroban_chunks(request: Request):
+        body = await request.json()
+        count("rpc_match")
+        await asyncio.sleep(config.rpc_latency())
+        if random.random() < config.rpc_error_rate:
+            count("rpc_match_errors")
+            return JSONResponse({"message": "stub: statement timeout", "code": "57014"}, status_code=500)
+        match_count = min(int(body.get("match_count", 10)), len(corpus))
+        rows = random.sample(corpus, match_count)
+        similarities = sorted((random.uniform(0.5, 0.95) for _ in rows), reverse=True)
+        return [dict(row, similarity=similarity) for row, similarity in zip(rows, similarities)]
+
+    @app.post("/rest/v1/rpc/match_soroban_chunks_rescored")
+    async def match_soroban_chunks_rescored(request: Request):
+        return await match_soroban_chunks(request)
+
+    @app.post("/rest/v1/rpc/match_soroban_chunk_ids")
+    @app.post("/rest/v1/rpc/match_soroban_chunk_ids_rescored")
+    async def match_soroban_chunk_ids(request: Request):
+        rows = await match_soroban_chunks(request)
+        if isinstance(rows, JSONResponse):
+            return rows
+        return [
+            {
+                "id_chunk": row["id_chunk"],
+                "similarity": row["similarity"],
+                "metadata": {key: value for key, value in row["metadata"].items() if key in RERANK_METADATA_FIELDS},
+            }
+            for row in rows
+        ]
+
+    @app.get("/rest/v1/soroban_chunks")
+    async def select_chunks(request: Request):
+        count("table_select")
+        await asyncio.sleep(config.table_latency())
+        rows = corpus
+        for key, value in request.query_params.items():
+            if key.startswith("metadata->>") and value.startswith("eq."):
+                field, expected = key[len("metadata->>"):], value[3:]
+                rows = [row for row in rows if str(row["metadata"].get(field)) == expected]
+            elif key == "id_chunk" and value.startswith("eq."):
+                rows = [row for row in rows if str(row["id_chunk"]) == value[3:]]
+            elif key == "id_chunk" and value.startswith("in.("):
+                ids = set(value[4:-1].split(","))
+                rows = [row for row in rows if str(row["id_chunk"]) in ids]
+        limit = request.query_params.get("limit")
+        if limit:
+            rows = rows[:int(limit)]
+        return rows
+
+    @app.post("/rest/v1/soroban_chunks")
+    async def insert_chunks(request: Request):
+        body = await request.json()
+        count("table_insert")
+        await asyncio.sleep(config.table_latency())
+        rows = body if isinstance(body, list) else [body]
+        return JSONResponse([dict(row, id_chunk=len(corpus) + i + 1) for i, row in enumerate(rows)], status_code=201)
+
+    @app.delete("/rest/v1/soroban_chunks")
+    async def delete_chunks():
+        count("table_delete")
+        return []
+
+    return app
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--embed-latency", default="lognormal:0.08,0.4", help="Latencia de /embeddings")
+    parser.add_argument("--rpc-latency", default="lognormal:0.05,0.4", help="Latencia del RPC match_soroban_chunks")
+    parser.add_argument("--table-latency", default="fixed:0.02", help="Latencia de select/insert en soroban_chunks")
+    parser.add_argument("--ttft", default="lognormal:0.8,0.5", help="Time-to-first-token de /chat/completions")
+    parser.add_argument("--token-interval", default="fixed:0.004", help="Intervalo entre tokens en streaming")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fracción de completions que responden 503")
+    parser.add_argument("--rpc-error-rate", type=float, default=0.0, help="Fracción de RPCs que responden 500")
+    parser.add_argument("--answer-file", help="Archivo con la respuesta que devuelve el LLM stub")
+
+
+def stub_config_from_args(args: argparse.Namespace) -> StubConfig:
+    answer = Path(args.answer_file).read_text(encoding="utf-8") if args.answer_file else DEFAULT_ANSWER
+    return StubConfig(
+        embed_latency=args.embed_latency,
+        rpc_latency=args.rpc_latency,
+        table_latency=args.table_latency,
+        ttft=args.ttft,
+        token_interval=args.token_interval,
+        llm_error_rate=args.llm_error_rate,
+        rpc_error_rate=args.rpc_error_rate,
+        answer=answer,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Stubs de OpenRouter y PostgREST para pruebas de carga")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_stub_app(stub_config_from_args(args)), host=args.host, port=args.port, log_level="warning")
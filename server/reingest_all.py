@@ -2,11 +2,21 @@
 """
 Script para reingerir toda la documentación en ambos idiomas.
 Útil después de cambios en chunking o metadata.
+
+Con INDEX_VERSIONING construye una versión nueva del índice y la activa
+al validarla, sin vaciar la que está sirviendo (ver app.rag.index_versions).
+
+Es interactivo; para cron, deploys o corridas que se puedan reanudar usar
+`python -m app.rag.ingest_job` (ver app/rag/ingest_job.py).
 """
 
+import json
 import sys
+from app.config import INDEX_VERSIONING
 from app.rag.ingest import ingest
+from app.rag.ingest_job import run_job
 from app.db import supabase
+from app.log import setup_logging
 
 def clear_all_chunks():
     """Elimina todos los chunks existentes."""
@@ -19,7 +29,21 @@ def clear_all_chunks():
         print(f"   ❌ Error limpiando: {e}")
         return False
 
+def reindex_blue_green():
+    """Reingesta en una versión nueva del índice, activada solo si pasa la validación."""
+    print("\n🔁 Construyendo una versión nueva del índice (la actual sigue sirviendo)...")
+    summary = run_job(["es", "en"], fresh=True, shadow=True)
+    print(json.dumps(summary, ensure_ascii=False, indent=2, default=str))
+    if summary["status"] != "completed":
+        print(f"\n❌ La versión nueva no se activó: {summary.get('error')}")
+        sys.exit(1)
+    print(f"\n✅ Versión activa: {summary['index_version']} (anterior: {summary.get('previous_version')})")
+
 def main():
+    if INDEX_VERSIONING:
+        reindex_blue_green()
+        return
+    
     print("""
 ╔════════════════════════════════════════════════════════════════╗
 ║          REINGESTIÓN COMPLETA - DOCS MULTILENGUAJE             ║
@@ -65,14 +89,19 @@ def main():
         # Contar por idioma
         es_count = sum(1 for item in result.data if item.get("metadata", {}).get("language_doc") == "es")
         en_count = sum(1 for item in result.data if item.get("metadata", {}).get("language_doc") == "en")
+        # Chunks de código cuyo embedding comparten ambos idiomas
+        code_hashes = [item.get("metadata", {}).get("code_hash") for item in result.data]
+        shared_count = sum(1 for code_hash in set(code_hashes) if code_hash and code_hashes.count(code_hash) > 1)
         
         print(f"\n📊 Estadísticas:")
         print(f"   Total de chunks: {total}")
         print(f"   Chunks en español: {es_count}")
         print(f"   Chunks en inglés: {en_count}")
+        print(f"   Chunks de código compartidos: {shared_count}")
         
     except Exception as e:
         print(f"\n⚠️  No se pudieron obtener estadísticas: {e}")
 
 if __name__ == "__main__":
+    setup_logging(fmt="text")
     main()
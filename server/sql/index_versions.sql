@@ -0,0 +1,155 @@
+-- =============================================
+-- VERSIONES DEL ÍNDICE (blue/green) sobre soroban_chunks
+-- Supabase PostgreSQL + pgvector >= 0.8 (hnsw.iterative_scan)
+--
+-- Cada fila pertenece a una versión (index_version) y soroban_index_versions
+-- marca la activa. activate_index_version cambia la activa en una sola
+-- transacción: los servidores pasan a la nueva versión al releerla
+-- (INDEX_VERSION_TTL) sin que el índice quede vacío en ningún momento.
+--
+-- Las filas existentes quedan en la versión 'v0', activa. Las funciones de
+-- búsqueda suman una sobrecarga con index_version (el servidor la usa con
+-- INDEX_VERSIONING=true). Aplicar después de search_embedding.sql y
+-- two_phase_retrieval.sql. Activar INDEX_VERSIONING en todos los servidores
+-- antes de construir la primera versión nueva: las funciones sin
+-- index_version buscan en todas las versiones.
+-- =============================================
+
+ALTER TABLE soroban_chunks ADD COLUMN IF NOT EXISTS index_version text NOT NULL DEFAULT 'v0';
+CREATE INDEX IF NOT EXISTS soroban_chunks_index_version_idx ON soroban_chunks (index_version);
+
+CREATE TABLE IF NOT EXISTS soroban_index_versions (
+  version TEXT PRIMARY KEY,
+  model TEXT,
+  status TEXT NOT NULL DEFAULT 'building',  -- building | active | retired | deleted
+  active BOOLEAN NOT NULL DEFAULT false,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  activated_at TIMESTAMP WITH TIME ZONE
+);
+
+-- A lo sumo una versión activa
+CREATE UNIQUE INDEX IF NOT EXISTS soroban_index_versions_active_idx
+  ON soroban_index_versions (active) WHERE active;
+
+INSERT INTO soroban_index_versions (version, status, active, activated_at)
+VALUES ('v0', 'active', true, NOW())
+ON CONFLICT (version) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION activate_index_version(target text)
+RETURNS text
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  previous text;
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM soroban_index_versions WHERE version = target AND status <> 'deleted') THEN
+    RAISE EXCEPTION 'versión del índice desconocida: %', target;
+  END IF;
+  SELECT version INTO previous FROM soroban_index_versions WHERE active FOR UPDATE;
+  UPDATE soroban_index_versions SET active = false, status = 'retired'
+    WHERE active AND version <> target;
+  UPDATE soroban_index_versions SET active = true, status = 'active', activated_at = NOW()
+    WHERE version = target;
+  RETURN previous;
+END;
+$$;
+
+-- Búsquedas por versión. Con varias versiones en la tabla, el filtro se
+-- aplica durante el recorrido de HNSW (iterative_scan) para no quedarse
+-- con menos de match_count filas; relaxed_order obliga a reordenar al final.
+
+CREATE OR REPLACE FUNCTION match_soroban_chunks(
+  query_embedding vector(1536),
+  match_count int,
+  index_version text
+)
+RETURNS TABLE (id_chunk uuid, content text, metadata jsonb, similarity float)
+LANGUAGE sql STABLE
+SET hnsw.iterative_scan = relaxed_order
+AS $$
+  WITH matches AS MATERIALIZED (
+    SELECT c.id_chunk, c.content, c.metadata, c.embedding <=> query_embedding AS distance
+    FROM soroban_chunks c
+    WHERE c.index_version = match_soroban_chunks.index_version
+    ORDER BY c.embedding <=> query_embedding
+    LIMIT match_count
+  )
+  SELECT id_chunk, content, metadata, 1 - distance AS similarity
+  FROM matches
+  ORDER BY distance;
+$$;
+
+CREATE OR REPLACE FUNCTION match_soroban_chunks_rescored(
+  query_search halfvec(512),
+  query_embedding vector(1536),
+  match_count int,
+  candidate_count int,
+  index_version text
+)
+RETURNS TABLE (id_chunk uuid, content text, metadata jsonb, similarity float)
+LANGUAGE sql STABLE
+SET hnsw.ef_search = 200
+SET hnsw.iterative_scan = relaxed_order
+AS $$
+  WITH candidates AS MATERIALIZED (
+    SELECT c.id_chunk, c.content, c.metadata, c.embedding
+    FROM soroban_chunks c
+    WHERE c.embedding_search IS NOT NULL
+      AND c.index_version = match_soroban_chunks_rescored.index_version
+    ORDER BY c.embedding_search <=> query_search
+    LIMIT candidate_count
+  )
+  SELECT candidates.id_chunk, candidates.content, candidates.metadata,
+         1 - (candidates.embedding <=> query_embedding) AS similarity
+  FROM candidates
+  ORDER BY candidates.embedding <=> query_embedding
+  LIMIT match_count;
+$$;
+
+CREATE OR REPLACE FUNCTION match_soroban_chunk_ids(
+  query_embedding vector(1536),
+  match_count int,
+  index_version text
+)
+RETURNS TABLE (id_chunk uuid, metadata jsonb, similarity float)
+LANGUAGE sql STABLE
+SET hnsw.iterative_scan = relaxed_order
+AS $$
+  WITH matches AS MATERIALIZED (
+    SELECT c.id_chunk, c.metadata, c.embedding <=> query_embedding AS distance
+    FROM soroban_chunks c
+    WHERE c.index_version = match_soroban_chunk_ids.index_version
+    ORDER BY c.embedding <=> query_embedding
+    LIMIT match_count
+  )
+  SELECT id_chunk, rerank_metadata(metadata), 1 - distance AS similarity
+  FROM matches
+  ORDER BY distance;
+$$;
+
+CREATE OR REPLACE FUNCTION match_soroban_chunk_ids_rescored(
+  query_search halfvec(512),
+  query_embedding vector(1536),
+  match_count int,
+  candidate_count int,
+  index_version text
+)
+RETURNS TABLE (id_chunk uuid, metadata jsonb, similarity float)
+LANGUAGE sql STABLE
+SET hnsw.ef_search = 200
+SET hnsw.iterative_scan = relaxed_order
+AS $$
+  WITH candidates AS MATERIALIZED (
+    SELECT c.id_chunk, c.metadata, c.embedding
+    FROM soroban_chunks c
+    WHERE c.embedding_search IS NOT NULL
+      AND c.index_version = match_soroban_chunk_ids_rescored.index_version
+    ORDER BY c.embedding_search <=> query_search
+    LIMIT candidate_count
+  )
+  SELECT candidates.id_chunk, rerank_metadata(candidates.metadata),
+         1 - (candidates.embedding <=> query_embedding) AS similarity
+  FROM candidates
+  ORDER BY candidates.embedding <=> query_embedding
+  LIMIT match_count;
+$$;
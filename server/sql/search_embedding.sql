@@ -0,0 +1,51 @@
+-- =============================================
+-- BÚSQUEDA VECTORIAL EN DOS ETAPAS (soroban_chunks)
+-- Supabase PostgreSQL + pgvector >= 0.8 (halfvec, iterative_scan)
+--
+-- Primera etapa: HNSW sobre los primeros 512 valores del embedding en media
+-- precisión (1 KB por chunk contra 6 KB del vector completo de 1536 floats).
+-- Segunda etapa: los candidatos se reordenan con el vector completo dentro
+-- de la base, así que la respuesta no trae vectores.
+--
+-- Se activa con EMBEDDING_SEARCH_DIMENSIONS=512 (la dimensión de la columna;
+-- app/config.py rechaza otro valor) y reingiriendo (reingest_all.py) para
+-- llenar embedding_search. El recall de cada configuración se mide con
+-- `python -m benchmarks.retrieval`.
+-- =============================================
+
+ALTER TABLE soroban_chunks ADD COLUMN IF NOT EXISTS embedding_search halfvec(512);
+
+CREATE INDEX IF NOT EXISTS soroban_chunks_embedding_search_idx
+  ON soroban_chunks USING hnsw (embedding_search halfvec_cosine_ops);
+
+-- HNSW devuelve como mucho hnsw.ef_search candidatos por recorrido; con
+-- iterative_scan sigue recorriendo el grafo hasta juntar candidate_count
+-- (match_count × RETRIEVAL_RESCORE_FACTOR, hasta 400 con CHAT_MAX_K=20)
+CREATE OR REPLACE FUNCTION match_soroban_chunks_rescored(
+  query_search halfvec(512),
+  query_embedding vector(1536),
+  match_count int,
+  candidate_count int
+)
+RETURNS TABLE (id_chunk uuid, content text, metadata jsonb, similarity float)
+LANGUAGE sql STABLE
+SET hnsw.ef_search = 200
+SET hnsw.iterative_scan = relaxed_order
+AS $$
+  WITH candidates AS MATERIALIZED (
+    SELECT c.id_chunk, c.content, c.metadata, c.embedding
+    FROM soroban_chunks c
+    WHERE c.embedding_search IS NOT NULL
+    ORDER BY c.embedding_search <=> query_search
+    LIMIT candidate_count
+  )
+  SELECT candidates.id_chunk, candidates.content, candidates.metadata,
+         1 - (candidates.embedding <=> query_embedding) AS similarity
+  FROM candidates
+  ORDER BY candidates.embedding <=> query_embedding
+  LIMIT match_count;
+$$;
+
+-- Con la búsqueda en dos etapas activa, el índice sobre el vector completo
+-- ya no se usa y se puede borrar (es el que más memoria ocupa), p.ej.:
+-- DROP INDEX IF EXISTS soroban_chunks_embedding_idx;
@@ -0,0 +1,64 @@
+-- =============================================
+-- RETRIEVAL EN DOS FASES (soroban_chunks)
+-- Supabase PostgreSQL + pgvector
+--
+-- Primera fase: la búsqueda devuelve id, similitud y solo los campos de
+-- metadata que usan los filtros y el rerank (RERANK_METADATA_FIELDS en
+-- app/rag/retrieve.py; mantener las dos listas iguales), sin content.
+-- Segunda fase: el servidor pide content y metadata completa de los
+-- chunks finales con un select por ids.
+--
+-- Se activa con RETRIEVAL_TWO_PHASE=true. La variante _rescored requiere
+-- sql/search_embedding.sql.
+-- =============================================
+
+CREATE OR REPLACE FUNCTION rerank_metadata(metadata jsonb)
+RETURNS jsonb
+LANGUAGE sql IMMUTABLE
+AS $$
+  SELECT coalesce(jsonb_object_agg(key, value), '{}'::jsonb)
+  FROM jsonb_each(metadata)
+  WHERE key = ANY (ARRAY[
+    'file', 'section', 'topic', 'doc_type', 'content_type', 'has_code',
+    'security_topics', 'language_doc', 'embedding_model'
+  ]);
+$$;
+
+CREATE OR REPLACE FUNCTION match_soroban_chunk_ids(
+  query_embedding vector(1536),
+  match_count int
+)
+RETURNS TABLE (id_chunk uuid, metadata jsonb, similarity float)
+LANGUAGE sql STABLE
+AS $$
+  SELECT c.id_chunk, rerank_metadata(c.metadata),
+         1 - (c.embedding <=> query_embedding) AS similarity
+  FROM soroban_chunks c
+  ORDER BY c.embedding <=> query_embedding
+  LIMIT match_count;
+$$;
+
+CREATE OR REPLACE FUNCTION match_soroban_chunk_ids_rescored(
+  query_search halfvec(512),
+  query_embedding vector(1536),
+  match_count int,
+  candidate_count int
+)
+RETURNS TABLE (id_chunk uuid, metadata jsonb, similarity float)
+LANGUAGE sql STABLE
+SET hnsw.ef_search = 200
+SET hnsw.iterative_scan = relaxed_order
+AS $$
+  WITH candidates AS MATERIALIZED (
+    SELECT c.id_chunk, c.metadata, c.embedding
+    FROM soroban_chunks c
+    WHERE c.embedding_search IS NOT NULL
+    ORDER BY c.embedding_search <=> query_search
+    LIMIT candidate_count
+  )
+  SELECT candidates.id_chunk, rerank_metadata(candidates.metadata),
+         1 - (candidates.embedding <=> query_embedding) AS similarity
+  FROM candidates
+  ORDER BY candidates.embedding <=> query_embedding
+  LIMIT match_count;
+$$;